@@ -9,6 +9,110 @@ from bitslice.ROM import *
 from bitslice.IO import *
 from bitslice.RegisterRAM import *
 
+# The combinational logic of CPU6 that reads the outputs of its chips is
+# split into the components below, one per stage, so each runs after the
+# chips it reads and levelize() can order them. CPU6.comb() decodes the
+# pipeline and registers.
+
+# DPBus source select, DPBus feeds the ALUs
+class DataPath(Component):
+    def __init__(self, d2d3, swap_register, reg_ram_data_out, memory_address, condition_codes,
+            bus_read, constant, DPBus, alu0_din, alu1_din):
+        super().__init__()
+        self.d2d3 = d2d3
+        self.swap_register = swap_register
+        self.reg_ram_data_out = reg_ram_data_out
+        self.memory_address = memory_address
+        self.condition_codes = condition_codes
+        self.bus_read = bus_read
+        self.constant = constant
+        self.DPBus = DPBus
+        self.alu0_din = alu0_din
+        self.alu1_din = alu1_din
+
+    def run(self):
+        self.DPBus <<= 0
+
+        # 74LS139 (D2), 74LS138 (D3)
+        if self.d2d3 == 0:
+            self.DPBus <<= self.swap_register
+        if self.d2d3 == 1:
+            self.DPBus <<= self.reg_ram_data_out
+        if self.d2d3 == 2:
+            self.DPBus <<= (~self.memory_address[12:16] << 4) | self.memory_address[8:12].getIntValue()
+        if self.d2d3 == 3:
+            self.DPBus <<= self.memory_address[0:8]
+        if self.d2d3 == 4:
+            pass
+        if self.d2d3 == 5:
+            pass
+        if self.d2d3 == 6:
+            pass
+        if self.d2d3 == 7:
+            pass
+        if self.d2d3 == 8:
+            pass # DPBus = translated address hi, 17:11 (17 down), and top 3 bits together
+        if self.d2d3 == 9:
+            self.DPBus <<= ~self.condition_codes[0:4] << 4 # low nibble is sense switches
+        if self.d2d3 == 10:
+            self.DPBus <<= self.bus_read # DPBus = (e7 == 3) ? dataInBus : bus_read;
+        if self.d2d3 == 11:
+            pass # read ILR (interrupt level register?) H14 4 bits, A8 4 bits current level
+        if self.d2d3 == 12:
+            pass # read switch 2 other half of dip switches and condition codes?
+        if self.d2d3 == 13:
+            self.DPBus <<= self.constant
+        if self.d2d3 == 14:
+            pass
+        if self.d2d3 == 15:
+            pass
+
+        self.alu0_din <<= self.DPBus[0:4]
+        self.alu1_din <<= self.DPBus[4:8]
+
+# FBus source select, FBus feeds the sequencer registers
+class FunctionBus(Component):
+    def __init__(self, h11, alu0_yout, alu1_yout, map_rom_data, FBus, seq0_rin, seq1_rin):
+        super().__init__()
+        self.h11 = h11
+        self.alu0_yout = alu0_yout
+        self.alu1_yout = alu1_yout
+        self.map_rom_data = map_rom_data
+        self.FBus = FBus
+        self.seq0_rin = seq0_rin
+        self.seq1_rin = seq1_rin
+
+    def run(self):
+        self.FBus <<= (self.alu1_yout << 4) | self.alu0_yout.getIntValue()
+        if self.h11 == 6:
+            self.FBus <<= self.map_rom_data
+        self.seq0_rin <<= self.FBus[0:4]
+        self.seq1_rin <<= self.FBus[4:8]
+
+# Carry out of one slice to carry in of the next
+class Carry(Component):
+    def __init__(self, cout, cin):
+        super().__init__()
+        self.cout = cout
+        self.cin = cin
+
+    def run(self):
+        self.cin <<= self.cout
+
+# Microcode address from the sequencer outputs
+class MicroAddress(Component):
+    def __init__(self, seq0_yout, seq1_yout, seq2_yout, uc_rom_address):
+        super().__init__()
+        self.seq0_yout = seq0_yout
+        self.seq1_yout = seq1_yout
+        self.seq2_yout = seq2_yout
+        self.uc_rom_address = uc_rom_address
+
+    def run(self):
+        self.uc_rom_address[0:4] <<= self.seq0_yout[0:4]
+        self.uc_rom_address[4:8] <<= self.seq1_yout[0:4]
+        self.uc_rom_address[8:11] <<= self.seq2_yout[0:3]
+
 class CPU6(Component):
     def __init__(self, reset, clock, zero, dataInBus, writeEnBus, addressBus, dataOutBus):
         super().__init__()
@@ -165,10 +269,22 @@ class CPU6(Component):
         self.k9 = sig.Vector(3)
         self.j12 = sig.Vector(2)
 
+        # Combinational logic between the chips, see DataPath
+        self.data_path = DataPath(self.d2d3, self.swap_register, self.reg_ram_data_out, self.memory_address,
+            self.condition_codes, self.bus_read, self.constant, self.DPBus, self.alu0_din, self.alu1_din)
+        self.alu_carry = Carry(self.alu0_cout, self.alu1_cin)
+        self.function_bus = FunctionBus(self.h11, self.alu0_yout, self.alu1_yout, self.map_rom_data,
+            self.FBus, self.seq0_rin, self.seq1_rin)
+        self.seq1_carry = Carry(self.seq0_cout, self.seq1_cin)
+        self.seq2_carry = Carry(self.seq1_cout, self.seq2_cin)
+        self.uc_address = MicroAddress(self.seq0_yout, self.seq1_yout, self.seq2_yout, self.uc_rom_address)
+
         # Trace signals
         self.aluR0 = sig.Vector(8)
 
-    def run(self):
+        self.clockedBy(clock)
+
+    def comb(self):
         if self.reset == 1:
             self.work_address <<= 0;
             self.memory_address <<= 0;
@@ -197,46 +313,35 @@ class CPU6(Component):
 
         # Sequencer 0
         self.seq0_din <<= self.pipeline[16:20]
-        self.seq0_rin <<= self.FBus[0:4]
         self.seq0_orin <<= 0
         self.seq0_s0 <<= ~(self.pipeline[29] & self.jsr_)
         self.seq0_s1 <<= ~(self.pipeline[30] & self.jsr_)
         self.seq0_cin <<= 1
 
-        self.uc_rom_address[0:4] <<= self.seq0_yout[0:4]
-
         # Case control
         self.case_ <<= self.pipeline[33]
 
         # Sequencer 1 (microcode address bits 7:4)
         self.seq1_din <<= self.pipeline[20:24]
-        self.seq1_rin <<= self.FBus[4:8]
         self.seq1_s0 <<= ~(self.pipeline[31] & self.jsr_)
         self.seq1_s1 <<= ~(~(self.pipeline[54] & ~self.pipeline[32]) & self.jsr_.getIntValue())
-        self.seq1_cin <<= self.seq0_cout
 
         # Sequencer 1
         self.seq1_orin <<= 0
         self.seq1_re <<= 1
-        self.uc_rom_address[4:8] <<= self.seq1_yout[0:4]
 
         # Sequencer 2 (microcode address bits 10:8)
 
         self.seq2_din <<= self.pipeline[24:27].getIntValue() # only three bits are used
         self.seq2_s0 <<= ~(self.pipeline[31] & self.jsr_)
         self.seq2_s1 <<= ~(self.pipeline[32] & self.jsr_)
-        self.seq2_cin <<= self.seq1_cout
         self.seq2_re <<= 1
 
-        # Sequencer 2
-        self.uc_rom_address[8:11] <<= self.seq2_yout[0:3]
-
         if self.e6 == 6:
             self.seq0_re <<= 0
             self.seq1_re <<= 0
 
         # ALU 0
-        self.alu0_din <<= self.DPBus[0:4]
         self.alu0_a <<= self.pipeline[47:51]
         self.alu0_b <<= self.pipeline[43:47]
         self.alu0_src <<= self.pipeline[34:37]
@@ -248,13 +353,11 @@ class CPU6(Component):
         self.shift_carry <<= self.pipeline[51:53]
 
         # ALU 1
-        self.alu1_din <<= self.DPBus[4:8]
         self.alu1_a <<= self.pipeline[47:51]
         self.alu1_b <<= self.pipeline[43:47]
         self.alu1_src <<= self.pipeline[34:37]
         self.alu1_op <<= self.pipeline[37:40]
         self.alu1_dest <<= self.pipeline[40:43]
-        self.alu1_cin <<= self.alu0_cout
 
         # Constant (immediate data)
         self.constant <<= ~self.pipeline[16:16+8]
@@ -270,10 +373,6 @@ class CPU6(Component):
         self.k9 <<= self.pipeline[16:19]
         self.j12 <<= self.pipeline[16:18]
 
-        # Datapath
-        self.DPBus <<= 0
-        self.FBus <<= 0
-
         # always @(*)
         self.jsr_ <<= 1
         if self.pipeline[15] == 0:
@@ -305,133 +404,92 @@ class CPU6(Component):
             self.seq0_re <<= 0
             self.seq1_re <<= 0
 
-        # Datapath muxes
-        self.DPBus <<= 0
+        # end always @(*)
 
-        # 74LS139 (D2), 74LS138 (D3)
-        if self.d2d3 == 0:
-            self.DPBus <<= self.swap_register
-        if self.d2d3 == 1:
-            self.DPBus <<= self.reg_ram_data_out
-        if self.d2d3 == 2:
-            self.DPBus <<= (~self.memory_address[12:16] << 4) | self.memory_address[8:12].getIntValue()
-        if self.d2d3 == 3:
-            self.DPBus <<= self.memory_address[0:8]
-        if self.d2d3 == 4:
+    def onRising(self):
+        self.pipeline <<= self.uc_rom_data
+
+        # 74LS138
+        if self.e6 == 0:
             pass
-        if self.d2d3 == 5:
+        if self.e6 == 1:
+            self.result_register <<= self.FBus
+        if self.e6 == 2:
+            self.register_index <<= self.FBus; # uC bit 53 might simplify 16 bit register write
+        if self.e6 == 3:
+            pass # load D9
+        if self.e6 == 4:
+            pass # load page table base register
+        if self.e6 == 5:
+            self.memory_address <<= self.work_address
+        if self.e6 == 6:
+            pass # load AR on 2909s, see above
+        if self.e6 == 7:
+            # load condition code register M12
+            # based on table in wiki (j12), condition codes in instructions wiki
+            if self.j12 == 0:
+                self.condition_codes[3] <<= self.condition_codes[0]
+                self.condition_codes[2] <<= self.condition_codes[1]
+            if self.j12 == 1:
+                self.condition_codes[3] <<= self.flags_register[0]
+                self.condition_codes[2] <<= self.flags_register[1]
+            if self.j12 == 2:
+                self.condition_codes <<= self.result_register[0:4] # Not sure
+            if self.j12 == 3:
+                self.condition_codes[3] <<= self.flags_register[5] & self.flags_register[0]
+                self.condition_codes[2] <<= self.flags_register[1]
+
+        # 74LS138 (only half used)            
+        if self.e7 == 0:
             pass
-        if self.d2d3 == 6:
+        if self.e7 == 1:
             pass
-        if self.d2d3 == 7:
+        if self.e7 == 2:
+            hi_n = (self.flags_register[0] << 5) | (self.alu0_cout << 4)
+            lo_n = (self.alu1_cout << 3) | (self.alu1_ovr << 2) | (self.alu1_f3 << 1) | (self.alu0_f0 & self.alu1_f0)
+            self.flags_register <<= (hi_n << 4) | lo_n
+        if self.e7 == 3:
+            self.bus_read <<= self.dataInBus
+
+        # 74LS138
+        if self.h11 == 0:
             pass
-        if self.d2d3 == 8:
-            pass # DPBus = translated address hi, 17:11 (17 down), and top 3 bits together
-        if self.d2d3 == 9:
-            self.DPBus <<= ~self.condition_codes[0:4] << 4 # low nibble is sense switches
-        if self.d2d3 == 10:
-            self.DPBus <<= self.bus_read # DPBus = (e7 == 3) ? dataInBus : bus_read;
-        if self.d2d3 == 11:
-            pass # read ILR (interrupt level register?) H14 4 bits, A8 4 bits current level
-        if self.d2d3 == 12:
-            pass # read switch 2 other half of dip switches and condition codes?
-        if self.d2d3 == 13:
-            self.DPBus <<= self.constant
-        if self.d2d3 == 14:
-            pass
-        if self.d2d3 == 15:
-            pass
-
-        self.FBus <<= (self.alu1_yout << 4) | self.alu0_yout.getIntValue()
+        if self.h11 == 1:
+            pass # Begin bus read cycle
+        if self.h11 == 2:
+            pass # Begin bus write cycle
+        if self.h11 == 3:
+            # Load work_address high byte
+            self.work_address[8:16] <<= self.result_register
+            if self.e6 == 5:
+                self.work_address[8:16] <<= self.memory_address[8:16]
+        if self.h11 == 4:
+            self.work_address <<= self.work_address + 1 # WAR increment
+        if self.h11 == 5:
+            self.memory_address <<= self.memory_address + 1 # MAR increment
         if self.h11 == 6:
-            self.FBus <<= self.map_rom_data
-
-        # end always @(*)
+            pass # Select FBus source (combinational)
+        if self.h11 == 7:
+            self.swap_register <<= (self.DPBus[0:4] << 4) | self.DPBus[4:8].getIntValue()
 
-        if self.clock.isRisingEdge():
-            self.pipeline <<= self.uc_rom_data
+        self.writeEnBus <<= 0
 
-            # 74LS138
-            if self.e6 == 0:
-                pass
-            if self.e6 == 1:
-                self.result_register <<= self.FBus
-            if self.e6 == 2:
-                self.register_index <<= self.FBus; # uC bit 53 might simplify 16 bit register write
-            if self.e6 == 3:
-                pass # load D9
-            if self.e6 == 4:
-                pass # load page table base register
+        # 74LS138
+        if self.k11 == 0:
+            pass
+        if self.k11 == 1:
+            pass
+        if self.k11 == 2:
+            pass
+        if self.k11 == 3:
+            pass # enable F11 addressable latch, machine state, bus state, A0-2 on F11 are B1-3 and D input is B0
+        if self.k11 == 4:
+            pass
+        if self.k11 == 5:
+             pass
+        if self.k11 == 6: # Load work_address low byte
+            self.work_address[0:8] <<= self.result_register
             if self.e6 == 5:
-                self.memory_address <<= self.work_address
-            if self.e6 == 6:
-                pass # load AR on 2909s, see above
-            if self.e6 == 7:
-                # load condition code register M12
-                # based on table in wiki (j12), condition codes in instructions wiki
-                if self.j12 == 0:
-                    self.condition_codes[3] <<= self.condition_codes[0]
-                    self.condition_codes[2] <<= self.condition_codes[1]
-                if self.j12 == 1:
-                    self.condition_codes[3] <<= self.flags_register[0]
-                    self.condition_codes[2] <<= self.flags_register[1]
-                if self.j12 == 2:
-                    self.condition_codes <<= self.result_register[0:4] # Not sure
-                if self.j12 == 3:
-                    self.condition_codes[3] <<= self.flags_register[5] & self.flags_register[0]
-                    self.condition_codes[2] <<= self.flags_register[1]
-
-            # 74LS138 (only half used)            
-            if self.e7 == 0:
-                pass
-            if self.e7 == 1:
-                pass
-            if self.e7 == 2:
-                hi_n = (self.flags_register[0] << 5) | (self.alu0_cout << 4)
-                lo_n = (self.alu1_cout << 3) | (self.alu1_ovr << 2) | (self.alu1_f3 << 1) | (self.alu0_f0 & self.alu1_f0)
-                self.flags_register <<= (hi_n << 4) | lo_n
-            if self.e7 == 3:
-                self.bus_read <<= self.dataInBus
-
-            # 74LS138
-            if self.h11 == 0:
-                pass
-            if self.h11 == 1:
-                pass # Begin bus read cycle
-            if self.h11 == 2:
-                pass # Begin bus write cycle
-            if self.h11 == 3:
-                # Load work_address high byte
-                self.work_address[8:16] <<= self.result_register
-                if self.e6 == 5:
-                    self.work_address[8:16] <<= self.memory_address[8:16]
-            if self.h11 == 4:
-                self.work_address <<= self.work_address + 1 # WAR increment
-            if self.h11 == 5:
-                self.memory_address <<= self.memory_address + 1 # MAR increment
-            if self.h11 == 6:
-                pass # Select FBus source (combinational)
-            if self.h11 == 7:
-                self.swap_register <<= (self.DPBus[0:4] << 4) | self.DPBus[4:8].getIntValue()
-
-            self.writeEnBus <<= 0
-
-            # 74LS138
-            if self.k11 == 0:
-                pass
-            if self.k11 == 1:
-                pass
-            if self.k11 == 2:
-                pass
-            if self.k11 == 3:
-                pass # enable F11 addressable latch, machine state, bus state, A0-2 on F11 are B1-3 and D input is B0
-            if self.k11 == 4:
-                pass
-            if self.k11 == 5:
-                 pass
-            if self.k11 == 6: # Load work_address low byte
-                self.work_address[0:8] <<= self.result_register
-                if self.e6 == 5:
-                    self.work_address[0:8] <<= self.memory_address[0:8]
-            if self.k11 == 7:
-                self.writeEnBus <<= 1
+                self.work_address[0:8] <<= self.memory_address[0:8]
+        if self.k11 == 7:
+            self.writeEnBus <<= 1
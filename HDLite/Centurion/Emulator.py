@@ -0,0 +1,269 @@
+# Instruction level CPU6, to run programs quickly up to the point of
+# interest before handing over to the microcode level CPU6 in CPU6.py.
+# Both share the same state:
+#   memory, an AddressSpace, see bitslice.Memory
+#   registers, the RegisterRAM memory: 16 bytes per interrupt level,
+#     register r of level l at ((l << 4) | r) ^ 1, see reg_ram_addr in CPU6
+#   flags, laid out as flags_register: value (zero) 0, minus 1, fault 2,
+#     link 3
+#   PC, the memory address register at an instruction fetch
+# Instructions not implemented here stop run(), the microcode level CPU6
+# takes over from there, see store().
+
+FLAG_VALUE = 1
+FLAG_MINUS = 2
+FLAG_FAULT = 4
+FLAG_LINK = 8
+
+# Word registers, the high byte is register 2*n, the low byte 2*n+1
+A = 0
+B = 1
+X = 2
+Y = 3
+Z = 4
+S = 5
+C = 6
+P = 7
+
+class Unimplemented(Exception):
+    pass
+
+class Emulator(object):
+    def __init__(self, memory, registers):
+        self.memory = memory
+        self.registers = registers
+        self.pc = 0
+        self.flags = 0
+        self.level = 0
+        self.halted = False
+        self.instructions = 0
+        # why the last run stopped: count, pc, halt or unimplemented
+        self.reason = None
+        # (address, value, write) of every memory access, see startTrace()
+        self.trace = None
+        self.read = memory.getReader()
+        self.write = memory.write
+        self.operations = [self.unimplemented] * 256
+        for op, method in ((0x00, self.hlt), (0x01, self.nop), (0x02, self.sf), (0x03, self.rf),
+                (0x06, self.sl), (0x07, self.rl), (0x08, self.cl)):
+            self.operations[op] = method
+        for op in range(0x10, 0x1a):
+            self.operations[op] = self.branch
+        for op in (0x71, 0x72, 0x73, 0x74):
+            self.operations[op] = self.jmp
+        for base, register, word, store in ((0x80, A, False, False), (0x90, A, True, False),
+                (0xa0, A, False, True), (0xb0, A, True, True), (0xc0, B, False, False),
+                (0xd0, B, True, False), (0xe0, B, False, True), (0xf0, B, True, True)):
+            for mode in range(1 if store else 0, 5):
+                self.operations[base | mode] = self.loadStore(register, word, store)
+
+    # Architectural state of the microcode level CPU6 at an instruction fetch
+    def load(self, cpu):
+        self.pc = cpu.memory_address.getIntValue()
+        self.flags = cpu.flags_register.getIntValue() & 0xf
+        self.halted = False
+
+    # Hand the architectural state to the microcode level CPU6, stopped at
+    # an instruction fetch, e.g. the first one after reset. Memory and
+    # registers are shared already.
+    def store(self, cpu, simulation):
+        self.setWord(P, self.pc)
+        cpu.memory_address <<= self.pc
+        cpu.work_address <<= self.pc
+        cpu.flags_register <<= (cpu.flags_register.getIntValue() & 0xf0) | self.flags
+        # Memories changed behind the signals, evaluate the whole design
+        # again, including the memory outside cpu
+        top = cpu
+        while top.getParent() != None:
+            top = top.getParent()
+        components = [top]
+        while len(components) > 0:
+            component = components.pop()
+            simulation.schedule(component)
+            components += component.getComponents()
+        simulation.runUntilStable()
+
+    def getRegister(self, r):
+        return self.registers[((self.level << 4) | r) ^ 1]
+
+    def setRegister(self, r, value):
+        self.registers[((self.level << 4) | r) ^ 1] = value & 0xff
+
+    def getWord(self, n):
+        return (self.getRegister(2 * n) << 8) | self.getRegister(2 * n + 1)
+
+    def setWord(self, n, value):
+        self.setRegister(2 * n, value >> 8)
+        self.setRegister(2 * n + 1, value)
+
+    # Record memory accesses in trace until stopTrace()
+    def startTrace(self):
+        self.trace = []
+        memory = self.memory
+        trace = self.trace
+        def read(address):
+            value = memory.read(address)
+            trace.append((address, value, False))
+            return value
+        def write(address, value):
+            trace.append((address, value, True))
+            memory.write(address, value)
+        self.read = read
+        self.write = write
+        return trace
+
+    def stopTrace(self):
+        self.trace = None
+        self.read = self.memory.getReader()
+        self.write = self.memory.write
+
+    def fetch(self):
+        pc = self.pc
+        self.pc = (pc + 1) & 0xffff
+        return self.read(pc)
+
+    def fetchWord(self):
+        pc = self.pc
+        self.pc = (pc + 2) & 0xffff
+        return (self.read(pc) << 8) | self.read((pc + 1) & 0xffff)
+
+    def readWord(self, address):
+        return (self.read(address) << 8) | self.read((address + 1) & 0xffff)
+
+    def setFlags(self, value, bits):
+        self.flags &= ~(FLAG_VALUE | FLAG_MINUS)
+        if value == 0:
+            self.flags |= FLAG_VALUE
+        if value >> (bits - 1):
+            self.flags |= FLAG_MINUS
+
+    # Effective address of modes 1 to 4: direct, indirect, relative and
+    # relative indirect
+    def address(self, mode):
+        if mode == 1:
+            return self.fetchWord()
+        if mode == 2:
+            return self.readWord(self.fetchWord())
+        displacement = self.fetch()
+        address = (self.pc + displacement - ((displacement & 0x80) << 1)) & 0xffff
+        if mode == 3:
+            return address
+        return self.readWord(address)
+
+    # Run one instruction, raising Unimplemented where run() would stop
+    def step(self):
+        if self.run(1) == 0 and self.reason == 'unimplemented':
+            self.unimplemented(self.read(self.pc))
+
+    # Run count instructions, until the PC is untilPC before an instruction
+    # or until an instruction this emulator does not implement. Returns
+    # the number of instructions run.
+    def run(self, count=None, untilPC=None):
+        operations = self.operations
+        read = self.read
+        limit = count if count != None else -1
+        n = 0
+        self.reason = 'halt'
+        try:
+            while not self.halted:
+                if n == limit:
+                    self.reason = 'count'
+                    break
+                pc = self.pc
+                if pc == untilPC and n > 0:
+                    self.reason = 'pc'
+                    break
+                opcode = read(pc)
+                operations[opcode](opcode)
+                n += 1
+        except Unimplemented:
+            self.reason = 'unimplemented'
+        self.instructions += n
+        return n
+
+    def unimplemented(self, opcode):
+        raise Unimplemented(f'Instruction {opcode:02x} at {self.pc:04x} is not implemented')
+
+    def hlt(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+        self.halted = True
+
+    def nop(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+
+    def sf(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+        self.flags |= FLAG_FAULT
+
+    def rf(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+        self.flags &= ~FLAG_FAULT
+
+    def sl(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+        self.flags |= FLAG_LINK
+
+    def rl(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+        self.flags &= ~FLAG_LINK
+
+    def cl(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+        self.flags ^= FLAG_LINK
+
+    # BL, BNL, BF, BNF, BZ, BNZ, BM, BP, BGZ and BLE to PC + displacement
+    def branch(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+        target = self.address(3)
+        flags = self.flags
+        condition = opcode & 0xe
+        if condition == 0:
+            taken = flags & FLAG_LINK
+        elif condition == 2:
+            taken = flags & FLAG_FAULT
+        elif condition == 4:
+            taken = flags & FLAG_VALUE
+        elif condition == 6:
+            taken = flags & FLAG_MINUS
+        else:
+            taken = not flags & (FLAG_MINUS | FLAG_VALUE)
+        if opcode & 1:
+            taken = not taken
+        if taken:
+            self.pc = target
+
+    def jmp(self, opcode):
+        self.pc = (self.pc + 1) & 0xffff
+        self.pc = self.address(opcode & 7)
+
+    # LDAL, LDA, STAL, STA, LDBL, LDB, STBL and STB, mode 0 is a literal
+    def loadStore(self, register, word, store):
+        low = 2 * register + 1
+        def storeByte(opcode):
+            self.pc = (self.pc + 1) & 0xffff
+            address = self.address(opcode & 7)
+            value = self.getRegister(low)
+            self.write(address, value)
+            self.setFlags(value, 8)
+        def storeWord(opcode):
+            self.pc = (self.pc + 1) & 0xffff
+            address = self.address(opcode & 7)
+            value = self.getWord(register)
+            self.write(address, value >> 8)
+            self.write((address + 1) & 0xffff, value & 0xff)
+            self.setFlags(value, 16)
+        def loadByte(opcode):
+            self.pc = (self.pc + 1) & 0xffff
+            mode = opcode & 7
+            value = self.fetch() if mode == 0 else self.read(self.address(mode))
+            self.setRegister(low, value)
+            self.setFlags(value, 8)
+        def loadWord(opcode):
+            self.pc = (self.pc + 1) & 0xffff
+            mode = opcode & 7
+            value = self.fetchWord() if mode == 0 else self.readWord(self.address(mode))
+            self.setWord(register, value)
+            self.setFlags(value, 16)
+        if store:
+            return storeWord if word else storeByte
+        return loadWord if word else loadByte
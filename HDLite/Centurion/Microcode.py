@@ -0,0 +1,372 @@
+# Microcode level CPU6 on plain ints, for speed. Every microword of the
+# AM27S191 images is decoded once into a tuple of the fields CPU6 decodes
+# on every cycle: d2d3, e6, e7, h11, k11, the sequencer selects and the ALU
+# fields. A clock then runs what CPU6 and its Am2909/Am2911 sequencers,
+# Am2901 ALUs, ROMs and register RAM do, on ints instead of signals, with
+# the same results cycle by cycle, including the quirks of CPU6.py, e.g.
+# reg_ram_addr and the flags register layout.
+# Memory and registers are shared like the Emulator's, see load() and
+# store() to hand over to and from CPU6.
+
+# Index of the microword itself in a decoded microword, see decode()
+WORD = 0
+
+# Stack pointer after reset, the sequencers share fe and pup so their stack
+# pointers move together
+RESET_SP = 3
+
+def bits(word, start, end):
+    return (word >> start) & ((1 << (end - start)) - 1)
+
+# Sequencer selects (s1 << 1) | s0 of sequencers 0, 1 and 2, and fe, given
+# jsr_
+def selects(word, jsr):
+    p = [bits(word, i, i + 1) for i in range(56)]
+    sel0 = ((1 - (p[30] & jsr)) << 1) | (1 - (p[29] & jsr))
+    sel1 = ((1 - ((1 - (p[54] & (1 - p[32]))) & jsr)) << 1) | (1 - (p[31] & jsr))
+    sel2 = ((1 - (p[32] & jsr)) << 1) | (1 - (p[31] & jsr))
+    return (sel0, sel1, sel2, p[27] & jsr)
+
+def decode(word):
+    return (word,
+        bits(word, 0, 4),                       # d2d3
+        bits(word, 4, 7),                       # e6
+        bits(word, 13, 15),                     # e7
+        bits(word, 10, 13),                     # h11
+        bits(word, 7, 10),                      # k11
+        bits(word, 16, 18),                     # j12
+        # jsr_ is ~register_index[0] rather than 1
+        bits(word, 15, 16) == 0 and bits(word, 16, 19) == 2,
+        (selects(word, 0), selects(word, 1)),
+        bits(word, 28, 29),                     # pup
+        # seq0_orin takes the flags
+        bits(word, 33, 34) == 0 and bits(word, 4, 6) == 0,
+        bits(word, 16, 20),                     # seq0_din
+        bits(word, 20, 24),                     # seq1_din
+        bits(word, 24, 27),                     # seq2_din
+        ~bits(word, 16, 24) & 0xff,             # constant
+        bits(word, 51, 53),                     # shift_carry
+        bits(word, 53, 54),                     # reg_low_select
+        bits(word, 47, 51),                     # ALU a
+        bits(word, 43, 47),                     # ALU b
+        bits(word, 34, 37),                     # ALU source
+        bits(word, 37, 40),                     # ALU operation
+        bits(word, 40, 43))                     # ALU destination
+
+# One Am2901 for a cycle, returns f, yout and the values written to q and
+# register b on the rising edge, -1 for none
+def alu(regs, q, din, cin, a, b, src, op, dest):
+    av = regs[a]
+    if src == 0:
+        r, s = av, q
+    elif src == 1:
+        r, s = av, regs[b]
+    elif src == 2:
+        r, s = 0, q
+    elif src == 3:
+        r, s = 0, regs[b]
+    elif src == 4:
+        r, s = 0, av
+    elif src == 5:
+        r, s = din, av
+    elif src == 6:
+        r, s = din, q
+    else:
+        r, s = din, 0
+    if op == 0:
+        f = r + s + cin
+    elif op == 1:
+        f = s + ((~r) & 0xf) + cin
+    elif op == 2:
+        f = r + ((~s) & 0xf) + cin
+    elif op == 3:
+        f = r | s
+    elif op == 4:
+        f = r & s
+    elif op == 5:
+        f = ~r + s
+    elif op == 6:
+        f = r ^ s
+    else:
+        f = ~(r ^ s)
+    f &= 0x1f
+    fvalue = f & 0xf
+    if dest == 0:
+        return f, fvalue, fvalue, -1
+    if dest == 1:
+        return f, fvalue, -1, -1
+    if dest == 2:
+        return f, av & 0xf, -1, fvalue
+    if dest == 3:
+        return f, fvalue, -1, fvalue
+    if dest == 4:
+        return f, fvalue, q >> 1, fvalue >> 1
+    if dest == 5:
+        return f, fvalue, -1, fvalue >> 1
+    if dest == 6:
+        return f, fvalue, (q << 1) & 0xf, fvalue << 1
+    return f, fvalue, -1, fvalue << 1
+
+class Microcode(object):
+    def __init__(self, ucode, mapRom, memory, registers):
+        self.table = [decode(word) for word in ucode]
+        # map_rom_address is not driven, FBus only ever sees entry 0
+        self.mapData = mapRom[0]
+        self.memory = memory
+        self.registers = registers
+        self.clocks = 0
+        self.pipeline = decode(0)
+        self.work_address = 0
+        self.memory_address = 0
+        self.register_index = 0
+        self.result_register = 0
+        self.swap_register = 0
+        self.flags_register = 0
+        self.condition_codes = 0
+        self.bus_read = 0
+        self.writeEnBus = 0
+        # CPU6 does not drive dataOutBus yet
+        self.dataOutBus = 0
+        # Sequencers 0, 1 and 2
+        self.pc = [0, 0, 0]
+        self.ar = [0, 0, 0]
+        self.sp = RESET_SP
+        self.stacks = [[0] * 4 for i in range(3)]
+        # ALUs 0 and 1
+        self.regs = [[0] * 16 for i in range(2)]
+        self.q = [0, 0]
+        # Combinational values of the current cycle, see settle()
+        self.uc_rom_address = 0
+        self.DPBus = 0
+        self.FBus = 0
+        self.reg_ram_data_out = 0
+
+    # What reset does in CPU6 and the sequencers
+    def reset(self):
+        self.work_address = 0
+        self.memory_address = 0
+        self.register_index = 0
+        self.result_register = 0
+        self.swap_register = 0
+        self.condition_codes = 0
+        self.flags_register = 0
+        self.writeEnBus = 0
+        self.pc = [0, 0, 0]
+        self.ar = [0, 0, 0]
+        self.sp = RESET_SP
+        self.settle()
+
+    @property
+    def addressBus(self):
+        return self.memory_address
+
+    @property
+    def dataInBus(self):
+        return self.memory.read(self.memory_address)
+
+    def settle(self):
+        self.clock(0)
+
+    # Clock count times, or until the address bus is untilAddress after a
+    # clock. Returns the number of clocks.
+    def clock(self, count=1, untilAddress=None):
+        table = self.table
+        mapData = self.mapData
+        registers = self.registers
+        read = self.memory.getReader()
+        write = self.memory.write
+        p = self.pipeline
+        wa = self.work_address
+        ma = self.memory_address
+        ri = self.register_index
+        rr = self.result_register
+        swap = self.swap_register
+        flags = self.flags_register
+        cc = self.condition_codes
+        busRead = self.bus_read
+        we = self.writeEnBus
+        pc0, pc1, pc2 = self.pc
+        ar0, ar1, ar2 = self.ar
+        sp = self.sp
+        stack0, stack1, stack2 = self.stacks
+        regs0, regs1 = self.regs
+        q0, q1 = self.q
+        n = 0
+        while True:
+            (word, d2d3, e6, e7, h11, k11, j12, jsrSelect, sels, pup, caseOr, din0, din1, din2,
+                constant, shiftCarry, lowSelect, a, b, src, op, dest) = p
+
+            # Sequencers
+            sel0, sel1, sel2, fe = sels[1 - (ri & 1)] if jsrSelect else sels[1]
+            push = fe == 0 and pup
+            sa = (sp + 1) & 3 if push else sp
+            y0 = (pc0, ar0, stack0[sa], din0)[sel0]
+            if caseOr:
+                y0 |= ((flags >> 1) & 1) | ((flags & 1) << 1)
+            y1 = (pc1, ar1, stack1[sa], din1)[sel1]
+            y2 = (pc2, ar2, stack2[sa], din2)[sel2]
+            cout0 = 1 if y0 == 0xf else 0
+            cout1 = 1 if cout0 and y1 == 0xf else 0
+            uc = y0 | (y1 << 4) | ((y2 & 7) << 8)
+
+            # Datapath
+            rra = ((ri >> 1) & 0x7f) | (0x7e if lowSelect | (ri & 1) else 0x7f)
+            rrOut = registers[rra]
+            if d2d3 == 13:
+                dp = constant
+            elif d2d3 == 1:
+                dp = rrOut
+            elif d2d3 == 0:
+                dp = swap
+            elif d2d3 == 3:
+                dp = ma & 0xff
+            elif d2d3 == 10:
+                dp = busRead
+            elif d2d3 == 2:
+                dp = (((~ma >> 12) & 0xf) << 4) | ((ma >> 8) & 0xf)
+            elif d2d3 == 9:
+                dp = ((~cc) & 0xf) << 4
+            else:
+                dp = 0
+            if shiftCarry == 1:
+                cin = 1
+            elif shiftCarry == 2:
+                cin = (flags >> 3) & 1
+            else:
+                cin = 0
+            f0, ya0, qv0, bv0 = alu(regs0, q0, dp & 0xf, cin, a, b, src, op, dest)
+            f1, ya1, qv1, bv1 = alu(regs1, q1, dp >> 4, f0 >> 4, a, b, src, op, dest)
+            fbus = mapData if h11 == 6 else (ya1 << 4) | ya0
+
+            if n == count or (n > 0 and ma == untilAddress):
+                break
+            n += 1
+
+            # Rising edge, everything below sees the values before it
+            p = table[uc]
+            if k11 == 4:
+                registers[rra] = rr
+            if we:
+                write(ma, 0)
+            if push:
+                stack0[sa] = pc0
+                stack1[sa] = pc1
+                stack2[sa] = pc2
+            pc0 = (y0 + 1) & 0xf
+            pc1 = (y1 + cout0) & 0xf
+            pc2 = (y2 + cout1) & 0xf
+            if e6 == 6:
+                ar0 = fbus & 0xf
+                ar1 = fbus >> 4
+            if fe == 0:
+                sp = (sp + 1) & 3 if pup else (sp - 1) & 3
+            if qv0 >= 0:
+                q0 = qv0
+            if bv0 >= 0:
+                regs0[b] = bv0
+            if qv1 >= 0:
+                q1 = qv1
+            if bv1 >= 0:
+                regs1[b] = bv1
+
+            nextWA = wa
+            nextMA = ma
+            if e6 == 1:
+                rrNext = fbus
+            else:
+                rrNext = rr
+            if e6 == 2:
+                ri = fbus
+            elif e6 == 5:
+                nextMA = wa
+            elif e6 == 7:
+                if j12 == 0:
+                    cc = (cc & 3) | ((cc & 1) << 3) | ((cc & 2) << 1)
+                elif j12 == 1:
+                    cc = (cc & 3) | ((flags & 1) << 3) | ((flags & 2) << 1)
+                elif j12 == 2:
+                    cc = rr & 0xf
+                else:
+                    cc = (cc & 3) | (((flags >> 5) & flags & 1) << 3) | ((flags & 2) << 1)
+            if e7 == 2:
+                # As CPU6 computes it, shifts of a 1 bit signal are by 1 or 0
+                hi = ((flags & 1) << 1) | (f0 >> 4)
+                lo = ((f1 >> 4) << 1) | (((f1 >> 3) & 1) << 1) | (1 if (f0 & 0xf) == 0 and (f1 & 0xf) == 0 else 0)
+                flags = ((hi << 4) | lo) & 0xff
+            elif e7 == 3:
+                busRead = read(ma)
+            if h11 == 3:
+                nextWA = ((ma >> 8 if e6 == 5 else rr) << 8) | (nextWA & 0xff)
+            elif h11 == 4:
+                nextWA = (wa + 1) & 0xffff
+            elif h11 == 5:
+                nextMA = (ma + 1) & 0xffff
+            elif h11 == 7:
+                swap = ((dp & 0xf) << 4) | (dp >> 4)
+            if k11 == 6:
+                nextWA = (nextWA & 0xff00) | ((ma if e6 == 5 else rr) & 0xff)
+            we = 1 if k11 == 7 else 0
+            wa = nextWA
+            ma = nextMA
+            rr = rrNext
+
+        self.pipeline = p
+        self.work_address = wa
+        self.memory_address = ma
+        self.register_index = ri
+        self.result_register = rr
+        self.swap_register = swap
+        self.flags_register = flags
+        self.condition_codes = cc
+        self.bus_read = busRead
+        self.writeEnBus = we
+        self.pc = [pc0, pc1, pc2]
+        self.ar = [ar0, ar1, ar2]
+        self.sp = sp
+        self.q = [q0, q1]
+        self.uc_rom_address = uc
+        self.DPBus = dp
+        self.FBus = fbus
+        self.reg_ram_data_out = rrOut
+        self.clocks += n
+        return n
+
+    # State of the CPU6 component cpu, which shares memory and registers
+    def load(self, cpu):
+        self.pipeline = decode(cpu.pipeline.getIntValue())
+        for name in ('work_address', 'memory_address', 'register_index', 'result_register',
+                'swap_register', 'flags_register', 'condition_codes', 'bus_read'):
+            setattr(self, name, getattr(cpu, name).getIntValue())
+        self.writeEnBus = cpu.writeEnBus.getIntValue()
+        sequencers = (cpu.seq0, cpu.seq1, cpu.seq2)
+        self.pc = [s.pc.getIntValue() for s in sequencers]
+        self.ar = [s.ar.getIntValue() for s in sequencers]
+        self.sp = cpu.seq0.sp.getIntValue()
+        self.stacks = [list(s.stack.memory[0:4]) for s in sequencers]
+        self.regs = [list(cpu.alu0.regs), list(cpu.alu1.regs)]
+        self.q = [cpu.alu0.q.getIntValue(), cpu.alu1.q.getIntValue()]
+        self.settle()
+
+    # Hand the state over to the CPU6 component cpu to continue from here
+    def store(self, cpu, simulation):
+        cpu.pipeline <<= self.pipeline[WORD]
+        for name in ('work_address', 'memory_address', 'register_index', 'result_register',
+                'swap_register', 'flags_register', 'condition_codes', 'bus_read'):
+            signal = getattr(cpu, name)
+            signal <<= getattr(self, name)
+        cpu.writeEnBus <<= self.writeEnBus
+        for i, s in enumerate((cpu.seq0, cpu.seq1, cpu.seq2)):
+            s.pc <<= self.pc[i]
+            s.ar <<= self.ar[i]
+            s.sp <<= self.sp
+            s.stack.memory[0:4] = bytearray(self.stacks[i])
+        for i, s in enumerate((cpu.alu0, cpu.alu1)):
+            s.regs[:] = self.regs[i]
+            s.q <<= self.q[i]
+        # Memories changed behind the signals, evaluate everything again
+        components = [cpu]
+        while len(components) > 0:
+            component = components.pop()
+            simulation.schedule(component)
+            components += component.getComponents()
+        simulation.runUntilStable()
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import time
+
+from hdlite import Simulation as sim
+from hdlite import Signal as sig
+from hdlite import Batch as batch
+from hdlite.Component import Component
+
+from examples import ALUDriver, Counter
+
+import run_cpu6
+
+def clockCPU6(top, nClocks):
+    top.reset <<= 1
+    sim.simulation.runUntilStable()
+    top.reset <<= 0
+    sim.simulation.runUntilStable()
+    for i in range(nClocks):
+        top.clock <<= 1
+        sim.simulation.runUntilStable()
+        top.clock <<= 0
+        sim.simulation.runUntilStable()
+
+def benchCPU6(nClocks=1000, eventDriven=True):
+    sim.simulation = sim.Simulation(eventDriven=eventDriven)
+    top = run_cpu6.CPU6TBPanel()
+    sim.simulation.setTopComponent(top)
+    allocations = sig.VectorSlice.allocations
+    startTime = time.time()
+    clockCPU6(top, nClocks)
+    endTime = time.time()
+    allocations = sig.VectorSlice.allocations - allocations
+    return nClocks / (endTime - startTime), allocations / nClocks
+
+def benchCPU6Cycles(nClocks=1000):
+    sim.simulation = sim.Simulation()
+    top = run_cpu6.CPU6TBPanel()
+    sim.simulation.setTopComponent(top)
+    clockCPU6(top, 0)
+    startTime = time.time()
+    sim.simulation.runCycles(top.clock, nClocks)
+    endTime = time.time()
+    return nClocks / (endTime - startTime)
+
+def benchCPU6Compiled(nClocks=10000):
+    sim.simulation = sim.Simulation()
+    top = run_cpu6.CPU6TBPanel()
+    sim.simulation.setTopComponent(top)
+    clockCPU6(top, 0)
+    startTime = time.time()
+    sim.simulation.runCompiled(top.clock, 0)
+    compileTime = time.time() - startTime
+    startTime = time.time()
+    sim.simulation.runCompiled(top.clock, nClocks)
+    endTime = time.time()
+    return nClocks / (endTime - startTime), compileTime
+
+def makeCounter(limit=10):
+    top = Component()
+    top.resetn, top.clock, top.out = sig.Signal(1), sig.Signal(), sig.Vector(4)
+    top.c1 = Counter(top.resetn, top.clock, top.out, limit)
+    return top
+
+# Lane clocks/s of size copies of a design in one Batch, and clocks/s of one
+# copy compiled
+def benchBatch(makeTop, size=1024, nClocks=1000):
+    sim.simulation = sim.Simulation()
+    top = makeTop()
+    sim.simulation.setTopComponent(top)
+    b = batch.Batch(sim.simulation, top.clock, size)
+    b.run(1)
+    startTime = time.time()
+    b.run(nClocks)
+    batched = size * nClocks / (time.time() - startTime)
+    sim.simulation = sim.Simulation()
+    top = makeTop()
+    sim.simulation.setTopComponent(top)
+    sim.simulation.runCompiled(top.clock, 1)
+    startTime = time.time()
+    sim.simulation.runCompiled(top.clock, nClocks * 10)
+    single = nClocks * 10 / (time.time() - startTime)
+    return batched, single
+
+def benchCPU6Comb(nRuns=5000):
+    sim.simulation = sim.Simulation()
+    top = run_cpu6.CPU6TBPanel()
+    sim.simulation.setTopComponent(top)
+    clockCPU6(top, 100)
+    cpu = top.cpu
+    startTime = time.time()
+    for i in range(nRuns):
+        cpu.run()
+    endTime = time.time()
+    return nRuns / (endTime - startTime)
+
+def benchCPU6VCD(fileName, nClocks=250):
+    sim.simulation = sim.Simulation(fileName)
+    tb = run_cpu6.CPU6TB(nClocks)
+    startTime = time.time()
+    sim.simulation.run(tb)
+    endTime = time.time()
+    size = os.path.getsize(fileName) if fileName else 0
+    return endTime - startTime, size
+
+if __name__ == '__main__':
+    before, allocations = benchCPU6(eventDriven=False)
+    after, allocations = benchCPU6(eventDriven=True)
+    print(f'CPU6 all components: {before:.0f} clocks/s')
+    print(f'CPU6 event driven:   {after:.0f} clocks/s ({after/before:.2f}x)')
+    cycles = benchCPU6Cycles()
+    print(f'CPU6 cycle based:    {cycles:.0f} clocks/s ({cycles/after:.2f}x event driven)')
+    compiled, compileTime = benchCPU6Compiled()
+    print(f'CPU6 compiled:       {compiled:.0f} clocks/s ({compiled/after:.2f}x event driven, compile/load {compileTime:.3f} s)')
+    if batch.np != None:
+        for label, makeTop in [('Counter', makeCounter), ('Am2901', ALUDriver)]:
+            batched, single = benchBatch(makeTop)
+            print(f'{label} batch of 1024: {batched:.0f} lane clocks/s ({batched/single:.2f}x compiled {single:.0f} clocks/s)')
+    print(f'CPU6 VectorSlice allocations: {allocations:.2f}/clock')
+    print(f'CPU6.run():          {benchCPU6Comb():.0f} runs/s')
+    # Traces only measured, not kept
+    with tempfile.TemporaryDirectory() as dir:
+        for name in [None, 'bench.vcd', 'bench.vcd.gz', 'bench.hdt']:
+            seconds, size = benchCPU6VCD(os.path.join(dir, name) if name else None)
+            print(f'CPU6TB 250 clocks VCD {name}: {seconds:.3f} s, {size} bytes')
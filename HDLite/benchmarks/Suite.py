@@ -0,0 +1,143 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from hdlite import Simulation as sim
+
+from bitslice.bitslice_tb import bitslice_tb
+from examples import ALUDriver
+
+from bench import makeCounter
+import run_cpu6
+
+# Simulation kernel throughput. Every case runs in a new process, three times:
+# timed, with a Profiler to count delta cycles, and writing a VCD file.
+# Results are appended to a JSON history file to compare commits, e.g.
+#   python -m benchmarks.Suite
+#   python -m benchmarks.Suite cpu6 --clocks 500
+
+# Pulse the reset signal of bitslice_tb
+def resetBitslice(simulation, top):
+    for value in (1, 0):
+        top.reset <<= value
+        simulation.runUntilStable()
+
+# name -> (new testbench, reset or None, default clocks)
+CASES = {
+    'counter': (lambda: makeCounter(None), None, 20000),
+    'bitslice_tb': (bitslice_tb, resetBitslice, 5000),
+    'am2901': (ALUDriver, None, 5000),
+    'cpu6': (run_cpu6.CPU6TBPanel, run_cpu6.resetCPU6, 2000),
+}
+
+# The testbench of case name in simulation, after reset
+def newDesign(simulation, name):
+    newTop, reset, defaultClocks = CASES[name]
+    with simulation:
+        top = newTop()
+        simulation.setTopComponent(top)
+    if reset != None:
+        reset(simulation, top)
+    return top
+
+# nClocks clocks of top.clock, see run_cpu6.clockCPU6(). With a VCD file,
+# the values after each clock are written 10 ns after the last ones.
+def clockDesign(simulation, top, nClocks, vcd=False):
+    for i in range(nClocks):
+        run_cpu6.clockCPU6(simulation, top)
+        if vcd:
+            simulation.vcd.addTime(10 * (i + 1))
+            simulation.vcd.writeSignals()
+
+def runCase(name, nClocks):
+    nClocks = nClocks or CASES[name][2]
+    result = {'clocks': nClocks}
+    with contextlib.redirect_stdout(io.StringIO()):
+        s = sim.Simulation()
+        top = newDesign(s, name)
+        startTime = time.time()
+        clockDesign(s, top, nClocks)
+        seconds = time.time() - startTime
+        result['clocksPerSecond'] = nClocks / seconds
+        s = sim.Simulation()
+        top = newDesign(s, name)
+        profiler = s.startProfiler()
+        clockDesign(s, top, nClocks)
+        profiler.stop()
+        deltas = sum(d * n for d, n in profiler.deltas.items())
+        result['deltasPerClock'] = deltas / nClocks
+        with tempfile.TemporaryDirectory() as dir:
+            fileName = os.path.join(dir, f'{name}.vcd')
+            s = sim.Simulation(fileName)
+            top = newDesign(s, name)
+            s.vcd.addSignals(top)
+            s.propagateSignals()
+            s.vcd.addInitialValues()
+            clockDesign(s, top, nClocks, True)
+            s.vcd.close()
+            result['vcdBytesPerClock'] = os.path.getsize(fileName) / nClocks
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    result['peakRSS'] = maxrss if sys.platform == 'darwin' else maxrss * 1024
+    return result
+
+def getCommit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('+' if dirty else '')
+
+def loadHistory(fileName):
+    if not os.path.exists(fileName):
+        return []
+    with open(fileName) as f:
+        return json.load(f)
+
+# Each case in a new process, so peak RSS is its own
+def run(names, nClocks=None, report=print):
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for name in names:
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(runCase, (name, nClocks))
+        if report != None:
+            report(formatResult(name, results[name]))
+    return results
+
+def formatResult(name, result, previous=None):
+    line = (f'{name:12} {result["clocksPerSecond"]:10.0f} clocks/s {result["deltasPerClock"]:6.2f} deltas/clock '
+        f'{result["peakRSS"] / (1 << 20):7.1f} MB {result["vcdBytesPerClock"]:8.1f} VCD bytes/clock')
+    if previous != None:
+        line += f' ({result["clocksPerSecond"] / previous["clocksPerSecond"] - 1:+.1%} clocks/s)'
+    return line
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulation kernel benchmarks')
+    parser.add_argument('names', nargs='*', default=list(CASES), help=f'cases, default all of {", ".join(CASES)}')
+    parser.add_argument('--clocks', type=int, default=None, help='clocks per case, default depends on the case')
+    parser.add_argument('--history', default='.cache/bench_history.json', help='JSON file results are appended to')
+    args = parser.parse_args()
+    history = loadHistory(args.history)
+    results = run(args.names, args.clocks, None)
+    previous = history[-1]['results'] if len(history) > 0 else {}
+    print(f'commit {getCommit()}')
+    for name, result in results.items():
+        last = previous.get(name)
+        print(formatResult(name, result, last if last != None and last['clocks'] == result['clocks'] else None))
+    history.append({'commit': getCommit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(), 'results': results})
+    os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+    with open(args.history + '.tmp', 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(args.history + '.tmp', args.history)
@@ -24,8 +24,13 @@ class Am2901(Component):
         self.f = sig.Vector(5)
         self.writeRam = sig.Signal()
         self.writeQ = sig.Signal()
+        # Values written on the next rising edge
+        self.qv = 0
+        self.bv = 0
+        self.clockedBy(clock)
+        self.memoize(key=lambda: (self.regs[self.aSel.value], self.regs[self.bSel.value]), attributes=('qv', 'bv'), complete=True)
 
-    def run(self):
+    def comb(self):
         a = self.regs[self.aSel.getIntValue()]
         b = self.regs[self.bSel.getIntValue()]
         r = 0
@@ -121,8 +126,11 @@ class Am2901(Component):
             bv = fvalue << 1
             self.writeRam <<= 1
 
-        if self.clock.isRisingEdge():
-            if self.writeQ == 1:
-                self.q <<= qv
-            if self.writeRam == 1:
-                self.regs[self.bSel.getIntValue()] = bv
+        self.qv = qv
+        self.bv = bv
+
+    def onRising(self):
+        if self.writeQ == 1:
+            self.q <<= self.qv
+        if self.writeRam == 1:
+            self.regs[self.bSel.getIntValue()] = self.bv
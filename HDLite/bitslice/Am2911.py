@@ -30,8 +30,10 @@ class Am2911(Component):
         self.clock = clock
         self.reset = reset
         self.stack = Memory(reset, clock, self.stackIn, self.stackWr, self.stackAddr, self.stackOut)
+        self.clockedBy(clock)
+        self.memoize()
 
-    def run(self):
+    def comb(self):
         if self.reset == 1:
             self.pc <<= 0
             self.ar <<= 0
@@ -61,15 +63,15 @@ class Am2911(Component):
                 # Lookahead to pre-increment stack pointer
                 self.stackAddr <<= self.sp + 1
 
-        if self.clock.isRisingEdge():
-            if self.cin == 1:
-                self.pc <<= self.yout + 1
+    def onRising(self):
+        if self.cin == 1:
+            self.pc <<= self.yout + 1
+        else:
+            self.pc <<= self.yout
+        if self.re == 0:
+            self.ar <<= self.din
+        if self.fe == 0:
+            if self.pup == 1:
+                self.sp <<= self.sp + 1
             else:
-                self.pc <<= self.yout
-            if self.re == 0:
-                self.ar <<= self.din
-            if self.fe == 0:
-                if self.pup == 1:
-                    self.sp <<= self.sp + 1
-                else:
-                    self.sp <<= self.sp - 1
+                self.sp <<= self.sp - 1
@@ -12,14 +12,14 @@ class IO(Component):
         self.clock = clock
         self.char = char
         self.write = write
+        self.clockedBy(clock)
 
-    def run(self):
-        if self.clock.isRisingEdge():
-            if self.write == 1:
-                value = self.char.getIntValue()
-                c = chr(value)
-                if c.isprintable() or c == '\n':
-                    sys.stdout.write(c)
-                    sys.stdout.flush()
-                else:
-                    print(f'({value})', end='')
+    def onRising(self):
+        if self.write == 1:
+            value = self.char.getIntValue()
+            c = chr(value)
+            if c.isprintable() or c == '\n':
+                sys.stdout.write(c)
+                sys.stdout.flush()
+            else:
+                print(f'({value})', end='')
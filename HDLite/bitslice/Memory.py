@@ -3,6 +3,8 @@ from hdlite import Signal as sig
 
 from hdlite.Component import *
 
+from bitslice import Storage as storage
+
 class Memory(Component):
     def __init__(self, reset, clock, din, write, address, out):
         super().__init__()
@@ -12,17 +14,146 @@ class Memory(Component):
         self.write = write
         self.address = address
         self.out = out
-        self.memory = [0]*256
+        self.memory = storage.words(256, len(din))
+        self.clockedBy(clock)
 
-    def run(self):
+    def comb(self):
         self.out <<= self.memory[self.address.getIntValue() & 0xff]
-        if self.clock.isRisingEdge():
-            if self.write == 1:
-                self.memory[self.address.getIntValue() & 0xff] = self.din.getIntValue()
+
+    def onRising(self):
+        if self.write == 1:
+            self.memory[self.address.getIntValue() & 0xff] = self.din.getIntValue()
 
     def read(self, fname):
-        with open(fname) as f:
-            lines = f.readlines()
-            for i, line in enumerate(lines):
-                if len(line) > 2:
-                    self.memory[i] = int(line[0:2], 16)
+        data = storage.readHex(fname)
+        if len(data) > len(self.memory):
+            raise Exception(f'{fname} holds {len(data)} words, memory holds {len(self.memory)}')
+        self.memory[0:len(data)] = data
+
+# Sparse memory of 2**addressBits words in pages of 2**pageBits words,
+# allocated when first written, so a large address space only costs the
+# pages in use. Words never written read as fill. Address ranges can be
+# mapped to devices instead, see mapDevice().
+class AddressSpace(object):
+    def __init__(self, addressBits=16, width=8, pageBits=8, fill=0):
+        self.mask = (1 << addressBits) - 1
+        self.pageBits = pageBits
+        self.pageSize = 1 << pageBits
+        self.width = width
+        self.fill = fill
+        # page number -> words
+        self.pages = {}
+        # page number -> [(start, end, read, write)] of devices in the page
+        self.devices = {}
+
+    # Addresses start to start+size-1 call read(address) and
+    # write(address, value) instead. Without read they read as fill, without
+    # write writes are ignored. read() must not change state, it is called
+    # whenever the address is looked at.
+    def mapDevice(self, start, size, read=None, write=None):
+        end = start + size
+        for n in range(start >> self.pageBits, ((end - 1) >> self.pageBits) + 1):
+            self.devices.setdefault(n, []).append((start, end, read, write))
+
+    def getDevice(self, address):
+        for device in self.devices.get(address >> self.pageBits, ()):
+            if device[0] <= address < device[1]:
+                return device
+        return None
+
+    def getPage(self, n):
+        page = self.pages.get(n)
+        if page == None:
+            page = self.pages[n] = storage.words(self.pageSize, self.width, self.fill)
+        return page
+
+    # A function like read() for addresses within the space, faster as it
+    # holds on to the pages rather than this object
+    def getReader(self):
+        pages = self.pages
+        devices = self.devices
+        pageBits = self.pageBits
+        offsetMask = self.pageSize - 1
+        fill = self.fill
+        read = self.read
+        def reader(address):
+            n = address >> pageBits
+            if n in devices:
+                return read(address)
+            page = pages.get(n)
+            return page[address & offsetMask] if page != None else fill
+        return reader
+
+    def read(self, address):
+        address &= self.mask
+        n = address >> self.pageBits
+        if n in self.devices:
+            device = self.getDevice(address)
+            if device != None:
+                return device[2](address) if device[2] != None else self.fill
+        page = self.pages.get(n)
+        if page == None:
+            return self.fill
+        return page[address & (self.pageSize - 1)]
+
+    def write(self, address, value):
+        address &= self.mask
+        n = address >> self.pageBits
+        if n in self.devices:
+            device = self.getDevice(address)
+            if device != None:
+                if device[3] != None:
+                    device[3](address, value)
+                return
+        self.getPage(n)[address & (self.pageSize - 1)] = value
+
+    # Copy words to consecutive addresses, a page at a time, bypassing devices
+    def load(self, data, start=0):
+        i = 0
+        while i < len(data):
+            address = (start + i) & self.mask
+            offset = address & (self.pageSize - 1)
+            size = min(self.pageSize - offset, len(data) - i)
+            self.getPage(address >> self.pageBits)[offset:offset + size] = data[i:i + size]
+            i += size
+
+# Memory with an AddressSpace as large as the address, e.g. 64 KiB for a
+# 16 bit address bus, with devices mapped into it
+class PagedMemory(Component):
+    def __init__(self, reset, clock, din, write, address, out, pageBits=8):
+        super().__init__()
+        self.reset = reset
+        self.clock = clock
+        self.din = din
+        self.write = write
+        self.address = address
+        self.out = out
+        self.space = AddressSpace(len(address), len(din), pageBits)
+        self.clockedBy(clock)
+
+    def comb(self):
+        self.out <<= self.space.read(self.address.getIntValue())
+
+    def onRising(self):
+        if self.write == 1:
+            self.space.write(self.address.getIntValue(), self.din.getIntValue())
+
+    def read(self, fname, start=0):
+        self.space.load(storage.readHex(fname), start)
+
+    def mapDevice(self, start, size, read=None, write=None):
+        self.space.mapDevice(start, size, read, write)
+
+    def getState(self):
+        state = super().getState()
+        state['pages'] = self.space.pages
+        return state
+
+    def setState(self, state):
+        state = dict(state)
+        # In place, other objects may hold the pages, see AddressSpace.getReader()
+        pages = self.space.pages
+        pages.clear()
+        for n, page in state.pop('pages').items():
+            setMemory(self.space.getPage(n), page)
+        super().setState(state)
@@ -3,12 +3,14 @@ from hdlite import Signal as sig
 
 from hdlite.Component import *
 
+from bitslice import Storage as storage
+
 class ROM(Component):
-    def __init__(self, address, out):
+    def __init__(self, address, out, size=2048):
         super().__init__()
         self.address = address
         self.out = out
-        self.memory = [0]*2048
+        self.memory = storage.words(size, len(out))
 
     def run(self):
         self.out <<= self.memory[self.address.getIntValue()]
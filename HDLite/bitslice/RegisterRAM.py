@@ -3,6 +3,8 @@ from hdlite import Signal as sig
 
 from hdlite.Component import *
 
+from bitslice import Storage as storage
+
 class RegisterRAM(Component):
     def __init__(self, clock, write_en, address, data_in, data_out):
         super().__init__()
@@ -11,10 +13,12 @@ class RegisterRAM(Component):
         self.write = write_en
         self.address = address
         self.out = data_out
-        self.memory = [0xf5]*256
+        self.memory = storage.words(256, len(data_in), 0xf5)
+        self.clockedBy(clock)
     
-    def run(self):
+    def comb(self):
         self.out <<= self.memory[self.address.getIntValue()]
-        if self.clock.isRisingEdge():
-            if self.write == 1:
-                self.memory[self.address.getIntValue()] = self.din.getIntValue()
+
+    def onRising(self):
+        if self.write == 1:
+            self.memory[self.address.getIntValue()] = self.din.getIntValue()
@@ -0,0 +1,56 @@
+import array
+import mmap
+import sys
+
+# Storage for ROM, RAM and memory components: a bytearray for words of up
+# to 8 bits, otherwise an array of the smallest unsigned type that holds a
+# word. Images are loaded with slice operations, not loops over bytes.
+
+TYPECODES = ('B', 'H', 'I', 'Q')
+
+def words(size, width, fill=0):
+    if width <= 8:
+        return bytearray([fill]) * size
+    for typecode in TYPECODES:
+        if array.array(typecode).itemsize * 8 >= width:
+            return array.array(typecode, [fill]) * size
+    raise Exception(f'No storage for {width} bit words')
+
+# Contents of a binary image, e.g. a .circ ROM file
+def readImage(fileName):
+    with open(fileName, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return bytes(m)
+
+# Bytes of a hex text file, the first two characters of each line, e.g.
+#   a1 // STAL #5a00
+# and 0 for lines too short to hold a byte
+def readHex(fileName):
+    with open(fileName) as f:
+        return bytes.fromhex(''.join(line[0:2] if len(line) > 2 else '00' for line in f))
+
+# Words of byte wide images, e.g. ROMs side by side on a board, the first
+# image being the most significant byte. Bytes are strided into big endian
+# 64 bit words straight from the mapped files.
+def interleave(fileNames):
+    n = len(fileNames)
+    if n > 8:
+        raise Exception(f'Cannot interleave {n} images into 64 bit words')
+    maps = []
+    try:
+        for fileName in fileNames:
+            with open(fileName, 'rb') as f:
+                maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        size = min(len(m) for m in maps)
+        data = bytearray(size * 8)
+        for i, m in enumerate(maps):
+            with memoryview(m) as view:
+                data[8 - n + i::8] = view[0:size]
+    finally:
+        for m in maps:
+            m.close()
+    result = array.array('Q')
+    result.frombytes(data)
+    if sys.byteorder == 'little':
+        result.byteswap()
+    return result
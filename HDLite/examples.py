@@ -0,0 +1,68 @@
+from hdlite import Signal as sig
+
+from hdlite.Component import *
+from bitslice.Am2901 import Am2901
+
+# Small designs shared by the tests, bench.py and benchmarks
+
+# Counts up to limit, None for no limit
+class Counter(Component):
+    def __init__(self, resetn, clock, out, limit=10):
+        super().__init__()
+        self.clock = clock
+        self.resetn = resetn
+        self.out = out
+        self.limit = limit
+
+    def run(self):
+        if self.resetn == 0:
+            self.out <<= 0
+        elif self.clock.isRisingEdge():
+            if self.limit == None or self.out < self.limit:
+                self.out <<= self.out + 1
+
+class CounterTB(Component):
+    def __init__(self, nCycles=20, width=4, limit=10, simulation=None):
+        super().__init__(simulation=simulation)
+        self.reset = Reset()
+        self.clock = Clock(nCycles)
+        self.out = sig.Vector(width)
+        self.c1 = Counter(self.reset.resetn, self.clock.clock, self.out, limit)
+
+# Am2901 driven with pseudo random inputs from a linear congruential counter
+class ALUDriver(Component):
+    def __init__(self):
+        super().__init__()
+        self.clock = sig.Signal()
+        self.count = sig.Vector(16)
+        self.din = sig.Vector(4)
+        self.aSel = sig.Vector(4)
+        self.bSel = sig.Vector(4)
+        self.src = sig.Vector(3)
+        self.op = sig.Vector(3)
+        self.dest = sig.Vector(3)
+        self.cin = sig.Signal()
+        self.yout = sig.Vector(4)
+        self.cout = sig.Signal()
+        self.fzero = sig.Signal()
+        self.f3 = sig.Signal()
+        self.ovr = sig.Signal()
+        self.alu = Am2901(self.clock, self.din, self.aSel, self.bSel, self.src, self.op, self.dest,
+            self.cin, self.yout, self.cout, self.fzero, self.f3, self.ovr)
+        self.clockedBy(self.clock)
+
+    def comb(self):
+        self.din <<= self.count[0:4]
+        self.aSel <<= self.count[4:8]
+        self.bSel <<= self.count[8:12]
+        self.src <<= self.count[12:15]
+        self.op <<= self.count[13:16]
+        self.dest <<= self.count[1:4]
+        self.cin <<= self.count[15] ^ self.count[3]
+
+    def onRising(self):
+        self.count <<= self.count.getIntValue() * 25173 + 13849
+
+    def snapshot(self):
+        values = [s.getIntValue() for s in (self.yout, self.cout, self.fzero, self.f3, self.alu.q)]
+        return values + self.alu.regs
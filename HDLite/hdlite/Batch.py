@@ -0,0 +1,302 @@
+import array
+import ast
+import copy
+import hashlib
+import inspect
+import textwrap
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from hdlite import Signal as sig
+from hdlite import Component as hc
+from hdlite import Compiler as compiler
+from hdlite.Compiler import CompileError, name, statement
+
+# Batched cycle-based simulation: size copies (lanes) of one design run in
+# lock step, every signal is a NumPy int64 array with one value per lane.
+#
+# The design is compiled as in Compiler.py, with these changes:
+#   if/elif/else run every branch that any lane takes, with a mask of the
+#   lanes that take it. Assignments in a branch only change those lanes.
+#   and, or, not and x if c else y become logical_and(), logical_or(),
+#   logical_not() and where().
+#   Data attributes a component assigns, e.g. self.count += 1 or
+#   self.regs[i] = v, are per lane: an int becomes an array of size values
+#   and a list or array of ints a (size, n) array, indexed by a per lane index.
+#   Other attributes are shared by all lanes, see Batch() to make read only
+#   attributes such as ROM contents per lane.
+#   A component settles or sees a clock edge when any lane needs it.
+# Not supported: while loops, break and continue in branches, assignment to
+# several targets in branches, and values wider than 63 bits.
+
+def isSignal(value):
+    return isinstance(value, (sig.Signal, sig.Vector, sig.VectorSlice, hc.Component))
+
+def load(node):
+    node = copy.deepcopy(node)
+    node.ctx = ast.Load()
+    return node
+
+def call(function, *args):
+    return ast.Call(name(function), list(args), [])
+
+class BatchMethodCompiler(compiler.MethodCompiler):
+    def __init__(self, design, index, method, edge):
+        super().__init__(design, index, method, edge)
+        # name of the mask of lanes running the current branch, None for all
+        self.mask = None
+        self.branches = 0
+
+    def compile(self):
+        body = super().compile()
+        # locals assigned in a branch keep their value in the other lanes
+        init = [f'l{self.index}_{local} = 0' for local in sorted(self.locals)]
+        return statement('\n'.join(init)) + body if init else body
+
+    def visitBody(self, stmts):
+        body = []
+        for stmt in stmts:
+            stmt = self.visit(stmt)
+            body.extend(stmt if isinstance(stmt, list) else [stmt])
+        return body if len(body) > 0 else [ast.Pass()]
+
+    def visit_If(self, node):
+        self.branches += 1
+        prefix = f'{self.index}_{self.branches}'
+        body = [ast.Assign([name(f'k{prefix}', True)], self.visit(node.test))]
+        outer = self.mask
+        for branch, mask, condition in ((node.body, f'm{prefix}', f'k{prefix}'),
+                (node.orelse, f'n{prefix}', f'logical_not(k{prefix})')):
+            if len(branch) == 0:
+                continue
+            if outer != None:
+                condition = f'logical_and({outer}, {condition})'
+            run = statement(f'{mask} = {condition}\nif any_({mask}):\n    pass')
+            self.mask = mask
+            run[1].body = self.visitBody(branch)
+            self.mask = outer
+            body.extend(run)
+        return body
+
+    def visit_While(self, node):
+        self.fail('while is not supported in batch mode')
+
+    def visit_Break(self, node):
+        if self.mask != None:
+            self.fail('break in if is not supported in batch mode')
+        return node
+
+    def visit_Continue(self, node):
+        if self.mask != None:
+            self.fail('continue in if is not supported in batch mode')
+        return node
+
+    def visit_BoolOp(self, node):
+        function = 'logical_and' if isinstance(node.op, ast.And) else 'logical_or'
+        values = [self.visit(v) for v in node.values]
+        result = values[0]
+        for value in values[1:]:
+            result = call(function, result, value)
+        return ast.copy_location(result, node)
+
+    def visit_UnaryOp(self, node):
+        if isinstance(node.op, ast.Not):
+            return ast.copy_location(call('logical_not', self.visit(node.operand)), node)
+        return super().visit_UnaryOp(node)
+
+    def visit_IfExp(self, node):
+        return ast.copy_location(call('where', self.visit(node.test), self.visit(node.body), self.visit(node.orelse)), node)
+
+    def lane(self, node):
+        resolved = self.resolve(node)
+        if resolved == None or len(resolved[1]) != 1:
+            return None
+        owner, attrs, value = resolved
+        return self.design.lanes.get((owner.index, attrs[0]))
+
+    def visit_Attribute(self, node):
+        lane = self.lane(node)
+        if lane != None:
+            laneName, table = lane
+            if table:
+                self.fail(f'per lane list {node.attr} can only be indexed')
+            return ast.copy_location(name(laneName, not isinstance(node.ctx, ast.Load)), node)
+        result = super().visit_Attribute(node)
+        if not isinstance(node.ctx, ast.Load):
+            self.fail(f'assignment to {node.attr} in batch mode, it is not an int or a list of ints')
+        return result
+
+    def visit_Subscript(self, node):
+        lane = self.lane(node.value)
+        if lane == None or not lane[1]:
+            return super().visit_Subscript(node)
+        index = ast.Tuple([name('R'), self.visit(node.slice)], ast.Load())
+        return ast.copy_location(ast.Subscript(name(lane[0]), index, node.ctx), node)
+
+    def visit_Assign(self, node):
+        node = self.generic_visit(node)
+        if self.mask != None and (len(node.targets) != 1 or isinstance(node.targets[0], (ast.Tuple, ast.List))):
+            self.fail('assignment to several targets in if is not supported in batch mode')
+        return self.masked(node)
+
+    def visit_AugAssign(self, node):
+        if isinstance(node.op, ast.LShift):
+            node = super().visit_AugAssign(node)
+            if isinstance(node, ast.Assign):
+                return self.masked(node)
+        else:
+            node = self.generic_visit(node)
+        assign = ast.Assign([node.target], ast.BinOp(load(node.target), node.op, node.value))
+        return self.masked(ast.copy_location(assign, node))
+
+    # Only change the lanes running the current branch
+    def masked(self, assign):
+        if self.mask == None:
+            return assign
+        target = assign.targets[0]
+        assign.value = call('where', name(self.mask), assign.value, load(target))
+        return assign
+
+class BatchDesign(compiler.CompiledDesign):
+    methodCompiler = BatchMethodCompiler
+    arguments = 'V, C, A, R, nCycles'
+    settleFirst = True
+
+    def __init__(self, simulation, clock, cacheDir=None, perLane=()):
+        self.findLanes(simulation.components, perLane)
+        super().__init__(simulation, clock, cacheDir)
+
+    # Data attributes with a value per lane: (component index, name) ->
+    # (local name, is a list), in state order
+    def findLanes(self, components, perLane):
+        self.lanes = {}
+        # (component, name, value) for each per lane attribute
+        self.state = []
+        for p in components:
+            for attr in self.assigned(p):
+                self.addLane(p, attr)
+        for p, attr in perLane:
+            self.addLane(p, attr)
+
+    def addLane(self, p, attr):
+        if (p.index, attr) in self.lanes:
+            return
+        value = getattr(p, attr)
+        if isinstance(value, int):
+            table = False
+        elif isinstance(value, bytearray) or (isinstance(value, array.array) and value.typecode in 'bBhHiIlLqQ'):
+            table = True
+        elif isinstance(value, (list, tuple)) and all(isinstance(v, int) for v in value):
+            table = True
+        else:
+            raise CompileError(f'{type(p).__name__}.{attr} must be an int or a list or array of ints to have a value per lane')
+        self.lanes[(p.index, attr)] = (f'a{p.index}_{attr}', table)
+        self.state.append((p, attr, value))
+
+    # Attributes of p its methods assign, other than signals
+    def assigned(self, p):
+        cls = type(p)
+        methods = [cls.run] if cls.run is not hc.Component.run else [cls.comb, cls.onRising]
+        attrs = []
+        for method in methods:
+            if method in (hc.Component.comb, hc.Component.onRising):
+                continue
+            tree = ast.parse(textwrap.dedent(inspect.getsource(method)))
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Assign):
+                    targets = node.targets
+                elif isinstance(node, (ast.AugAssign, ast.AnnAssign, ast.For)):
+                    targets = [node.target]
+                else:
+                    continue
+                for target in targets:
+                    while isinstance(target, ast.Subscript):
+                        target = target.value
+                    if (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name)
+                            and target.value.id == 'self' and target.attr not in attrs
+                            and not isSignal(getattr(p, target.attr, None))):
+                        attrs.append(target.attr)
+        return attrs
+
+    def getKey(self):
+        h = hashlib.sha256(super().getKey().encode())
+        h.update(repr(('batch', [(p.index, attr, type(value).__name__) for p, attr, value in self.state])).encode())
+        return h.hexdigest()
+
+    def getNamespace(self):
+        namespace = super().getNamespace()
+        namespace.update({'where': np.where, 'any_': np.any, 'logical_and': np.logical_and,
+            'logical_or': np.logical_or, 'logical_not': np.logical_not})
+        return namespace
+
+    def changed(self, i):
+        return f'any_(f{i} != s{i})'
+
+    def getBindings(self):
+        bindings = []
+        saves = []
+        for j, (p, attr, value) in enumerate(self.state):
+            laneName, table = self.lanes[(p.index, attr)]
+            bindings.append(f'{laneName} = A[{j}]')
+            if not table:
+                saves.append(f'A[{j}] = {laneName}')
+        return bindings, saves
+
+# Runs size copies of the design that share the clock. Lanes start from the
+# current state of the simulation, use setValue() and setState() to make
+# them differ. perLane lists (component, name) of attributes the design only
+# reads that should have a value per lane, e.g. ROM contents.
+class Batch(object):
+    def __init__(self, simulation, clock, size, perLane=()):
+        if np == None:
+            raise Exception('Batch simulation requires numpy')
+        if not simulation.sensitivityValid:
+            simulation.buildSensitivity()
+        for s in simulation.changed:
+            s.prepare()
+        simulation.changed = []
+        simulation.settle()
+        self.simulation = simulation
+        self.size = size
+        self.design = BatchDesign(simulation, clock, simulation.cacheDir, perLane)
+        self.signalIndex = self.design.signalIndex
+        self.values = [self.lanes(s.value) for s in simulation.signals]
+        self.state = []
+        for p, attr, value in self.design.state:
+            if isinstance(value, int):
+                self.state.append(self.lanes(value))
+            else:
+                self.state.append(np.tile(np.array(value, dtype=np.int64), (size, 1)))
+        self.laneIndex = {(p.index, attr): j for j, (p, attr, value) in enumerate(self.design.state)}
+        self.range = np.arange(size)
+
+    def lanes(self, value):
+        return np.array(np.broadcast_to(value, (self.size,)), dtype=np.int64)
+
+    # Values of a signal, one per lane
+    def getValue(self, signal):
+        return self.values[self.signalIndex[id(signal)]].copy()
+
+    def setValue(self, signal, values):
+        self.values[self.signalIndex[id(signal)]] = self.lanes(values) & ~(-1 << len(signal))
+
+    def getState(self, component, attr):
+        return self.state[self.laneIndex[(component.index, attr)]].copy()
+
+    def setState(self, component, attr, values):
+        j = self.laneIndex[(component.index, attr)]
+        self.state[j] = np.array(np.broadcast_to(values, self.state[j].shape), dtype=np.int64)
+
+    def run(self, nCycles):
+        values = self.values
+        try:
+            self.design.function(values, self.design.components, self.state, self.range, nCycles)
+        finally:
+            for i, value in enumerate(values):
+                values[i] = self.lanes(value)
+            for j, (p, attr, value) in enumerate(self.design.state):
+                if isinstance(value, int):
+                    self.state[j] = self.lanes(self.state[j])
@@ -0,0 +1,569 @@
+import ast
+import builtins
+import copy
+import hashlib
+import importlib.util
+import inspect
+import marshal
+import os
+import sys
+import textwrap
+
+from hdlite import Simulation as sim
+from hdlite import Signal as sig
+from hdlite import Component as hc
+
+# Cycle-based simulation of a whole design by one generated Python function,
+# see Simulation.runCompiled().
+#
+# The comb(), onRising() and run() methods of every component are inlined
+# into a function cycles(V, C, nCycles). Signals are local ints and the
+# Signal operators are replaced by the int operations they perform,
+# including masking of int operands to the signal width. Components are
+# evaluated in level order with the same cycle semantics as runCycles().
+# Supported in those methods: signals held by the component or its child
+# components, plain data attributes, locals, globals and builtins. Calls to
+# component methods such as self.wait() are not supported.
+#
+# Generated code is cached in cacheDir or $HDLITE_CACHE, if set. Cached
+# code is loaded and run as is, so the cache directory must be trusted,
+# like a directory on sys.path. A header only guards against files written
+# by another Python or for another design, or cut short.
+
+
+class CompileError(Exception):
+    pass
+
+# First line of a cache file for the design with key holding data
+def cacheHeader(key, data):
+    return f'hdlite {sys.implementation.cache_tag} {key} {hashlib.sha256(data).hexdigest()}\n'.encode()
+
+def sizeError(size, other):
+    raise Exception(f'Sizes do not match {size} != {other}')
+
+# int operators each Signal operator performs on its value
+OPERATORS = (ast.BitAnd, ast.BitOr, ast.BitXor, ast.Add, ast.Sub, ast.LShift, ast.RShift)
+EDGES = ('isRisingEdge', 'isFallingEdge', 'isChanged')
+
+def constant(value):
+    return ast.Constant(value)
+
+def name(id, store=False):
+    return ast.Name(id, ast.Store() if store else ast.Load())
+
+def statement(source):
+    return ast.parse(source).body
+
+# A signal or slice in an expression: its value and its type
+class Ref(object):
+    def __init__(self, index, start, size, isSignal):
+        self.index = index
+        self.start = start
+        self.size = size
+        self.mask = ~(-1 << size)
+        # Signal, as opposed to Vector or VectorSlice
+        self.isSignal = isSignal
+
+    def value(self):
+        if self.start == None:
+            return name(f's{self.index}')
+        return ast.parse(f'(s{self.index} >> {self.start}) & {self.mask}', mode='eval').body
+
+    # Signal.rhs() and AbstractVector.rhs()
+    def rhs(self, node):
+        ref = getattr(node, 'ref', None)
+        if ref != None:
+            if ref.size != self.size:
+                return ast.parse(f'sizeError({self.size}, {ref.size})', mode='eval').body
+            return ref.value()
+        if isinstance(node, ast.Constant) and type(node.value) in (int, bool):
+            return constant(node.value & self.mask)
+        return ast.BinOp(node, ast.BitAnd(), constant(self.mask))
+
+# Rewrites one method of one component
+class MethodCompiler(ast.NodeTransformer):
+    def __init__(self, design, index, method, edge):
+        self.design = design
+        self.index = index
+        self.component = design.components[index]
+        self.method = method
+        # Method runs at the clock edge
+        self.edge = edge
+        self.locals = set()
+        self.reads = []
+        self.writes = []
+
+    def fail(self, message):
+        raise CompileError(f'{type(self.component).__name__}.{self.method.__name__}(): {message}')
+
+    def compile(self):
+        tree = ast.parse(textwrap.dedent(inspect.getsource(self.method)))
+        function = tree.body[0]
+        for arg in function.args.args[1:]:
+            self.locals.add(arg.arg)
+        for node in (n for stmt in function.body for n in ast.walk(stmt)):
+            if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+                self.locals.add(node.id)
+            if isinstance(node, (ast.Return, ast.Yield, ast.YieldFrom, ast.Lambda, ast.FunctionDef,
+                    ast.ClassDef, ast.Global, ast.Nonlocal, ast.AsyncFunctionDef)):
+                self.fail(f'{type(node).__name__} is not supported')
+        body = []
+        for stmt in function.body:
+            stmt = self.visit(stmt)
+            body.extend(stmt if isinstance(stmt, list) else [stmt])
+        return body
+
+    # Component, signal or other object an attribute chain on self refers to
+    def resolve(self, node):
+        attrs = []
+        while isinstance(node, ast.Attribute):
+            attrs.insert(0, node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name) or node.id != 'self':
+            return None
+        owner = self.component
+        for i, attr in enumerate(attrs):
+            value = getattr(owner, attr, None)
+            if i == len(attrs) - 1 or not isinstance(value, hc.Component):
+                return owner, attrs[i:], value
+            owner = value
+        return owner, [], owner
+
+    def signalRef(self, value):
+        if isinstance(value, sig.VectorSlice):
+            return Ref(self.design.signalIndex[id(value.vector)], value.start, value.size, False)
+        if isinstance(value, (sig.Signal, sig.Vector)):
+            return Ref(self.design.signalIndex[id(value)], None, len(value), isinstance(value, sig.Signal))
+        return None
+
+    # Value of a signal as a plain int
+    def readNode(self, ref):
+        if ref.index not in self.reads:
+            self.reads.append(ref.index)
+        return ref.value()
+
+    # Value of a signal, still typed for the operators
+    def refNode(self, ref):
+        node = self.readNode(ref)
+        node.ref = ref
+        return node
+
+    def visit_Name(self, node):
+        if node.id == 'self':
+            self.fail('self can only be used to access attributes')
+        if node.id in self.locals:
+            return ast.copy_location(name(f'l{self.index}_{node.id}', not isinstance(node.ctx, ast.Load)), node)
+        return ast.copy_location(name(self.design.globalName(self.method, node.id)), node)
+
+    def visit_Attribute(self, node):
+        resolved = self.resolve(node)
+        if resolved == None:
+            return self.generic_visit(node)
+        owner, attrs, value = resolved
+        if len(attrs) > 1 and self.signalRef(getattr(owner, attrs[0], None)) != None:
+            self.fail(f'signal attribute {attrs[0]}.{attrs[1]} is not supported')
+        if len(attrs) == 1:
+            ref = self.signalRef(value)
+            if ref != None:
+                if not isinstance(node.ctx, ast.Load):
+                    self.fail(f'assignment to signal {attrs[0]}, use <<=')
+                return ast.copy_location(self.refNode(ref), node)
+        if len(attrs) == 0 or isinstance(value, hc.Component):
+            self.fail('components can only be used to access attributes')
+        result = name(self.design.componentName(owner))
+        for i, attr in enumerate(attrs):
+            ctx = node.ctx if i == len(attrs) - 1 else ast.Load()
+            result = ast.Attribute(result, attr, ctx)
+        return ast.copy_location(result, node)
+
+    def visit_Subscript(self, node):
+        value = self.visit(node.value)
+        ref = getattr(value, 'ref', None)
+        if ref == None:
+            node.value = value
+            node.slice = self.visit(node.slice)
+            return node
+        if ref.start != None:
+            self.fail('slices of slices are not supported')
+        start, size = self.bits(node.slice)
+        return ast.copy_location(self.refNode(Ref(ref.index, start, size, False)), node)
+
+    # Constant bit index or range of a Vector subscript
+    def bits(self, index):
+        if isinstance(index, ast.Slice) and index.step == None:
+            start = self.constantValue(index.lower)
+            stop = self.constantValue(index.upper)
+            if start >= stop:
+                self.fail(f'bit range must be greater than zero: {start}:{stop}')
+            return start, stop - start
+        return self.constantValue(index), 1
+
+    def constantValue(self, node):
+        if node == None or any(isinstance(n, (ast.Name, ast.Attribute, ast.Call)) for n in ast.walk(node)):
+            self.fail('bit indexes must be constant')
+        return eval(compile(ast.Expression(node), '<bits>', 'eval'), {'__builtins__': {}})
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Attribute):
+            ref = None
+            signal = None
+            if isinstance(func.value, ast.Subscript):
+                value = self.visit(func.value)
+                ref = getattr(value, 'ref', None)
+                if ref == None:
+                    func.value = value
+                    node.args = [self.visit(arg) for arg in node.args]
+                    node.keywords = [self.visit(k) for k in node.keywords]
+                    return node
+            else:
+                resolved = self.resolve(func.value)
+                if resolved != None:
+                    owner, attrs, signal = resolved
+                    if isinstance(signal, hc.Component):
+                        self.fail(f'component method {func.attr}() is not supported')
+                    if len(attrs) == 1:
+                        ref = self.signalRef(signal)
+            if ref != None:
+                if func.attr == 'getIntValue':
+                    return ast.copy_location(self.readNode(ref), node)
+                if func.attr in EDGES and ref.start == None:
+                    return ast.copy_location(self.edgeNode(signal, func.attr), node)
+                self.fail(f'signal method {func.attr}() is not supported')
+        return self.generic_visit(node)
+
+    # Edges are only seen on the clock, at the edge. Like Signal.isChanged()
+    # seeing the edge triggers the component again.
+    def edgeNode(self, signal, method):
+        if not self.edge or signal is not self.design.clock:
+            return constant(False)
+        seen = f'(t{self.index} := True)'
+        if method == 'isFallingEdge':
+            return ast.parse(f'{seen} and False', mode='eval').body
+        return ast.parse(seen, mode='eval').body
+
+    def visit_BinOp(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        ref = getattr(left, 'ref', None)
+        if ref != None and isinstance(node.op, OPERATORS):
+            right = ref.rhs(right)
+        return ast.copy_location(ast.BinOp(left, node.op, right), node)
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        ref = getattr(operand, 'ref', None)
+        if ref != None and isinstance(node.op, ast.Invert):
+            if ref.isSignal:
+                return ast.copy_location(ast.BinOp(constant(1), ast.Sub(), operand), node)
+            return ast.copy_location(ast.BinOp(ast.UnaryOp(ast.Invert(), operand), ast.BitAnd(), constant(ref.mask)), node)
+        return ast.copy_location(ast.UnaryOp(node.op, operand), node)
+
+    def visit_Compare(self, node):
+        left = self.visit(node.left)
+        comparators = [self.visit(c) for c in node.comparators]
+        if len(comparators) == 1:
+            right = comparators[0]
+            ref = getattr(left, 'ref', None)
+            if ref != None:
+                right = ref.rhs(right)
+            else:
+                ref = getattr(right, 'ref', None)
+                if ref != None:
+                    left = ref.rhs(left)
+        elif any(getattr(n, 'ref', None) != None for n in [left] + comparators):
+            self.fail('chained comparisons of signals are not supported')
+        return ast.copy_location(ast.Compare(left, node.ops, comparators), node)
+
+    def visit_AugAssign(self, node):
+        if not isinstance(node.op, ast.LShift):
+            return self.generic_visit(node)
+        target = node.target
+        index = None
+        if isinstance(target, ast.Subscript):
+            index = target.slice
+            target = target.value
+        resolved = self.resolve(target)
+        ref = None
+        if resolved != None and len(resolved[1]) == 1:
+            ref = self.signalRef(resolved[2])
+        if ref == None:
+            return self.generic_visit(node)
+        if index != None:
+            if ref.start != None:
+                self.fail('slices of slices are not supported')
+            start, size = self.bits(index)
+            ref = Ref(ref.index, start, size, False)
+        value = ref.rhs(self.visit(node.value))
+        i = ref.index
+        if i not in self.writes:
+            self.writes.append(i)
+        if ref.start == None:
+            assign = ast.Assign([name(f'f{i}', True)], value)
+        else:
+            fieldMask = ref.mask << ref.start
+            merged = ast.parse(f'(f{i} & {~fieldMask}) | (x << {ref.start})', mode='eval').body
+            merged.right.left = value
+            assign = ast.Assign([name(f'f{i}', True)], merged)
+        return ast.copy_location(assign, node)
+
+# Generated code and the objects it refers to for one design and clock
+class CompiledDesign(object):
+    methodCompiler = MethodCompiler
+    # arguments of the generated function, see run()
+    arguments = 'V, C, nCycles'
+    # settle all components once before the first cycle
+    settleFirst = False
+
+    def __init__(self, simulation, clock, cacheDir=None):
+        self.simulation = simulation
+        self.clock = clock
+        self.components = simulation.components
+        self.signals = simulation.signals
+        self.signalIndex = {id(s): i for i, s in enumerate(self.signals)}
+        self.componentIndex = {id(p): i for i, p in enumerate(self.components)}
+        if cacheDir == None:
+            cacheDir = os.environ.get('HDLITE_CACHE')
+        self.cacheDir = cacheDir
+        # (module name, name) of globals the generated code uses
+        self.globals = []
+        self.usedComponents = set()
+        # generated module, None if loaded from the cache
+        self.tree = None
+        self.key = self.getKey()
+        fileName = os.path.join(cacheDir, f'{self.key}.bin') if cacheDir != None else None
+        cached = self.loadCache(fileName) if fileName != None else None
+        if cached != None:
+            code, self.globals = cached
+        else:
+            self.tree = self.generate()
+            code = compile(self.tree, f'<hdlite {self.key[:12]}>', 'exec')
+            if fileName != None:
+                data = marshal.dumps((code, self.globals))
+                os.makedirs(cacheDir, exist_ok=True)
+                with open(fileName + '.tmp', 'wb') as f:
+                    f.write(cacheHeader(self.key, data))
+                    f.write(data)
+                os.replace(fileName + '.tmp', fileName)
+        self.function = self.load(code)
+
+    # (code, globals) from the cache file, None if there is none or its
+    # header does not match this design and Python
+    def loadCache(self, fileName):
+        if not os.path.exists(fileName):
+            return None
+        with open(fileName, 'rb') as f:
+            header = f.readline()
+            data = f.read()
+        if header != cacheHeader(self.key, data):
+            return None
+        return marshal.loads(data)
+
+    # Hash of the component sources and the design structure
+    def getKey(self):
+        h = hashlib.sha256()
+        h.update(importlib.util.MAGIC_NUMBER)
+        h.update(inspect.getsource(sys.modules[__name__]).encode())
+        sources = {}
+        for p in self.components:
+            for cls in type(p).__mro__:
+                if cls is not object and cls not in sources:
+                    try:
+                        sources[cls] = inspect.getsource(cls)
+                    except (OSError, TypeError):
+                        raise CompileError(f'No source for {cls.__name__}')
+        for cls, source in sources.items():
+            h.update(f'{cls.__module__}.{cls.__qualname__}\n{source}'.encode())
+        for p in self.components:
+            attrs = []
+            for attr, value in p.__dict__.items():
+                if isinstance(value, sig.VectorSlice):
+                    attrs.append((attr, 'slice', self.signalIndex[id(value.vector)], value.start, value.size))
+                elif isinstance(value, (sig.Signal, sig.Vector)):
+                    attrs.append((attr, 'signal', self.signalIndex[id(value)]))
+                elif isinstance(value, hc.Component):
+                    attrs.append((attr, 'component', self.componentIndex[id(value)]))
+            clock = p.risingClock
+            clock = self.signalIndex[id(clock)] if clock is not None else None
+            h.update(repr((type(p).__module__, type(p).__qualname__, attrs, clock, p.level)).encode())
+        for s in self.signals:
+            h.update(repr((type(s).__name__, len(s), [p.index for p in s.fanout])).encode())
+        h.update(repr(self.signalIndex[id(self.clock)]).encode())
+        return h.hexdigest()
+
+    def globalName(self, method, id):
+        key = (method.__module__, id)
+        if key not in self.globals:
+            self.globals.append(key)
+        return f'g{self.globals.index(key)}_{id}'
+
+    def componentName(self, component):
+        index = self.componentIndex[id(component)]
+        self.usedComponents.add(index)
+        return f'c{index}'
+
+    def getNamespace(self):
+        return {'sizeError': sizeError}
+
+    def load(self, code):
+        namespace = self.getNamespace()
+        for i, (moduleName, id) in enumerate(self.globals):
+            module = sys.modules.get(moduleName)
+            if module != None and id in module.__dict__:
+                namespace[f'g{i}_{id}'] = module.__dict__[id]
+            elif hasattr(builtins, id):
+                namespace[f'g{i}_{id}'] = getattr(builtins, id)
+        exec(code, namespace)
+        return namespace['cycles']
+
+    def compileMethod(self, index, method, edge):
+        compiler = self.methodCompiler(self, index, method, edge)
+        body = compiler.compile()
+        return body, compiler.reads, compiler.writes
+
+    # Commit signals written by a component and trigger the readers
+    def commit(self, writes):
+        body = []
+        for i in writes:
+            readers = [p.index for p in self.signals[i].fanout if self.reads(p.index, i)]
+            commit = statement(f'if {self.changed(i)}:\n    s{i} = f{i}')
+            if len(readers) > 0:
+                commit[0].body.extend(statement(' = '.join(f't{k}' for k in readers) + ' = True'))
+            body.extend(commit)
+        return body
+
+    def changed(self, i):
+        return f'f{i} != s{i}'
+
+    # Statements binding and saving other state the generated code uses
+    def getBindings(self):
+        return [], []
+
+    def reads(self, index, signalIndex):
+        return signalIndex in self.settleReads.get(index, ())
+
+    def generate(self):
+        clock = self.clock
+        components = self.components
+        clockIndex = self.signalIndex[id(clock)]
+        # Combinational part of each component, as in Simulation.settle()
+        settle = {}
+        errors = {}
+        self.settleReads = {}
+        for p in components:
+            if type(p).run is hc.Component.run:
+                method = type(p).comb
+            else:
+                method = type(p).run
+            if method is hc.Component.comb:
+                continue
+            try:
+                body, reads, writes = self.compileMethod(p.index, method, False)
+            except CompileError as e:
+                errors[p.index] = e
+                continue
+            settle[p.index] = (body, writes)
+            self.settleReads[p.index] = reads
+        # Edge part, as in Simulation.runCycles()
+        edge = []
+        edgeWrites = []
+        for p in clock.fanout:
+            method = type(p).comb if type(p).run is hc.Component.run else type(p).run
+            body, reads, writes = self.compileMethod(p.index, method, True)
+            edge.extend(body)
+            edgeWrites.extend(i for i in writes if i not in edgeWrites)
+        for p in clock.clocked:
+            body, reads, writes = self.compileMethod(p.index, type(p).onRising, True)
+            edge.extend(body)
+            if p.index in settle:
+                edge.extend(statement(f't{p.index} = True'))
+            edgeWrites.extend(i for i in writes if i not in edgeWrites)
+        # Leave out components nothing triggers, e.g. a Reset without inputs
+        reachable = set(p.index for p in clock.fanout) | set(p.index for p in clock.clocked)
+        if self.settleFirst:
+            reachable |= set(settle) | set(errors)
+        changed = True
+        while changed:
+            changed = False
+            written = set(edgeWrites) | set(i for k in reachable if k in settle for i in settle[k][1])
+            for i in written:
+                for p in self.signals[i].fanout:
+                    if p.index not in reachable and (p.index in errors or self.reads(p.index, i)):
+                        reachable.add(p.index)
+                        changed = True
+        for index in sorted(reachable):
+            if index in errors:
+                raise errors[index]
+        settle = {k: v for k, v in settle.items() if k in reachable}
+        self.settleReads = {k: v for k, v in self.settleReads.items() if k in reachable}
+        edge.extend(self.commit(edgeWrites))
+        # Settle in level order, loops until stable
+        levels = {}
+        for index in settle:
+            levels.setdefault(components[index].level, []).append(index)
+        names = self.simulation.getSignalNames()
+        message = 'Combinational logic does not settle'
+        body = []
+        for level in sorted(levels):
+            members = levels[level]
+            loop = any(self.reads(k, i) for j in members for i in settle[j][1] for k in members)
+            runs = []
+            for index in members:
+                run = statement(f'if t{index}:\n    t{index} = False')
+                run[0].body.extend(settle[index][0])
+                run[0].body.extend(self.commit(settle[index][1]))
+                runs.extend(run)
+            if not loop:
+                body.extend(runs)
+                continue
+            signals = [i for j in members for i in settle[j][1] if any(self.reads(k, i) for k in members)]
+            loopMessage = 'Combinational loop does not settle: ' + ', '.join(names.get(id(self.signals[i]), '?') for i in signals)
+            flags = ' or '.join(f't{index}' for index in members)
+            loopBody = statement(f'n = 0\nwhile {flags}:\n    n += 1\n    if n > {sim.LOOP_LIMIT}:\n        raise Exception({loopMessage!r})')
+            loopBody[1].body.extend(runs)
+            body.extend(loopBody)
+        # Triggers back to an earlier level start over
+        if len(settle) > 0:
+            flags = ' or '.join(f't{index}' for index in sorted(settle))
+            outer = statement(f'm = 0\nwhile True:\n    m += 1\n    if m > {sim.LOOP_LIMIT}:\n        raise Exception({message!r})\n    if not ({flags}):\n        break')
+            outer[1].body[2:2] = body
+            body = outer
+        # The function
+        written = sorted(set(edgeWrites) | set(i for b, w in settle.values() for i in w))
+        prologue = [f's{i} = V[{i}]' for i in range(len(self.signals))]
+        prologue += [f'f{i} = s{i}' for i in written]
+        prologue += [f'c{i} = C[{i}]' for i in sorted(self.usedComponents)]
+        prologue += [f't{i} = {self.settleFirst}' for i in sorted(settle)]
+        epilogue = [f'V[{i}] = s{i}' for i in written]
+        bindings, saves = self.getBindings()
+        prologue += bindings
+        epilogue += saves
+        function = statement(f'def cycles({self.arguments}):\n    pass')[0]
+        function.body = statement('\n'.join(prologue))
+        if self.settleFirst:
+            function.body.extend(copy.deepcopy(body))
+        cycle = statement(f'for cycle in range(nCycles):\n    s{clockIndex} = f{clockIndex} = 1')[0]
+        cycle.body.extend(edge)
+        cycle.body.extend(body)
+        cycle.body.extend(statement(f's{clockIndex} = f{clockIndex} = 0'))
+        run = statement('try:\n    pass\nfinally:\n    pass')[0]
+        run.body = [cycle]
+        run.finalbody = statement('\n'.join(epilogue)) if epilogue else statement('pass')
+        function.body.append(run)
+        if clockIndex not in written:
+            function.body.insert(0, statement(f'f{clockIndex} = 0')[0])
+        module = ast.Module([function], [])
+        return ast.fix_missing_locations(module)
+
+    def getSource(self):
+        return ast.unparse(self.tree) if self.tree != None else None
+
+    # Run nCycles on the signal values, see Simulation.runCompiled()
+    def run(self, nCycles):
+        signals = self.signals
+        values = [s.value for s in signals]
+        try:
+            self.function(values, self.components, nCycles)
+        finally:
+            for s, value in zip(signals, values):
+                s.value = s.priorValue = s.futureValue = value
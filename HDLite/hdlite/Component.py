@@ -1,23 +1,192 @@
+import array
 
 from hdlite import Simulation as sim
 from hdlite import Signal as sig
+from hdlite import Schedule as sched
+from hdlite import Memo as memo
 
-class Component(object):
-    def __init__(self, name='top'):
+# Attributes describing the design rather than its state
+STRUCTURE = ('name', 'signalMap', 'componentMap', 'parent', 'sensitivity', 'outputs', 'risingClock', 'index', 'level', 'simulation')
+
+def isPlainData(value):
+    if value is None or isinstance(value, (bool, int, float, str, bytes, bytearray, array.array)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(isPlainData(v) for v in value)
+    if isinstance(value, dict):
+        return all(isPlainData(k) and isPlainData(v) for k, v in value.items())
+    return False
+
+# Copy value into the memory var in place. A checkpoint holds bytearray
+# and array.array memories as bytes.
+def setMemory(var, value):
+    if isinstance(var, array.array) and isinstance(value, (bytes, bytearray)):
+        value = array.array(var.typecode, value)
+    var[:] = value
+
+# Add the signals var holds to signals: var itself, the vector of a slice
+# or the signals of a child component, list, tuple or dict, e.g. for reads
+# like self.child.y or self.outputs[i]
+def collectSignals(var, signals, seen):
+    if isinstance(var, sig.VectorSlice):
+        var = var.vector
+    if isinstance(var, (sig.Signal, sig.Vector)):
+        if not any(var is s for s in signals):
+            signals.append(var)
+        return
+    if id(var) in seen:
+        return
+    if isinstance(var, Component):
+        seen.add(id(var))
+        for name, value in var.__dict__.items():
+            if name not in STRUCTURE:
+                collectSignals(value, signals, seen)
+    elif isinstance(var, (list, tuple, dict)):
+        seen.add(id(var))
+        for value in (var.values() if isinstance(var, dict) else var):
+            collectSignals(value, signals, seen)
+
+# Components created with an explicit simulation enter it until their
+# __init__() returns, see Component.__init__()
+class ComponentType(type):
+    def __call__(cls, *args, **kwargs):
+        stack = sim.contextStack()
+        depth = len(stack)
+        try:
+            return super().__call__(*args, **kwargs)
+        finally:
+            del stack[depth:]
+
+# Signals and components a subclass creates in __init__() after calling
+# super().__init__(name, simulation) belong to simulation too, so designs
+# can be built side by side without with Simulation(): blocks
+class Component(object, metaclass=ComponentType):
+    def __init__(self, name='top', simulation=None):
         self.name = name
         self.nextTime = 0
         self.signalMap = {}
         self.componentMap = {}
         self.parent = None
-        sim.simulation.addComponent(self)
+        # Signals read by run(), None to learn them from attributes
+        self.sensitivity = None
+        # Signals written by comb() or run(), None to learn them from source
+        self.outputs = None
+        # Clock whose rising edges run onRising(), see clockedBy()
+        self.risingClock = None
+        # simulation this component belongs to, see Simulation.__enter__()
+        self.simulation = simulation if simulation != None else sim.current()
+        self.simulation.addComponent(self)
+        if simulation != None:
+            sim.contextStack().append(simulation)
 
     def wait(self, time):
-        if sim.simulation.time >= self.nextTime :
-            self.nextTime = sim.simulation.time + time
+        if self.simulation.time >= self.nextTime :
+            self.nextTime = self.simulation.time + time
+            self.simulation.schedule(self)
+
+    # Declare the signals run() reads, e.g. self.sensitive(self.a, self.b)
+    def sensitive(self, *signals):
+        self.sensitivity = [s.vector if isinstance(s, sig.VectorSlice) else s for s in signals]
+
+    # Instead of overriding run(), a component can override comb() and
+    # onRising() and call clockedBy(clock). The simulation then runs comb()
+    # only when its inputs change and onRising() once per rising clock edge.
+    def clockedBy(self, clock):
+        self.risingClock = clock
+
+    # Declare comb(), or run() if not split, a pure function of the signals
+    # it reads and key(), e.g. register contents, setting only its outputs
+    # and the attributes given. complete means it assigns every output on
+    # every call. Results are then looked up in a table of at most size
+    # entries, see Memo. Call it at the end of __init__().
+    def memoize(self, size=4096, key=None, attributes=(), complete=False):
+        name = 'comb' if type(self).run is Component.run else 'run'
+        self.memo = memo.Memo(self, getattr(self, name), size, key, attributes, complete)
+        setattr(self, name, self.memo)
+
+    def comb(self):
+        pass
+
+    def onRising(self):
+        pass
+
+    def getSensitivity(self):
+        if self.sensitivity != None:
+            return self.sensitivity
+        accesses = self.getAccesses()
+        if accesses == None:
+            # Its source is not known, any signal it can reach
+            signals = []
+            seen = set()
+            for name, var in self.__dict__.items():
+                if name not in STRUCTURE:
+                    collectSignals(var, signals, seen)
+            return signals
+        # the signals its source reads, directly or through child components
+        # and containers
+        return self.getSignals(accesses[0])
+
+    # Declare the signals comb() or run() writes, e.g. self.drives(self.y)
+    def drives(self, *signals):
+        self.outputs = [s.vector if isinstance(s, sig.VectorSlice) else s for s in signals]
+
+    def getOutputs(self):
+        if self.outputs != None:
+            return self.outputs
+        accesses = self.getAccesses()
+        return self.getSignals(accesses[1]) if accesses != None else []
+
+    # Signals comb() or run() reads according to its source, None if unknown
+    def getInputs(self):
+        accesses = self.getAccesses()
+        return self.getSignals(accesses[0]) if accesses != None else None
+
+    def getAccesses(self):
+        method = type(self).comb if type(self).run is Component.run else type(self).run
+        return sched.attributeAccesses(method, type(self))
+
+    # Whether comb() or run() only reads and writes signals held by its own
+    # attributes, rather than through child components or containers, so
+    # getInputs() and getOutputs() are exact
+    def hasDirectAccesses(self):
+        accesses = self.getAccesses()
+        if accesses == None:
+            return False
+        for name in accesses[0] + accesses[1]:
+            var = self.__dict__.get(name)
+            if not isinstance(var, (sig.Signal, sig.Vector, sig.VectorSlice)) and len(self.getSignals([name])) > 0:
+                return False
+        return True
+
+    def getSignals(self, names):
+        signals = []
+        seen = set()
+        for name in names:
+            collectSignals(self.__dict__.get(name), signals, seen)
+        return signals
+
+    # Plain data attributes such as counters and memories, see Simulation.checkpoint()
+    def getState(self):
+        state = {}
+        for name, var in self.__dict__.items():
+            if name not in STRUCTURE and isPlainData(var):
+                state[name] = var
+        return state
+
+    def setState(self, state):
+        for name, value in state.items():
+            var = getattr(self, name, None)
+            # Update memories in place, other objects may hold references
+            if isinstance(var, list) and isinstance(value, list):
+                var[:] = value
+            elif isinstance(var, (bytearray, array.array)) and isinstance(value, (bytes, bytearray, array.array)):
+                setMemory(var, value)
+            else:
+                setattr(self, name, value)
 
     def addSignals(self):
         for name, var in self.__dict__.items():
-            if isinstance(var, (sig.Signal, sig.Vector)):
+            if name not in STRUCTURE and isinstance(var, (sig.Signal, sig.Vector)):
                 self.signalMap[name] = var
         for name, comp in self.componentMap.items():
             comp.addSignals()
@@ -78,11 +247,13 @@ class Component(object):
             self.componentMap[comp].printAll(indent+1)
 
     def run(self):
-        pass
+        self.comb()
+        if self.risingClock is not None and self.risingClock.isRisingEdge():
+            self.onRising()
 
 class Reset(Component):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, simulation=None):
+        super().__init__(simulation=simulation)
         self.reset = sig.Signal(0)
         self.resetn = sig.Signal(1)
         self.state = 0
@@ -103,8 +274,8 @@ class Reset(Component):
             self.resetn <<= 1
         
 class Clock(Component):
-    def __init__(self, nCycles=10):
-        super().__init__()
+    def __init__(self, nCycles=10, simulation=None):
+        super().__init__(simulation=simulation)
         self.state = 0
         self.clock = sig.Signal(0)
         self.nCycles = nCycles << 1
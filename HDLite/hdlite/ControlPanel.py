@@ -4,18 +4,18 @@ from tkinter import ttk
 from tkinter import messagebox
 from tkinter import IntVar
 
-from hdlite import Simulation as sim
+from hdlite import Runner as runner
 
-TIMER_TICK_MS = 500
+# Signal frames show a snapshot of the design this often while it runs
+FRAME_MS = 33
 
 class ClockFrame(ttk.LabelFrame):
-    def __init__(self, container, resetSignal, clockSignal, inputFrame, sigframes):
+    def __init__(self, container, runner, resetSignal, inputFrame, sigframes):
         super().__init__(container, text='Reset/Clock')
+        self.runner = runner
         self.resetSignal = resetSignal
-        self.clockSignal = clockSignal
         self.inputFrame = inputFrame
         self.sigFrames = sigframes
-        self.running = False
         ttk.Button(self, text='Reset', command=self.reset).grid(column=0, row=0, padx=5, pady=2)
         self.runBtn = ttk.Button(self, text='Run', command=self.run)
         self.runBtn.grid(column=0, row=1, padx=5, pady=2)
@@ -30,76 +30,74 @@ class ClockFrame(ttk.LabelFrame):
         self.nClocks.focus()
         self.nClocks.grid(column=1, row=4, padx=5, pady=2, sticky=tk.W)
 
+    # Show the latest snapshot, the design runs in the runner's thread
     def timer(self):
-        self.winfo_toplevel().after(TIMER_TICK_MS, self.timer)
-        if self.running:
-            self.step()
-        else:
-            self.stepBtn.configure(state='normal')
-            self.stepNBtn.configure(state='normal')
-            self.runBtn.configure(state='normal')
-            self.stopBtn.configure(state='disabled')
-            self.nClocks.configure(state='normal')
+        self.winfo_toplevel().after(FRAME_MS, self.timer)
+        self.updateAll()
+        running = self.runner.isRunning()
+        idle = 'disabled' if running else 'normal'
+        self.stepBtn.configure(state=idle)
+        self.stepNBtn.configure(state=idle)
+        self.runBtn.configure(state=idle)
+        self.stopBtn.configure(state='normal' if running else 'disabled')
+        self.nClocks.configure(state=idle)
+        error = self.runner.error
+        if error != None:
+            self.runner.error = None
+            messagebox.showerror(title='Simulation Error', message=str(error))
 
     def updateAll(self):
         for f in self.sigFrames:
-            f.doUpdate()
+            f.doUpdate(self.runner.snapshot)
 
     def reset(self):
+        self.runner.stop()
         self.inputFrame.setValues()
-        self.resetSignal <<= 1
-        sim.simulation.runUntilStable()
-        self.resetSignal <<= 0
-        sim.simulation.runUntilStable()
+        resetSignal = self.resetSignal
+        def reset():
+            resetSignal <<= 1
+            resetSignal.simulation.runUntilStable()
+            resetSignal <<= 0
+        self.runner.post(reset)
         self.updateAll()
 
     def run(self):
+        self.start(None)
+
+    def start(self, nClocks):
+        if self.runner.isRunning():
+            return
         self.inputFrame.setValues()
-        self.running = True
-        self.stepBtn.configure(state='disabled')
-        self.stepNBtn.configure(state='disabled')
-        self.runBtn.configure(state='disabled')
-        self.stopBtn.configure(state='normal')
-        self.nClocks.configure(state='disabled')
+        self.runner.start(nClocks)
 
     def stop(self):
-        self.running = False
+        self.runner.stop()
+        self.updateAll()
 
     def step(self):
-        self.inputFrame.setValues()
-        self.clockSignal <<= 1
-        sim.simulation.runUntilStable()
-        self.clockSignal <<= 0
-        sim.simulation.runUntilStable()
-        self.updateAll()
+        self.start(1)
 
     def stepn(self):
         try:
-            self.inputFrame.setValues()
             n = int(self.nClocks.get())
-            while n > 0:
-                self.clockSignal <<= 1
-                sim.simulation.runUntilStable()
-                self.clockSignal <<= 0
-                sim.simulation.runUntilStable()
-                n -= 1
-            self.updateAll()
         except ValueError as e:
             msg = f'Count is not an int: {self.nClocks.get()}'
             messagebox.showwarning(title='Input Error', message=msg)
+            return
+        self.start(n)
 
 class SignalIndicator(tk.Canvas):
     def __init__(self, container, signal, w=15, h=15):
         super().__init__(container, width=w, height=h)
         self.signal = signal
+        self.oval = self.create_oval(2, 2, w, h, fill='#fff', outline='#000')
+        self.value = None
 
-    def doUpdate(self):
-        w = self.winfo_width()-3
-        h = self.winfo_height()-3
-        if self.signal.getIntValue():
-            self.create_oval(2, 2, w, h, fill='#0f0', outline='#000')
-        else:
-            self.create_oval(2, 2, w, h, fill='#fff', outline='#000')
+    def doUpdate(self, snapshot):
+        value = snapshot.get(id(self.signal), 0)
+        if value != self.value:
+            self.value = value
+            self.itemconfigure(self.oval, fill='#0f0' if value else '#fff')
 
 class VectorIndicator(tk.Label):
     def __init__(self, container, signal):
@@ -109,9 +107,13 @@ class VectorIndicator(tk.Label):
         self.signal = signal
         digits = (len(signal)+3) >> 2
         self.format = f'%0{digits}X'
+        self.value = None
 
-    def doUpdate(self):
-        self.config(text = self.format % self.signal.getIntValue())
+    def doUpdate(self, snapshot):
+        value = snapshot.get(id(self.signal), 0)
+        if value != self.value:
+            self.value = value
+            self.config(text = self.format % value)
 
 class OutputFrame(ttk.LabelFrame):
     def __init__(self, container, title, outputs):
@@ -129,11 +131,14 @@ class OutputFrame(ttk.LabelFrame):
             self.indicators.append(ind)
             ind.grid(column=1, row=row, sticky=tk.W)
             row += 1
-        self.doUpdate()
 
-    def doUpdate(self):
+    # Signals the indicators show
+    def getWatched(self):
+        return [ind.signal for ind in self.indicators]
+
+    def doUpdate(self, snapshot):
         for ind in self.indicators:
-            ind.doUpdate()
+            ind.doUpdate(snapshot)
 
 class SignalControl(tk.Checkbutton):
     def __init__(self, container, signal):
@@ -146,8 +151,8 @@ class SignalControl(tk.Checkbutton):
     def action(self):
         self.container.doUpdate()
 
-    def setValue(self):
-        self.signal <<= int(self.value.get())
+    def getValue(self):
+        return int(self.value.get())
 
 class VectorControl(ttk.Entry):
     def __init__(self, container, signal):
@@ -160,16 +165,18 @@ class VectorControl(ttk.Entry):
     def action(self, event):
         self.container.doUpdate()
 
-    def setValue(self):
+    def getValue(self):
         try:
-            self.signal <<= int(self.get(), 16)
+            return int(self.get(), 16)
         except ValueError as e:
             msg = f'Value is not an int: {self.get()}'
             messagebox.showwarning(title='Input Error', message=msg)
+            return None
 
 class InputFrame(ttk.LabelFrame):
-    def __init__(self, container, inputs, sigframes):
+    def __init__(self, container, runner, inputs, sigframes):
         super().__init__(container, text="Input Signals")
+        self.runner = runner
         self.controls = []
         self.sigFrames = sigframes
         fontName = ('Consolas', 14)
@@ -185,15 +192,19 @@ class InputFrame(ttk.LabelFrame):
             control.grid(column=1, row=row, sticky=tk.W)
             row += 1
 
+    # Values are read here and assigned by the runner between clocks
     def setValues(self):
-        for ind in self.controls:
-            ind.setValue()
+        values = [(c.signal, c.getValue()) for c in self.controls]
+        def assign():
+            for signal, value in values:
+                if value != None:
+                    signal <<= value
+        self.runner.post(assign)
 
     def doUpdate(self):
         self.setValues()
-        sim.simulation.runUntilStable()
         for f in self.sigFrames:
-            f.doUpdate()
+            f.doUpdate(self.runner.snapshot)
 
 class App(tk.Tk):
     def __init__(self, resetSignal, clockSignal, inputs, internal, outputs):
@@ -209,12 +220,13 @@ class App(tk.Tk):
         self.columnconfigure(3, weight=2)
         internFrame = OutputFrame(self, 'Internal Signals', internal)
         outputFrame = OutputFrame(self, 'Output Signals', outputs)
-        inputFrame = InputFrame(self, inputs, [internFrame, outputFrame])
-        clockFrame = ClockFrame(self, resetSignal, clockSignal, inputFrame, [internFrame, outputFrame])
+        self.runner = runner.Runner(clockSignal.simulation, clockSignal, internFrame.getWatched() + outputFrame.getWatched())
+        inputFrame = InputFrame(self, self.runner, inputs, [internFrame, outputFrame])
+        clockFrame = ClockFrame(self, self.runner, resetSignal, inputFrame, [internFrame, outputFrame])
         clockFrame.grid(column=0, row=0, padx=2, pady=2)
         inputFrame.grid(column=1, row=0, padx=2, pady=2, sticky=tk.N)
         internFrame.grid(column=2, row=0, padx=2, pady=2, sticky=tk.N)
         outputFrame.grid(column=3, row=0, padx=3, pady=2, sticky=tk.N)
         # Assert reset after 500 ms
         self.after(500, clockFrame.reset)
-        self.after(TIMER_TICK_MS, clockFrame.timer)
\ No newline at end of file
+        self.after(FRAME_MS, clockFrame.timer)
\ No newline at end of file
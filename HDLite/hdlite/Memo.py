@@ -0,0 +1,82 @@
+import collections
+
+# Lookup table for a component whose comb() (or run()) is a pure function,
+# see Component.memoize(). The key is the value of every signal the method
+# reads, key() for other state it reads, e.g. registers in a list, and
+# unless the method is complete, i.e. assigns every output on every call,
+# the value each output would have without running it. The table holds the
+# resulting output values and attributes, the least recently used entries
+# are dropped beyond size entries.
+# The method must not look at clock edges or change state other than its
+# outputs and the attributes given. Signals it reads or writes through
+# methods of the component it calls count, those it reaches through child
+# components or containers must be declared, see Component.sensitive() and
+# Component.drives().
+
+class Memo(object):
+    def __init__(self, component, method, size=4096, key=None, attributes=(), complete=False):
+        self.component = component
+        self.method = method
+        self.size = size
+        self.key = key
+        self.attributes = tuple(attributes)
+        if (component.sensitivity == None or component.outputs == None) and not component.hasDirectAccesses():
+            raise Exception(f'Cannot memoize {type(component).__name__}, the signals it reads and writes are not known '
+                'from its source, declare them with sensitive() and drives()')
+        inputs = component.getInputs()
+        if inputs == None:
+            inputs = component.getSensitivity()
+        self.inputs = list(inputs)
+        self.outputs = list(component.getOutputs())
+        keyed = [(s, 'value') for s in self.inputs]
+        if not complete:
+            keyed += [(s, 'futureValue') for s in self.outputs]
+        self.getKey = self.makeGetter(keyed, key)
+        self.getOutputs = self.makeGetter([(s, 'futureValue') for s in self.outputs])
+        # key -> (output values, attribute values)
+        self.table = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # A function returning a tuple of the attributes of objects, and of key(),
+    # generated as a single expression since it runs on every call
+    def makeGetter(self, attributes, key=None):
+        namespace = {'key': key}
+        items = []
+        for i, (o, attribute) in enumerate(attributes):
+            namespace[f'o{i}'] = o
+            items.append(f'o{i}.{attribute}, ')
+        source = f'lambda: ({"".join(items)})'
+        if key != None:
+            source += ' + tuple(key())'
+        return eval(source, namespace)
+
+    def __call__(self):
+        key = self.getKey()
+        table = self.table
+        entry = table.get(key)
+        if entry == None:
+            self.misses += 1
+            self.method()
+            component = self.component
+            entry = (self.getOutputs(), tuple(getattr(component, a) for a in self.attributes))
+            table[key] = entry
+            if len(table) > self.size:
+                table.popitem(last=False)
+            return
+        self.hits += 1
+        table.move_to_end(key)
+        outputValues, attributeValues = entry
+        for s, value in zip(self.outputs, outputValues):
+            if s.futureValue != value:
+                s.futureValue = value
+                if value != s.value and not s.queued:
+                    s.queued = True
+                    s.simulation.pending.append(s)
+        for a, value in zip(self.attributes, attributeValues):
+            setattr(self.component, a, value)
+
+    def clear(self):
+        self.table.clear()
+        self.hits = 0
+        self.misses = 0
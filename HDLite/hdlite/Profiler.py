@@ -0,0 +1,154 @@
+import collections
+import time
+
+from hdlite import Component as hc
+
+# Opt-in instrumentation of a Simulation:
+#   per component, calls and time spent in run(), comb() and onRising()
+#   per signal, number of value changes
+#   delta cycles per step, a step being the deltas until the design is stable
+# start() replaces those methods of the simulation and its components with
+# timed versions, stop() puts the originals back, so a simulation without a
+# running profiler pays nothing.
+
+METHODS = ('run', 'comb', 'onRising')
+
+class Profiler(object):
+    def __init__(self, simulation):
+        self.simulation = simulation
+        # (component index, method name) -> [calls, seconds]
+        self.methods = collections.defaultdict(lambda: [0, 0.0])
+        # id(signal) -> value changes
+        self.toggles = collections.Counter()
+        # deltas of one step -> number of steps
+        self.deltas = collections.Counter()
+        self.stepDeltas = 0
+        self.running = False
+        # (component, method name, instance attribute replaced or None)
+        self.replaced = []
+
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        simulation = self.simulation
+        for p in simulation.components:
+            for method in METHODS:
+                # comb() and onRising() of Component.run() are timed on their own
+                if getattr(type(p), method) is not getattr(hc.Component, method):
+                    self.replaced.append((p, method, p.__dict__.get(method)))
+                    setattr(p, method, self.timed(p.index, method, getattr(p, method)))
+        simulation.propagateSignals = self.propagateSignals(simulation.propagateSignals)
+        simulation.commit = self.commit(simulation.commit)
+        return self
+
+    def stop(self):
+        if not self.running:
+            return self
+        self.running = False
+        for p, method, original in reversed(self.replaced):
+            if original != None:
+                setattr(p, method, original)
+            else:
+                del p.__dict__[method]
+        self.replaced = []
+        del self.simulation.propagateSignals
+        del self.simulation.commit
+        return self
+
+    def timed(self, index, name, method):
+        counts = self.methods[(index, name)]
+        clock = time.perf_counter
+        def timedMethod():
+            startTime = clock()
+            try:
+                method()
+            finally:
+                counts[0] += 1
+                counts[1] += clock() - startTime
+        return timedMethod
+
+    def propagateSignals(self, propagate):
+        simulation = self.simulation
+        toggles = self.toggles
+        def profiledPropagate():
+            changed = propagate()
+            self.stepDeltas += 1
+            for s in simulation.changed:
+                toggles[id(s)] += 1
+            if not changed:
+                self.deltas[self.stepDeltas] += 1
+                self.stepDeltas = 0
+            return changed
+        return profiledPropagate
+
+    def commit(self, commit):
+        simulation = self.simulation
+        toggles = self.toggles
+        def profiledCommit(queue, inQueue):
+            for s in simulation.pending:
+                if s.value != s.futureValue:
+                    toggles[id(s)] += 1
+            commit(queue, inQueue)
+        return profiledCommit
+
+    def reset(self):
+        for counts in self.methods.values():
+            counts[0] = 0
+            counts[1] = 0.0
+        self.toggles.clear()
+        self.deltas.clear()
+        self.stepDeltas = 0
+
+    def getComponentName(self, p):
+        path = []
+        while p != None:
+            path.insert(0, p.getName())
+            p = p.parent
+        return '.'.join(path)
+
+    # (name, method, calls, seconds) of each timed method
+    def getComponents(self, sortBy='time'):
+        rows = []
+        for (index, method), (calls, seconds) in self.methods.items():
+            if calls > 0:
+                p = self.simulation.components[index]
+                rows.append((self.getComponentName(p), method, calls, seconds))
+        return sortRows(rows, sortBy, {'name': 0, 'calls': 2, 'time': 3})
+
+    # (name, toggles) of each signal that changed
+    def getSignals(self, sortBy='toggles'):
+        names = self.simulation.getSignalNames()
+        rows = [(names.get(i, '?'), n) for i, n in self.toggles.items()]
+        return sortRows(rows, sortBy, {'name': 0, 'toggles': 1})
+
+    def report(self, sortBy='time', limit=20):
+        lines = [f'{"calls":>10} {"seconds":>10} {"us/call":>8}  component']
+        for name, method, calls, seconds in self.getComponents(sortBy)[:limit]:
+            lines.append(f'{calls:10} {seconds:10.3f} {seconds / calls * 1e6:8.2f}  {name}.{method}()')
+        lines.append('')
+        lines.append(f'{"toggles":>10}  signal')
+        signalSort = 'name' if sortBy == 'name' else 'toggles'
+        for name, toggles in self.getSignals(signalSort)[:limit]:
+            lines.append(f'{toggles:10}  {name}')
+        steps = sum(self.deltas.values())
+        if steps > 0:
+            total = sum(d * n for d, n in self.deltas.items())
+            lines.append('')
+            lines.append(f'{steps} steps, {total / steps:.2f} deltas per step, at most {max(self.deltas)}')
+            for d in sorted(self.deltas):
+                lines.append(f'{d:10} deltas: {self.deltas[d]} steps')
+        return '\n'.join(lines)
+
+    # Folded stacks, one line per method: top;cpu;comb microseconds, for
+    # flamegraph.pl or speedscope
+    def writeFlameGraph(self, fileName):
+        with open(fileName, 'wt') as f:
+            for name, method, calls, seconds in self.getComponents('name'):
+                f.write(f'{name.replace(".", ";")};{method} {round(seconds * 1e6)}\n')
+
+def sortRows(rows, sortBy, columns):
+    if sortBy not in columns:
+        raise Exception(f'Cannot sort by {sortBy}, use one of {", ".join(columns)}')
+    column = columns[sortBy]
+    return sorted(rows, key=lambda row: row[column], reverse=sortBy != 'name')
@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+import os
+import time
+import traceback
+import unittest
+
+from hdlite import Simulation as sim
+
+# Runs unittest test cases in a pool of worker processes. Every test gets a
+# new Simulation in its worker, tests are started longest first using the
+# runtimes of previous runs so the pool stays busy until the end.
+
+# Outcome of one test
+class TestRun(object):
+    def __init__(self, testId, status, seconds, message='', artifacts=()):
+        self.testId = testId
+        # pass, fail, error or skip
+        self.status = status
+        self.seconds = seconds
+        self.message = message
+        # output files written by the test's simulations that still exist
+        self.artifacts = list(artifacts)
+
+def discover(startDir='hdltest', pattern='Test*.py'):
+    tests = []
+    def walk(suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                walk(test)
+            else:
+                tests.append(test.id())
+    walk(unittest.defaultTestLoader.discover(startDir, pattern))
+    return tests
+
+def runTest(testId):
+    sim.simulation = sim.Simulation()
+    sim.outputFiles.clear()
+    result = unittest.TestResult()
+    startTime = time.time()
+    try:
+        unittest.defaultTestLoader.loadTestsFromName(testId).run(result)
+    except Exception:
+        result.errors.append((testId, traceback.format_exc()))
+    seconds = time.time() - startTime
+    if len(result.errors) > 0:
+        status = 'error'
+    elif len(result.failures) > 0 or len(result.unexpectedSuccesses) > 0:
+        status = 'fail'
+    elif len(result.skipped) > 0:
+        status = 'skip'
+    else:
+        status = 'pass'
+    message = '\n'.join(text for test, text in result.errors + result.failures)
+    artifacts = [f for f in sim.outputFiles if os.path.exists(f)]
+    return TestRun(testId, status, seconds, message, artifacts)
+
+def loadHistory(fileName):
+    if fileName == None or not os.path.exists(fileName):
+        return {}
+    with open(fileName) as f:
+        return json.load(f)
+
+def saveHistory(fileName, history):
+    if fileName == None:
+        return
+    directory = os.path.dirname(fileName)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(fileName + '.tmp', 'w') as f:
+        json.dump(history, f, indent=1, sort_keys=True)
+    os.replace(fileName + '.tmp', fileName)
+
+# Expected runtime of each test, twice the longest for tests without
+# history, so new tests are started and balanced as the longest
+def runtimes(tests, history):
+    unknown = max(history.values(), default=1.0) * 2
+    return {t: history.get(t, unknown) for t in tests}
+
+# Tests longest first, new tests before all others
+def byRuntime(tests, history):
+    seconds = runtimes(tests, history)
+    return sorted(tests, key=lambda t: -seconds[t])
+
+# Split tests into n shards of about equal total runtime, e.g. one per
+# machine, by adding each test, longest first, to the shortest shard
+def shard(tests, history, n):
+    seconds = runtimes(tests, history)
+    shards = [[] for i in range(n)]
+    totals = [0.0] * n
+    for t in byRuntime(tests, history):
+        i = totals.index(min(totals))
+        shards[i].append(t)
+        totals[i] += seconds[t]
+    return shards
+
+# Run tests in processes worker processes, None for one per core, 0 for
+# this process. Returns a TestRun per test in the order given.
+def run(tests, processes=None, historyFile=None, report=print):
+    history = loadHistory(historyFile)
+    order = byRuntime(tests, history)
+    runs = {}
+    if processes == 0:
+        results = map(runTest, order)
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(runTest, order)
+    try:
+        for testRun in results:
+            runs[testRun.testId] = testRun
+            if report != None:
+                report(f'{testRun.status:5} {testRun.seconds:8.3f} s  {testRun.testId}')
+    finally:
+        if processes != 0:
+            pool.terminate()
+    for testRun in runs.values():
+        history[testRun.testId] = round(testRun.seconds, 4)
+    saveHistory(historyFile, history)
+    return [runs[t] for t in tests]
+
+def summary(runs, wallTime=None):
+    lines = []
+    for testRun in runs:
+        if testRun.status in ('fail', 'error'):
+            lines.append(f'{testRun.status.upper()}: {testRun.testId}')
+            lines.append(testRun.message)
+    artifacts = [f for testRun in runs for f in testRun.artifacts]
+    if len(artifacts) > 0:
+        lines.append('Artifacts:')
+        lines.extend(f'    {f}' for f in artifacts)
+    counts = {}
+    for testRun in runs:
+        counts[testRun.status] = counts.get(testRun.status, 0) + 1
+    total = sum(testRun.seconds for testRun in runs)
+    line = ', '.join(f'{counts[s]} {s}' for s in ('pass', 'fail', 'error', 'skip') if s in counts)
+    line = f'{len(runs)} tests: {line}, {total:.2f} s test time'
+    if wallTime != None:
+        line += f', {wallTime:.2f} s wall time'
+    lines.append(line)
+    return '\n'.join(lines)
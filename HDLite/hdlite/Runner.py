@@ -0,0 +1,141 @@
+import collections
+import threading
+import time
+
+# Runs clocks of an event driven simulation without a user interface,
+# in the calling thread with run() or in a worker thread with start().
+# A run stops after nClocks, when until() returns true after a clock, after
+# budget seconds or when stop() is called. While a worker thread runs, other
+# threads must not touch the design: they read the snapshot of the watched
+# signals, taken at most every snapshotTime seconds between clocks, and
+# change inputs with post().
+
+class Runner(object):
+    def __init__(self, simulation, clock, watched=(), snapshotTime=1/60):
+        self.simulation = simulation
+        self.clock = clock
+        # objects with getIntValue(), e.g. signals
+        self.watched = list(watched)
+        self.snapshotTime = snapshotTime
+        # id(watched object) -> value, replaced as a whole
+        self.snapshot = {}
+        # clocks run since this Runner was created
+        self.clocks = 0
+        # why the last run stopped: clocks, until, budget, stop or error
+        self.reason = None
+        # exception raised by the design in a worker thread
+        self.error = None
+        self.thread = None
+        # a run is in progress, stopping asks it to return
+        self.running = False
+        self.stopping = False
+        # functions to call between clocks, see post()
+        self.posted = collections.deque()
+        # reentrant, a function run by post() may post() again
+        self.lock = threading.RLock()
+        self.takeSnapshot()
+
+    def watch(self, watched):
+        with self.lock:
+            self.watched.extend(watched)
+            if not self.isRunning():
+                self.takeSnapshot()
+
+    def takeSnapshot(self):
+        self.snapshot = {id(w): w.getIntValue() for w in self.watched}
+
+    def isRunning(self):
+        return self.running
+
+    # Call function in the thread running the design, between clocks, or now
+    # if nothing runs, followed by runUntilStable()
+    def post(self, function):
+        # holding the lock keeps start() from running the design meanwhile
+        with self.lock:
+            if self.isRunning():
+                self.posted.append(function)
+                return
+            function()
+            self.simulation.runUntilStable()
+            self.takeSnapshot()
+
+    def runPosted(self):
+        if len(self.posted) == 0:
+            return
+        while len(self.posted) > 0:
+            self.posted.popleft()()
+        self.simulation.runUntilStable()
+
+    def step(self):
+        simulation = self.simulation
+        self.clock <<= 1
+        simulation.runUntilStable()
+        self.clock <<= 0
+        simulation.runUntilStable()
+        self.clocks += 1
+
+    # Returns the number of clocks run
+    def run(self, nClocks=None, until=None, budget=None):
+        with self.lock:
+            if self.thread != threading.current_thread():
+                if self.running:
+                    raise Exception('Runner is already running')
+                self.running = True
+        self.reason = None
+        startTime = time.perf_counter()
+        nextSnapshot = startTime + self.snapshotTime
+        clocks = 0
+        try:
+            while True:
+                if self.stopping:
+                    self.reason = 'stop'
+                    break
+                if nClocks != None and clocks >= nClocks:
+                    self.reason = 'clocks'
+                    break
+                self.runPosted()
+                self.step()
+                clocks += 1
+                if until != None and until():
+                    self.reason = 'until'
+                    break
+                now = time.perf_counter()
+                if budget != None and now - startTime >= budget:
+                    self.reason = 'budget'
+                    break
+                if now >= nextSnapshot:
+                    self.takeSnapshot()
+                    nextSnapshot = now + self.snapshotTime
+        finally:
+            with self.lock:
+                self.runPosted()
+                self.takeSnapshot()
+                self.running = False
+                self.stopping = False
+        return clocks
+
+    # Like run(), in a worker thread
+    def start(self, nClocks=None, until=None, budget=None):
+        with self.lock:
+            if self.running:
+                raise Exception('Runner is already running')
+            self.running = True
+        self.error = None
+        def work():
+            try:
+                self.run(nClocks, until, budget)
+            except Exception as e:
+                self.error = e
+                self.reason = 'error'
+        self.thread = threading.Thread(target=work, name='hdlite runner', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            if self.running:
+                self.stopping = True
+        self.join()
+
+    def join(self, timeout=None):
+        if self.thread != None:
+            self.thread.join(timeout)
@@ -0,0 +1,117 @@
+import ast
+import inspect
+import textwrap
+
+# Static scheduling of combinational logic, see Simulation.levelize()
+
+# (method, class) -> (names of attributes read, names of attributes assigned)
+accesses = {}
+
+# Attributes a method reads and assigns with <<=, e.g. self.y <<= self.a or
+# self.y[0:4] <<= self.a, self.child for self.child.y <<= 1, including those of the methods of cls it calls,
+# e.g. self.helper(). None if the source of any of them is not available,
+# it calls something other than a method of cls or self escapes, e.g.
+# getattr(self, name), helper(self) or super().run().
+def attributeAccesses(method, cls=None):
+    key = (method, cls)
+    if key not in accesses:
+        accesses[key] = methodAccesses(method, cls, set())
+    return accesses[key]
+
+def methodAccesses(method, cls, active):
+    try:
+        tree = ast.parse(textwrap.dedent(inspect.getsource(method)))
+    except (OSError, TypeError, SyntaxError):
+        return None
+    active.add(method)
+    reads = []
+    writes = []
+    calls = []
+    targets = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.AugAssign) and isinstance(node.op, ast.LShift):
+            # self.y, self.y[0:4], or through self.child.y or self.y[i]
+            target = node.target
+            while isinstance(target, (ast.Subscript, ast.Attribute)) and not isSelfAttribute(target):
+                targets.add(id(target))
+                target = target.value
+            targets.add(id(target))
+            if isSelfAttribute(target) and target.attr not in writes:
+                writes.append(target.attr)
+        if isinstance(node, ast.Call) and isSelfAttribute(node.func):
+            targets.add(id(node.func))
+            calls.append(node.func.attr)
+    for node in ast.walk(tree):
+        if isSelfAttribute(node):
+            targets.add(id(node.value))
+            if node.attr == '__dict__':
+                return None
+            if id(node) not in targets and node.attr not in reads:
+                reads.append(node.attr)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in ('self', 'super') and id(node) not in targets:
+            return None
+    for name in calls:
+        callee = getattr(cls, name, None) if cls != None else None
+        if not inspect.isfunction(callee):
+            return None
+        if callee in active:
+            continue
+        result = methodAccesses(callee, cls, active)
+        if result == None:
+            return None
+        reads += [n for n in result[0] if n not in reads]
+        writes += [n for n in result[1] if n not in writes]
+    return (reads, writes)
+
+def isSelfAttribute(node):
+    return isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == 'self'
+
+# Strongly connected components of a graph given as a list of successor
+# lists, in topological order (Tarjan's algorithm without recursion)
+def stronglyConnected(successors):
+    n = len(successors)
+    index = [None] * n
+    low = [0] * n
+    onStack = [False] * n
+    stack = []
+    sccs = []
+    counter = 0
+    for root in range(n):
+        if index[root] != None:
+            continue
+        work = [(root, 0)]
+        while work:
+            v, i = work.pop()
+            if i == 0:
+                index[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                onStack[v] = True
+            recurse = False
+            while i < len(successors[v]):
+                w = successors[v][i]
+                i += 1
+                if index[w] == None:
+                    work.append((v, i))
+                    work.append((w, 0))
+                    recurse = True
+                    break
+                if onStack[w]:
+                    low[v] = min(low[v], index[w])
+            if recurse:
+                continue
+            if low[v] == index[v]:
+                scc = []
+                while True:
+                    w = stack.pop()
+                    onStack[w] = False
+                    scc.append(w)
+                    if w == v:
+                        break
+                sccs.append(sorted(scc))
+            if work:
+                u = work[-1][0]
+                low[u] = min(low[u], low[v])
+    sccs.reverse()
+    return sccs
@@ -2,12 +2,24 @@
 from hdlite import Simulation as sim
 
 class Signal(object):
-    def __init__(self, futureValue=0):
+    __slots__ = ('priorValue', 'futureValue', 'value', 'fanout', 'clocked', 'queued', 'simulation')
+    size = 1
+    mask = 1
+
+    def __init__(self, futureValue=0, simulation=None):
         # used to determine change
         self.priorValue = futureValue
         self.futureValue = futureValue
         self.value = futureValue
-        sim.simulation.addSignal(self)
+        # components sensitive to this signal
+        self.fanout = []
+        # components whose onRising() runs on rising edges of this signal
+        self.clocked = []
+        # on the simulation pending list
+        self.queued = False
+        # simulation this signal belongs to, see Simulation.__enter__()
+        self.simulation = simulation if simulation != None else sim.current()
+        self.simulation.addSignal(self)
 
     def __len__(self):
         return 1
@@ -15,10 +27,10 @@ class Signal(object):
     def rhs(self, other):
         if isinstance(other, int):
             return other & 1
-        if isinstance(other, (Signal, Vector, VectorSlice)):
-            if len(other) != 1:
+        if isinstance(other, (Signal, AbstractVector)):
+            if other.size != 1:
                 raise Exception(f'Sizes do not match {len(self)} != {len(other)}')
-            return other.getIntValue()
+            return other.value
         raise Exception(f'Unexpected type {type(other)}')
 
     def __and__(self, other):
@@ -39,7 +51,11 @@ class Signal(object):
 
     # x <<= y (assignment)
     def __ilshift__(self, other):
-        self.futureValue = self.rhs(other)
+        value = self.rhs(other)
+        self.futureValue = value
+        if value != self.value and not self.queued:
+            self.queued = True
+            self.simulation.pending.append(self)
         return self
 
     def getIntValue(self):
@@ -56,7 +72,10 @@ class Signal(object):
         return changed
 
     def isChanged(self):
-        return self.value != self.priorValue
+        if self.value != self.priorValue:
+            self.simulation.edgeSeen()
+            return True
+        return False
 
     def isRisingEdge(self):
         # Doesn't seem right, but it seems to work :-(
@@ -74,6 +93,8 @@ class Signal(object):
 # Below is a faster implementation of Vector
 
 class AbstractVector(object):
+    __slots__ = ('size', 'mask')
+
     def __init__(self, size):
         self.size = size
         self.mask = ~(-1 << size)
@@ -84,65 +105,75 @@ class AbstractVector(object):
     def rhs(self, other):
         if isinstance(other, int):
             return other & self.mask
-        if isinstance(other, (Signal, Vector, VectorSlice)):
-            if len(self) != len(other):
+        if isinstance(other, (Signal, AbstractVector)):
+            if self.size != other.size:
                 raise Exception(f'Sizes do not match {len(self)} != {len(other)}')
-            return other.getIntValue()
+            return other.value
         raise Exception(f'Unexpected type {type(other)}')
 
     def __and__(self, other):
-        return self.getIntValue() & self.rhs(other)
+        return self.value & self.rhs(other)
 
     def __or__(self, other):
-        return self.getIntValue() | self.rhs(other)
+        return self.value | self.rhs(other)
 
     def __xor__(self, other):
-        return self.getIntValue() ^ self.rhs(other)
+        return self.value ^ self.rhs(other)
 
     def __add__(self, other):
-        return self.getIntValue() + self.rhs(other)
+        return self.value + self.rhs(other)
 
     def __sub__(self, other):
-        return self.getIntValue() - self.rhs(other)
+        return self.value - self.rhs(other)
 
     def __lshift__(self, other):
-        return self.getIntValue() << self.rhs(other)
+        return self.value << self.rhs(other)
     
     def __rshift__(self, other):
-        return self.getIntValue() >> self.rhs(other)
+        return self.value >> self.rhs(other)
     
     def __lt__(self, other):
-        return self.getIntValue() < self.rhs(other)
+        return self.value < self.rhs(other)
     
     def __le__(self, other):
-        return self.getIntValue() <= self.rhs(other)
+        return self.value <= self.rhs(other)
     
     def __eq__(self, other):
-        return self.getIntValue() == self.rhs(other)
+        return self.value == self.rhs(other)
     
     def __ge__(self, other):
-        return self.getIntValue() >= self.rhs(other)
+        return self.value >= self.rhs(other)
     
     def __gt__(self, other):
-        return self.getIntValue() > self.rhs(other)
+        return self.value > self.rhs(other)
     
     # ~ (not)
     def __invert__(self):
-        return (~self.getIntValue()) & self.mask
+        return (~self.value) & self.mask
 
     def __str__(self):
-        return bin(self.getIntValue())
+        return bin(self.value)
 
 class VectorSlice(AbstractVector):
+    __slots__ = ('vector', 'start', 'fieldMask')
+    # number of slices created, see bench.py
+    allocations = 0
+
     def __init__(self, vector, start, size):
         super().__init__(size)
         # Don't add this to simulation, composed vector was already added
         self.vector = vector
         self.start = start
+        # bits of vector covered by this slice
+        self.fieldMask = self.mask << start
+        VectorSlice.allocations += 1
 
     def getIntValue(self):
-        value = (self.vector.getIntValue() >> self.start) & self.mask
-        return value
+        return (self.vector.value >> self.start) & self.mask
+
+    @property
+    def value(self):
+        return (self.vector.value >> self.start) & self.mask
 
     def __getitem__(self, index):
         raise Exception('Why are you slicing a slice?')
@@ -154,49 +185,79 @@ class VectorSlice(AbstractVector):
     # x <<= y (assignment)
     def __ilshift__(self, other):
         value = self.rhs(other)
-        mask = self.mask << self.start
-        fv = self.vector.futureValue
-        fv = (fv & ~mask) | ((value & self.mask) << self.start)
-        self.vector.futureValue = fv
+        vector = self.vector
+        fv = (vector.futureValue & ~self.fieldMask) | ((value & self.mask) << self.start)
+        vector.futureValue = fv
+        if fv != vector.value and not vector.queued:
+            vector.queued = True
+            vector.simulation.pending.append(vector)
         return self
 
 class Vector(AbstractVector):
-    def __init__(self, size, futureValue=0):
+    __slots__ = ('priorValue', 'futureValue', 'value', 'fanout', 'clocked', 'queued', 'slices', 'simulation')
+
+    def __init__(self, size, futureValue=0, simulation=None):
         super().__init__(size)
         self.priorValue = futureValue
         self.futureValue = futureValue
         self.value = futureValue
-        sim.simulation.addSignal(self)
+        # components sensitive to this signal
+        self.fanout = []
+        # components whose onRising() runs on rising edges of this signal
+        self.clocked = []
+        # on the simulation pending list
+        self.queued = False
+        # (start, stop) or bit index -> VectorSlice
+        self.slices = {}
+        # simulation this signal belongs to, see Simulation.__enter__()
+        self.simulation = simulation if simulation != None else sim.current()
+        self.simulation.addSignal(self)
 
     def getIntValue(self):
         return self.value
 
     # Called once before deltaCycle to save state
     def prepare(self):
-        self.priorValue = self.getIntValue()
+        self.priorValue = self.value
     
     # Called multiple times to propagate value changes
     def propagate(self):
-        changed = self.getIntValue() != self.futureValue
+        changed = self.value != self.futureValue
         self.value = self.futureValue
         return changed
 
     def isChanged(self):
-        return self.getIntValue() != self.priorValue
+        if self.value != self.priorValue:
+            self.simulation.edgeSeen()
+            return True
+        return False
 
     # x <<= y (assignment)
     def __ilshift__(self, other):
-        self.futureValue = self.rhs(other)
+        value = self.rhs(other)
+        self.futureValue = value
+        if value != self.value and not self.queued:
+            self.queued = True
+            self.simulation.pending.append(self)
         return self
 
     def __getitem__(self, index):
+        if isinstance(index, slice):
+            key = (index.start, index.stop)
+        else:
+            key = index
+        if key in self.slices:
+            return self.slices[key]
         if isinstance(index, slice):
             start = index.start
             stop = index.stop
             if start >= stop:
                 raise Exception(f'Bit range must be greather than zero: {start}:{stop}')
-            return VectorSlice(self, start, stop - start)
-        return VectorSlice(self, index, 1)
+            vs = VectorSlice(self, start, stop - start)
+        else:
+            vs = VectorSlice(self, index, 1)
+        self.slices[key] = vs
+        return vs
 
     # This must be defined, but don't do anything
     def __setitem__(self, index, value):
@@ -0,0 +1,367 @@
+import collections
+import mmap
+import struct
+
+from hdlite import TraceFilter as tf
+
+# Compact binary trace, a drop-in replacement for VCDFile.
+#
+# File layout:
+#   MAGIC
+#   chunk*      per signal blocks of (time delta, value ^ previous value) varints
+#   index       time scale, signals, names, then for each chunk
+#               start time, end time, offset and (signal, offset, length) per block
+#   footer      index offset (8 bytes little endian), MAGIC
+#
+# Every block starts from time = chunk start time and previous value = 0,
+# so a block can be decoded without reading anything else.
+
+MAGIC = b'HDLT'
+
+def putVarint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def getVarint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7f) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+def putString(out, s):
+    b = s.encode()
+    putVarint(out, len(b))
+    out.extend(b)
+
+def getString(data, pos):
+    n, pos = getVarint(data, pos)
+    return bytes(data[pos:pos+n]).decode(), pos + n
+
+class TraceFile(object):
+    def __init__(self, fileName, timeScale, chunkSize=1 << 16):
+        self.file = open(fileName, 'wb') if fileName != None else None
+        self.timeScale = timeScale
+        # number of value changes per chunk
+        self.chunkSize = chunkSize
+        # traced signals and last values written, indexed by signal id
+        self.signals = []
+        self.values = []
+        # id(signal) -> signal id
+        self.signalIds = {}
+        # (hierarchical name, signal id) in component order
+        self.names = []
+        self.time = 0
+        # changes in the current chunk, per signal id: [time, value, ...]
+        self.changes = {}
+        self.nChanges = 0
+        self.chunkStart = 0
+        self.chunkEnd = 0
+        self.index = []
+        self.offset = len(MAGIC)
+        self.traceFilter = tf.TraceFilter()
+        # logic analyzer mode, see setTrigger()
+        self.trigger = None
+        if self.file != None:
+            self.file.write(MAGIC)
+
+    def addSignals(self, component, depth=0, path=''):
+        path = path + component.getName()
+        for signalName, signal in component.signalMap.items():
+            if not self.traceFilter.accepts(f'{path}.{signalName}', signal):
+                continue
+            sid = self.signalIds.get(id(signal))
+            if sid == None:
+                sid = len(self.signals)
+                self.signalIds[id(signal)] = sid
+                self.signals.append(signal)
+                self.values.append(None)
+            self.names.append((f'{path}.{signalName}', sid))
+        if self.traceFilter.acceptsDepth(depth+1):
+            for comp in component.componentMap.values():
+                self.addSignals(comp, depth+1, path + '.')
+
+    # Keep the last preTrigger time steps in memory and write nothing until
+    # trigger() returns true, then write them and postTrigger more time
+    # steps, see VCDFile.setTrigger()
+    def setTrigger(self, trigger, preTrigger=100, postTrigger=100):
+        self.trigger = trigger
+        self.preTrigger = preTrigger
+        self.postTrigger = postTrigger
+        # (time, [(signal id, value), ...]) per time step
+        self.history = collections.deque()
+        # values before the oldest time step in history
+        self.base = []
+        self.baseTime = 0
+        self.triggerTime = None
+        self.postTimes = 0
+
+    def addInitialValues(self):
+        self.chunkStart = self.chunkEnd = self.time
+        if self.trigger != None:
+            self.base = [None] * len(self.signals)
+        self.writeSignals()
+
+    def addTime(self, time):
+        if time != self.time and self.nChanges >= self.chunkSize:
+            self.writeChunk()
+            self.chunkStart = time
+        self.time = time
+
+    def writeSignals(self):
+        if self.file == None:
+            return
+        changes = []
+        values = self.values
+        for i, signal in enumerate(self.signals):
+            value = signal.getIntValue()
+            if value != values[i]:
+                values[i] = value
+                changes.append((i, value))
+        if self.trigger != None:
+            self.capture(changes)
+        else:
+            self.writeChanges(self.time, changes)
+
+    def writeChanges(self, time, changes):
+        for sid, value in changes:
+            signalChanges = self.changes.get(sid)
+            if signalChanges == None:
+                signalChanges = self.changes[sid] = []
+            signalChanges.append(time)
+            signalChanges.append(value)
+            self.nChanges += 1
+            self.chunkEnd = time
+
+    def capture(self, changes):
+        if self.triggerTime == None:
+            history = self.history
+            if len(history) > 0 and history[-1][0] == self.time:
+                history[-1][1].extend(changes)
+            elif len(changes) > 0:
+                history.append((self.time, changes))
+                if len(history) > self.preTrigger:
+                    self.baseTime, evicted = history.popleft()
+                    for sid, value in evicted:
+                        self.base[sid] = value
+            if self.trigger():
+                self.triggerTime = self.postTime = self.time
+                self.writeHistory()
+        elif self.postTimes <= self.postTrigger:
+            if self.time != self.postTime:
+                self.postTime = self.time
+                self.postTimes += 1
+                if self.postTimes > self.postTrigger:
+                    return
+            self.writeChanges(self.time, changes)
+
+    def writeHistory(self):
+        self.writeChanges(self.baseTime, [(sid, value) for sid, value in enumerate(self.base) if value != None])
+        for time, changes in self.history:
+            self.writeChanges(time, changes)
+        self.history.clear()
+
+    def writeChunk(self):
+        if len(self.changes) == 0:
+            return
+        data = bytearray()
+        blocks = []
+        for sid in sorted(self.changes):
+            start = len(data)
+            changes = self.changes[sid]
+            time = self.chunkStart
+            prior = 0
+            for i in range(0, len(changes), 2):
+                putVarint(data, changes[i] - time)
+                putVarint(data, changes[i+1] ^ prior)
+                time = changes[i]
+                prior = changes[i+1]
+            blocks.append((sid, start, len(data) - start))
+        self.file.write(data)
+        self.index.append((self.chunkStart, self.chunkEnd, self.offset, blocks))
+        self.offset += len(data)
+        self.changes = {}
+        self.nChanges = 0
+
+    def close(self):
+        if self.file == None:
+            return
+        self.writeChunk()
+        out = bytearray()
+        putString(out, self.timeScale)
+        putVarint(out, len(self.signals))
+        for signal in self.signals:
+            putVarint(out, len(signal))
+        putVarint(out, len(self.names))
+        for name, sid in self.names:
+            putString(out, name)
+            putVarint(out, sid)
+        putVarint(out, len(self.index))
+        for start, end, offset, blocks in self.index:
+            putVarint(out, start)
+            putVarint(out, end)
+            putVarint(out, offset)
+            putVarint(out, len(blocks))
+            for sid, blockOffset, length in blocks:
+                putVarint(out, sid)
+                putVarint(out, blockOffset)
+                putVarint(out, length)
+        self.file.write(out)
+        self.file.write(struct.pack('<Q', self.offset))
+        self.file.write(MAGIC)
+        self.file.close()
+        self.file = None
+
+class TraceReader(object):
+    def __init__(self, fileName):
+        self.file = open(fileName, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self.data
+        if data[:len(MAGIC)] != MAGIC or data[-len(MAGIC):] != MAGIC:
+            raise Exception(f'Not a trace file: {fileName}')
+        pos, = struct.unpack('<Q', data[-len(MAGIC)-8:-len(MAGIC)])
+        self.timeScale, pos = getString(data, pos)
+        n, pos = getVarint(data, pos)
+        self.widths = []
+        for i in range(n):
+            width, pos = getVarint(data, pos)
+            self.widths.append(width)
+        n, pos = getVarint(data, pos)
+        # hierarchical name -> signal id, in component order
+        self.names = {}
+        for i in range(n):
+            name, pos = getString(data, pos)
+            sid, pos = getVarint(data, pos)
+            self.names[name] = sid
+        n, pos = getVarint(data, pos)
+        # (start, end, offset, {signal id: (offset, length)})
+        self.chunks = []
+        for i in range(n):
+            start, pos = getVarint(data, pos)
+            end, pos = getVarint(data, pos)
+            offset, pos = getVarint(data, pos)
+            nBlocks, pos = getVarint(data, pos)
+            blocks = {}
+            for j in range(nBlocks):
+                sid, pos = getVarint(data, pos)
+                blockOffset, pos = getVarint(data, pos)
+                length, pos = getVarint(data, pos)
+                blocks[sid] = (offset + blockOffset, length)
+            self.chunks.append((start, end, offset, blocks))
+
+    def getNames(self):
+        return list(self.names)
+
+    def getWidth(self, name):
+        return self.widths[self.names[name]]
+
+    def decodeBlock(self, chunk, sid):
+        start, end, offset, blocks = chunk
+        pos, length = blocks[sid]
+        stop = pos + length
+        data = self.data
+        time = start
+        value = 0
+        changes = []
+        while pos < stop:
+            delta, pos = getVarint(data, pos)
+            diff, pos = getVarint(data, pos)
+            time += delta
+            value ^= diff
+            changes.append((time, value))
+        return changes
+
+    # Changes of one signal in [startTime, endTime], starting with the
+    # last change at or before startTime
+    def getHistory(self, name, startTime=0, endTime=None):
+        sid = self.names[name]
+        history = []
+        # last chunk with a change to this signal before the window
+        before = None
+        for chunk in self.chunks:
+            start, end, offset, blocks = chunk
+            if endTime != None and start > endTime:
+                break
+            if sid not in blocks:
+                continue
+            if end < startTime:
+                before = chunk
+                continue
+            for time, value in self.decodeBlock(chunk, sid):
+                if endTime != None and time > endTime:
+                    break
+                if time <= startTime:
+                    history = [(time, value)]
+                else:
+                    history.append((time, value))
+        if (len(history) == 0 or history[0][0] > startTime) and before != None:
+            history.insert(0, self.decodeBlock(before, sid)[-1])
+        return history
+
+    def getValue(self, name, time):
+        history = self.getHistory(name, time, time)
+        return history[-1][1] if len(history) > 0 else None
+
+    def toVCD(self, fileName):
+        with open(fileName, 'wt') as f:
+            f.write(f'$timescale {self.timeScale} $end\n')
+            tags = [f't{sid:x}' for sid in range(len(self.widths))]
+            scope = []
+            for name, sid in self.names.items():
+                path = name.split('.')
+                common = 0
+                while common < len(scope) and common < len(path) - 1 and scope[common] == path[common]:
+                    common += 1
+                while len(scope) > common:
+                    scope.pop()
+                    f.write('$upscope $end\n')
+                while len(scope) < len(path) - 1:
+                    scope.append(path[len(scope)])
+                    f.write(f'$scope module {scope[-1]} $end\n')
+                f.write(f'$var wire {self.widths[sid]} {tags[sid]} {path[-2]}_{path[-1]} $end\n')
+            while len(scope) > 0:
+                scope.pop()
+                f.write('$upscope $end\n')
+            f.write('$enddefinitions $end\n')
+            timeWritten = None
+            # the first time step holds the initial values, as VCDFile writes them
+            dumpvars = False
+            for chunk in self.chunks:
+                changes = []
+                for sid in chunk[3]:
+                    for time, value in self.decodeBlock(chunk, sid):
+                        changes.append((time, sid, value))
+                changes.sort(key=lambda change: change[0])
+                lines = []
+                for time, sid, value in changes:
+                    if time != timeWritten:
+                        if dumpvars:
+                            lines.append('$end')
+                            dumpvars = False
+                        lines.append(f'#{time}')
+                        if timeWritten == None:
+                            lines.append('$dumpvars')
+                            dumpvars = True
+                        timeWritten = time
+                    if self.widths[sid] == 1:
+                        lines.append(f'{value}{tags[sid]}')
+                    else:
+                        lines.append(f'b{value:b} {tags[sid]}')
+                f.write('\n'.join(lines) + '\n')
+            if dumpvars:
+                f.write('$end\n')
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+def toVCD(traceFileName, vcdFileName):
+    reader = TraceReader(traceFileName)
+    reader.toVCD(vcdFileName)
+    reader.close()
@@ -0,0 +1,28 @@
+import fnmatch
+
+# Selects the signals written by VCDFile and TraceFile.
+# Names are hierarchical, e.g. top.cpu.pipeline, and patterns are globs
+# where * also matches dots. The top component is at depth 0.
+class TraceFilter(object):
+    def __init__(self, patterns=None, depth=None, signals=None):
+        self.patterns = patterns
+        self.depth = depth
+        # id(signal) of explicit signals, a list or a dict like the ones built for ControlPanel.App
+        self.signalIds = None
+        if signals != None:
+            if isinstance(signals, dict):
+                signals = signals.values()
+            self.signalIds = set(id(s) for s in signals)
+
+    def acceptsDepth(self, depth):
+        return self.depth == None or depth <= self.depth
+
+    def accepts(self, name, signal):
+        if self.signalIds != None and id(signal) in self.signalIds:
+            return True
+        if self.patterns != None:
+            for pattern in self.patterns:
+                if fnmatch.fnmatchcase(name, pattern):
+                    return True
+            return False
+        return self.signalIds == None
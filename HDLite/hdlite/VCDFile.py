@@ -1,15 +1,34 @@
+import collections
+import gzip
+
+from hdlite import TraceFilter as tf
 
 # See https://en.wikipedia.org/wiki/Value_change_dump
 # See https://zipcpu.com/blog/2017/07/31/vcd.html
 class VCDFile(object):
-    def __init__(self, fileName, timeScale):
-        if fileName != None:
-            self.file = open(fileName, 'wt')
-        else:
+    def __init__(self, fileName, timeScale, bufferSize=1 << 20):
+        if fileName == None:
             self.file = None
+        elif fileName.endswith('.gz'):
+            self.file = gzip.open(fileName, 'wt')
+        else:
+            self.file = open(fileName, 'wt', buffering=bufferSize)
         self.tagIndex = 0
         # map tag name to signals
         self.tagMap = {}
+        # traced signals, tags and last values written, in tag order
+        self.signals = []
+        self.tags = []
+        self.values = []
+        # id(signal) -> tag
+        self.signalTags = {}
+        self.time = 0
+        self.timeWritten = None
+        # lines waiting to be written
+        self.lines = []
+        self.traceFilter = tf.TraceFilter()
+        # logic analyzer mode, see setTrigger()
+        self.trigger = None
         header = '''$date
    Date text. For example: November 11, 2009.
 $end
@@ -22,42 +41,138 @@ $end
 $timescale %s $end''' % (timeScale)
         self.println(header)
 
-    def addSignals(self, component, indent=0):
+    def addSignals(self, component, indent=0, path=''):
         moduleName = component.getName()
+        path = path + moduleName
         tab = '    '*indent
         self.println(f'  {tab}$scope module {moduleName} $end')
         for signalName in component.signalMap:
-            tag = f't{self.tagIndex:x}'
-            self.tagIndex += 1
             signal = component.signalMap[signalName]
-            self.tagMap[tag] = signal
+            if not self.traceFilter.accepts(f'{path}.{signalName}', signal):
+                continue
+            # Ports shared with other components reuse the same tag
+            tag = self.signalTags.get(id(signal))
+            if tag == None:
+                tag = f't{self.tagIndex:x}'
+                self.tagIndex += 1
+                self.tagMap[tag] = signal
+                self.signalTags[id(signal)] = tag
+                self.signals.append(signal)
+                self.tags.append(tag)
+                self.values.append(None)
             self.println(f'    {tab}$var wire {len(signal)} {tag} {moduleName}_{signalName} $end')
-        for name in component.componentMap:
-            self.addSignals(component.componentMap[name], indent+1)
+        if self.traceFilter.acceptsDepth(indent+1):
+            for name in component.componentMap:
+                self.addSignals(component.componentMap[name], indent+1, path + '.')
         self.println(f'  {tab}$upscope $end')
-    
+
+    # Keep the last preTrigger time steps in memory and write nothing until
+    # trigger() returns true, then write them and postTrigger more time steps
+    def setTrigger(self, trigger, preTrigger=100, postTrigger=100):
+        self.trigger = trigger
+        self.preTrigger = preTrigger
+        self.postTrigger = postTrigger
+        # (time, [(index, value), ...]) per time step
+        self.history = collections.deque()
+        # values before the oldest time step in history
+        self.base = []
+        self.baseTime = 0
+        self.triggerTime = None
+        self.postTimes = 0
+
     def addInitialValues(self):
+        if self.trigger != None:
+            self.println('$enddefinitions $end')
+            self.base = [None] * len(self.signals)
+            self.writeSignals()
+            return
         dv = '''$enddefinitions $end
-$dumpvars'''
+#%d
+$dumpvars''' % (self.time)
         self.println(dv)
+        self.timeWritten = self.time
         self.writeSignals()
         self.println('$end')
-    
+
     def addTime(self, time):
-        self.println('#%d' % time)
-    
+        self.time = time
+
+    # Write only the signals that changed since they were last written
     def writeSignals(self):
-        for tag in self.tagMap:
-            signal = self.tagMap[tag]
-            if len(signal) == 1:
-                self.println('%s%s' % (str(signal.getIntValue()), tag))
+        if self.file == None:
+            return
+        changes = []
+        values = self.values
+        for i, signal in enumerate(self.signals):
+            value = signal.getIntValue()
+            if value != values[i]:
+                values[i] = value
+                changes.append((i, value))
+        if self.trigger != None:
+            self.capture(changes)
+        else:
+            self.writeChanges(self.time, changes)
+
+    def writeChanges(self, time, changes):
+        if len(changes) == 0:
+            return
+        if self.timeWritten != time:
+            self.timeWritten = time
+            self.lines.append(f'#{time}')
+        for i, value in changes:
+            if len(self.signals[i]) == 1:
+                self.lines.append(f'{value}{self.tags[i]}')
             else:
-                self.println('%s %s' % (bin(signal.getIntValue())[1:], tag))
-    
+                self.lines.append(f'b{value:b} {self.tags[i]}')
+        if len(self.lines) > 10000:
+            self.flush()
+
+    def capture(self, changes):
+        if self.triggerTime == None:
+            history = self.history
+            if len(history) > 0 and history[-1][0] == self.time:
+                history[-1][1].extend(changes)
+            elif len(changes) > 0:
+                history.append((self.time, changes))
+                if len(history) > self.preTrigger:
+                    self.baseTime, evicted = history.popleft()
+                    for i, value in evicted:
+                        self.base[i] = value
+            if self.trigger():
+                self.triggerTime = self.postTime = self.time
+                self.writeHistory()
+        elif self.postTimes <= self.postTrigger:
+            if self.time != self.postTime:
+                self.postTime = self.time
+                self.postTimes += 1
+                if self.postTimes > self.postTrigger:
+                    self.flush()
+                    return
+            self.writeChanges(self.time, changes)
+
+    def writeHistory(self):
+        base = [(i, value) for i, value in enumerate(self.base) if value != None]
+        if len(base) > 0:
+            self.lines.append(f'#{self.baseTime}')
+            self.lines.append('$dumpvars')
+            self.timeWritten = self.baseTime
+            self.writeChanges(self.baseTime, base)
+            self.lines.append('$end')
+        for time, changes in self.history:
+            self.writeChanges(time, changes)
+        self.history.clear()
+        self.flush()
+
     def println(self, line):
         if self.file != None:
-            self.file.write(line + '\n')
-        
+            self.lines.append(line)
+
+    def flush(self):
+        if self.file != None and len(self.lines) > 0:
+            self.file.write('\n'.join(self.lines) + '\n')
+        self.lines = []
+
     def close(self):
+        self.flush()
         if self.file != None:
             self.file.close()
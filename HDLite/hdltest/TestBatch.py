@@ -0,0 +1,110 @@
+import tempfile
+import unittest
+
+from hdlite import Simulation as sim
+from hdlite import Signal as sig
+from hdlite import Batch as batch
+from hdlite import Compiler as compiler
+
+from hdlite.Component import *
+from hdltest.TestSignals import SplitCounter
+from examples import ALUDriver, Counter
+
+class Limiter(Component):
+    def __init__(self, a, limit, y):
+        super().__init__()
+        self.a = a
+        self.limit = limit
+        self.y = y
+
+    def run(self):
+        self.y <<= self.limit if self.a > self.limit and not self.a == 15 else self.a
+
+class Searcher(Component):
+    def __init__(self, a, y):
+        super().__init__()
+        self.a = a
+        self.y = y
+
+    def run(self):
+        i = 0
+        while i < self.a.getIntValue():
+            i += 1
+        self.y <<= i
+
+@unittest.skipIf(batch.np == None, 'numpy is not installed')
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def newSimulation(self, makeTop):
+        sim.simulation = sim.Simulation()
+        sim.simulation.cacheDir = self.dir.name
+        top = makeTop()
+        sim.simulation.setTopComponent(top)
+        return top
+
+    def makeCounter(self, counterClass):
+        top = Component()
+        top.resetn, top.clock, top.out = sig.Signal(1), sig.Signal(), sig.Vector(4)
+        top.c1 = counterClass(top.resetn, top.clock, top.out)
+        return top
+
+    def makeLimiter(self):
+        top = Component()
+        top.clock, top.a, top.limit, top.y = sig.Signal(), sig.Vector(4), sig.Vector(4), sig.Vector(4)
+        top.limiter = Limiter(top.a, top.limit, top.y)
+        return top
+
+    def makeSearcher(self):
+        top = Component()
+        top.clock, top.a, top.y = sig.Signal(), sig.Vector(4), sig.Vector(4)
+        top.searcher = Searcher(top.a, top.y)
+        return top
+
+    def testCounter(self):
+        for counterClass in (Counter, SplitCounter):
+            tb = self.newSimulation(lambda: self.makeCounter(counterClass))
+            b = batch.Batch(sim.simulation, tb.clock, 4)
+            b.setValue(tb.resetn, [1, 0, 1, 1])
+            if counterClass is SplitCounter:
+                b.setState(tb.c1, 'count', [0, 0, 5, 9])
+            else:
+                b.setValue(tb.out, [0, 0, 5, 9])
+            b.run(3)
+            self.assertEqual(list(b.getValue(tb.out)), [3, 0, 8, 10])
+            b.run(10)
+            self.assertEqual(list(b.getValue(tb.out)), [10, 0, 10, 10])
+
+    def testAm2901(self):
+        seeds = [i * 977 for i in range(16)]
+        tb = self.newSimulation(ALUDriver)
+        b = batch.Batch(sim.simulation, tb.clock, len(seeds))
+        b.setValue(tb.count, seeds)
+        b.run(200)
+        for lane, seed in enumerate(seeds):
+            expected = self.newSimulation(ALUDriver)
+            expected.count <<= seed
+            sim.simulation.runCompiled(expected.clock, 200)
+            self.assertEqual(b.getValue(tb.yout)[lane], expected.yout.getIntValue())
+            self.assertEqual(b.getValue(tb.alu.q)[lane], expected.alu.q.getIntValue())
+            self.assertEqual(list(b.getState(tb.alu, 'regs')[lane]), expected.alu.regs)
+
+    def testBoolOps(self):
+        top = self.newSimulation(self.makeLimiter)
+        b = batch.Batch(sim.simulation, top.clock, 4)
+        b.setValue(top.a, [3, 9, 15, 12])
+        b.setValue(top.limit, 10)
+        b.run(1)
+        self.assertEqual(list(b.getValue(top.y)), [3, 9, 15, 10])
+
+    def testUnsupported(self):
+        top = self.newSimulation(self.makeSearcher)
+        with self.assertRaisesRegex(compiler.CompileError, 'while'):
+            batch.Batch(sim.simulation, top.clock, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from hdlite import Simulation as sim
+
+from benchmarks import Suite as suite
+
+class TestBenchmarks(unittest.TestCase):
+    # Every case for a few clocks, in this process
+    def testCases(self):
+        for name in suite.CASES:
+            result = suite.runCase(name, 5)
+            self.assertEqual(result['clocks'], 5, name)
+            self.assertGreater(result['clocksPerSecond'], 0, name)
+            self.assertGreater(result['deltasPerClock'], 0, name)
+            self.assertGreater(result['vcdBytesPerClock'], 0, name)
+
+    def testCounter(self):
+        s = sim.Simulation()
+        top = suite.newDesign(s, 'counter')
+        suite.clockDesign(s, top, 20)
+        self.assertEqual(top.out, 20 & 0xf)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import contextlib
+import io
+import marshal
+import os
+import pickle
+import tempfile
+import unittest
+import zlib
+
+from hdlite import Simulation as sim
+
+from bitslice.bitslice_tb import bitslice_tb
+
+CONT = 0x80
+JUMP = 0xb0
+CALL = 0x70
+RTS = 0x20
+
+def makeTB():
+    tb = bitslice_tb()
+    data = [CONT] * 16
+    data[3] = CALL|8
+    data[6] = JUMP|0
+    data[9] = RTS
+    for i in range(len(data)):
+        tb.rom.memory[i] = data[i]
+    return tb
+
+def state():
+    signals = [(s.value, s.priorValue, s.futureValue) for s in sim.simulation.signals]
+    components = [p.getState() for p in sim.simulation.components]
+    return sim.simulation.time, signals, components
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join(self.dir.name, 'bitslice.ckpt')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def testResume(self):
+        sim.simulation = sim.Simulation()
+        sim.simulation.run(makeTB())
+        expected = state()
+
+        sim.simulation = sim.Simulation()
+        sim.simulation.run(makeTB(), 203)
+        self.assertEqual(sim.simulation.time, 200)
+        sim.simulation.checkpoint(self.fileName)
+        sim.simulation.runUntil()
+        self.assertEqual(state(), expected)
+
+        sim.simulation = sim.Simulation()
+        tb = makeTB()
+        sim.simulation.restore(self.fileName)
+        self.assertEqual(sim.simulation.time, 200)
+        sim.simulation.run(tb)
+        self.assertEqual(state(), expected)
+        self.assertEqual(tb.clock, 0)
+
+    def testWrongDesign(self):
+        sim.simulation = sim.Simulation()
+        sim.simulation.run(makeTB(), 100)
+        sim.simulation.checkpoint(self.fileName)
+        sim.simulation = sim.Simulation()
+        makeTB()
+        makeTB()
+        with self.assertRaises(Exception):
+            sim.simulation.restore(self.fileName)
+
+    def testNotPlainData(self):
+        sim.simulation = sim.Simulation()
+        makeTB()
+        for data in (pickle.dumps({'signals': []}), marshal.dumps({'signals': [compile('0', '', 'eval')]})):
+            with open(self.fileName, 'wb') as f:
+                f.write(sim.CHECKPOINT_MAGIC + zlib.compress(data))
+            with self.assertRaisesRegex(Exception, 'Not a checkpoint file'):
+                sim.simulation.restore(self.fileName)
+
+    # A trace started after restore() starts at the restored time
+    def testTrace(self):
+        sim.simulation = sim.Simulation()
+        sim.simulation.run(makeTB(), 203)
+        sim.simulation.checkpoint(self.fileName)
+        vcdName = os.path.join(self.dir.name, 'bitslice.vcd')
+        sim.simulation = sim.Simulation(vcdName)
+        tb = makeTB()
+        sim.simulation.restore(self.fileName)
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim.simulation.run(tb)
+        with open(vcdName) as f:
+            lines = f.read().split('\n')
+        self.assertEqual(lines[lines.index('$dumpvars') - 1], '#200')
+        with self.assertRaisesRegex(Exception, 'trace has started'):
+            sim.simulation.restore(self.fileName)
+
+if __name__ == '__main__':
+    unittest.main()
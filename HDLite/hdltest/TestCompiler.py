@@ -0,0 +1,164 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from hdlite import Simulation as sim
+from hdlite import Signal as sig
+from hdlite import Compiler as compiler
+
+from hdlite.Component import *
+from hdltest.TestSignals import SplitCounter
+from examples import ALUDriver, Counter
+
+class Waiter(Component):
+    def __init__(self, a, y):
+        super().__init__()
+        self.a = a
+        self.y = y
+
+    def run(self):
+        self.y <<= self.a
+        self.wait(1)
+
+class TestCompiler(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def newSimulation(self):
+        sim.simulation = sim.Simulation()
+        sim.simulation.cacheDir = self.dir.name
+
+    def runBoth(self, makeTB, clock, snapshot, nCycles):
+        self.newSimulation()
+        tb = makeTB()
+        sim.simulation.setTopComponent(tb)
+        expected = []
+        for i in range(nCycles):
+            sim.simulation.runCycles(clock(tb))
+            expected.append(snapshot(tb))
+        self.newSimulation()
+        tb = makeTB()
+        sim.simulation.setTopComponent(tb)
+        actual = []
+        for i in range(nCycles):
+            sim.simulation.runCompiled(clock(tb))
+            actual.append(snapshot(tb))
+        self.assertEqual(actual, expected)
+        return tb
+
+    def makeCounter(self, counterClass):
+        top = Component()
+        top.resetn, top.clock, top.out = sig.Signal(1), sig.Signal(), sig.Vector(4)
+        top.c1 = counterClass(top.resetn, top.clock, top.out)
+        return top
+
+    def testCounter(self):
+        tb = self.runBoth(lambda: self.makeCounter(Counter), lambda tb: tb.clock, lambda tb: tb.out.getIntValue(), 15)
+        self.assertEqual(tb.out, 10)
+
+    def testSplitCounter(self):
+        tb = self.runBoth(lambda: self.makeCounter(SplitCounter), lambda tb: tb.clock, lambda tb: tb.out.getIntValue(), 15)
+        self.assertEqual(tb.out, 10)
+
+    def testAm2901(self):
+        self.runBoth(ALUDriver, lambda tb: tb.clock, ALUDriver.snapshot, 300)
+
+    def testBatch(self):
+        self.newSimulation()
+        tb = ALUDriver()
+        sim.simulation.setTopComponent(tb)
+        sim.simulation.runCycles(tb.clock, 100)
+        expected = tb.snapshot()
+        self.newSimulation()
+        tb = ALUDriver()
+        sim.simulation.setTopComponent(tb)
+        sim.simulation.runCompiled(tb.clock, 100)
+        self.assertEqual(tb.snapshot(), expected)
+        self.assertEqual(tb.clock, 0)
+
+    def testCache(self):
+        self.newSimulation()
+        tb = ALUDriver()
+        sim.simulation.setTopComponent(tb)
+        sim.simulation.runCompiled(tb.clock, 0)
+        self.assertIsNotNone(sim.simulation.compiled.getSource())
+        key = sim.simulation.compiled.key
+        self.newSimulation()
+        tb = ALUDriver()
+        sim.simulation.setTopComponent(tb)
+        sim.simulation.runCompiled(tb.clock, 0)
+        self.assertEqual(sim.simulation.compiled.key, key)
+        self.assertIsNone(sim.simulation.compiled.getSource())
+        self.newSimulation()
+        tb = self.makeCounter(Counter)
+        sim.simulation.setTopComponent(tb)
+        sim.simulation.runCompiled(tb.clock, 0)
+        self.assertNotEqual(sim.simulation.compiled.key, key)
+
+    # Cache files for another Python or cut short are generated again
+    def testCacheHeader(self):
+        def compileALU():
+            self.newSimulation()
+            tb = ALUDriver()
+            sim.simulation.setTopComponent(tb)
+            sim.simulation.runCompiled(tb.clock, 0)
+            return sim.simulation.compiled
+        compiled = compileALU()
+        fileName = os.path.join(self.dir.name, f'{compiled.key}.bin')
+        with open(fileName, 'rb') as f:
+            header = f.readline()
+            data = f.read()
+        self.assertEqual(header.split()[1], sys.implementation.cache_tag.encode())
+        for header, data in ((header.replace(b'hdlite ', b'hdlite other-'), data), (header, data[:-10])):
+            with open(fileName, 'wb') as f:
+                f.write(header + data)
+            self.assertIsNotNone(compileALU().getSource())
+            self.assertIsNone(compileALU().getSource())
+
+    def testNoCache(self):
+        environ = os.environ.pop('HDLITE_CACHE', None)
+        try:
+            for i in range(2):
+                sim.simulation = sim.Simulation()
+                tb = ALUDriver()
+                sim.simulation.setTopComponent(tb)
+                sim.simulation.runCompiled(tb.clock, 0)
+                self.assertIsNone(sim.simulation.compiled.cacheDir)
+                self.assertIsNotNone(sim.simulation.compiled.getSource())
+        finally:
+            if environ != None:
+                os.environ['HDLITE_CACHE'] = environ
+
+    # Switch to event-driven simulation after running compiled code
+    def testEventDriven(self):
+        snapshots = []
+        for runCycles in (sim.Simulation.runCycles, sim.Simulation.runCompiled):
+            self.newSimulation()
+            tb = ALUDriver()
+            sim.simulation.setTopComponent(tb)
+            runCycles(sim.simulation, tb.clock, 50)
+            snapshot = []
+            for i in range(20):
+                tb.clock <<= 1
+                sim.simulation.runUntilStable()
+                tb.clock <<= 0
+                sim.simulation.runUntilStable()
+                snapshot.append(tb.snapshot())
+            snapshots.append(snapshot)
+        self.assertEqual(snapshots[1], snapshots[0])
+
+    def testUnsupported(self):
+        self.newSimulation()
+        top = self.makeCounter(Counter)
+        top.y = sig.Signal()
+        top.waiter = Waiter(top.out[0], top.y)
+        sim.simulation.setTopComponent(top)
+        with self.assertRaisesRegex(compiler.CompileError, 'wait'):
+            sim.simulation.runCompiled(top.clock)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from hdlite import Simulation as sim
+
+from bitslice import Storage as storage
+from bitslice.Memory import AddressSpace
+from Centurion import Emulator as emulator
+from Centurion.Emulator import Emulator
+
+import run_cpu6
+
+class TestEmulator(unittest.TestCase):
+    def newEmulator(self, program, start=0):
+        space = AddressSpace(16)
+        space.load(bytes(program), start)
+        cpu = Emulator(space, bytearray(256))
+        cpu.pc = start
+        return cpu
+
+    def testHellorld(self):
+        space = AddressSpace(16)
+        space.load(storage.readHex('Centurion/programs/hellorld.txt'), run_cpu6.ORIGIN)
+        output = []
+        space.mapDevice(run_cpu6.UART, 1, write=lambda address, value: output.append(chr(value)))
+        cpu = Emulator(space, bytearray(256))
+        cpu.pc = run_cpu6.ORIGIN
+        cpu.run()
+        self.assertEqual(cpu.reason, 'halt')
+        self.assertEqual(''.join(output), 'Hellorld!\n')
+        self.assertEqual(space.read(0x5b00), 0x5a)
+        self.assertEqual(cpu.getRegister(1), 0x5a)
+
+    def testInstructions(self):
+        program = [
+            0x90, 0x12, 0x34,   # LDA 0x1234
+            0xb1, 0x01, 0x00,   # STA 0x0100
+            0xc2, 0x00, 0x20,   # LDBL (0x0020)
+            0x80, 0x00,         # LDAL 0
+            0x15, 0x02,         # BNZ +2
+            0x14, 0x01,         # BZ +1
+            0x00,               # HLT, skipped
+            0x72, 0x00, 0x22,   # JMP (0x0022)
+        ]
+        cpu = self.newEmulator(program + [0] * (0x20 - len(program)) + [0x01, 0x00, 0x00, 0x30])
+        self.assertEqual(cpu.run(untilPC=0x0030), 7)
+        self.assertEqual(cpu.reason, 'pc')
+        self.assertEqual(cpu.getWord(emulator.A), 0x1200)
+        self.assertEqual([cpu.memory.read(a) for a in (0x100, 0x101)], [0x12, 0x34])
+        self.assertEqual(cpu.getRegister(3), 0x12)
+        self.assertEqual(cpu.flags & (emulator.FLAG_VALUE | emulator.FLAG_MINUS), emulator.FLAG_VALUE)
+
+    def testUnimplemented(self):
+        cpu = self.newEmulator([0x01, 0x80, 0xff, 0x40, 0x01])
+        self.assertEqual(cpu.run(), 2)
+        self.assertEqual(cpu.reason, 'unimplemented')
+        self.assertEqual(cpu.pc, 3)
+        self.assertEqual(cpu.flags & emulator.FLAG_MINUS, emulator.FLAG_MINUS)
+        with self.assertRaisesRegex(emulator.Unimplemented, 'Instruction 40 at 0003'):
+            cpu.step()
+
+    # Bus accesses of CPU6 from an instruction fetch up to the next one, as
+    # (address, value, write) like Emulator.startTrace()
+    def traceCPU6(self, simulation, top):
+        fetch = top.cpu.uc_rom_address.getIntValue()
+        trace = []
+        for i in range(1000):
+            address = top.addressBus.getIntValue()
+            if top.writeEnBus == 1:
+                access = (address, top.dataOutBus.getIntValue(), True)
+            else:
+                access = (address, top.dataInBus.getIntValue(), False)
+            if len(trace) == 0 or (trace[-1][0], trace[-1][2]) != (address, access[2]):
+                trace.append(access)
+            run_cpu6.clockCPU6(simulation, top)
+            if top.cpu.uc_rom_address == fetch:
+                # the address of the next fetch may be on the bus already
+                if trace[-1][0] == top.addressBus.getIntValue():
+                    trace.pop()
+                return trace
+        self.fail('CPU6 does not fetch another instruction')
+
+    # Hand over to the microcode level CPU6 after each of the first
+    # instructions of hellorld. CPU6 then holds the registers, flags and PC
+    # of an emulator run on its own memory and makes the same bus accesses,
+    # up to its next instruction fetch. CPU6.py fetches that from the wrong
+    # address, so the comparison stops there.
+    def testHandoff(self):
+        with contextlib.redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as dir:
+            simulation = sim.Simulation()
+            sim.simulation = simulation
+            top = run_cpu6.CPU6TBPanel()
+            simulation.setTopComponent(top)
+            run_cpu6.resetCPU6(simulation, top)
+            fileName = os.path.join(dir, 'fetch.ckpt')
+            simulation.checkpoint(fileName)
+            for count in range(12):
+                simulation.restore(fileName)
+                space = AddressSpace(16)
+                space.load(storage.readHex('Centurion/programs/hellorld.txt'), run_cpu6.ORIGIN)
+                space.mapDevice(run_cpu6.UART, 1)
+                reference = Emulator(space, bytearray(top.cpu.reg_ram.memory))
+                reference.load(top.cpu)
+                reference.run(count)
+                cpu = Emulator(top.memory.space, top.cpu.reg_ram.memory)
+                cpu.load(top.cpu)
+                self.assertEqual(cpu.run(count), count)
+                # Change the register CPU6 addresses and, after reset, the
+                # NOP it fetches next, store() must evaluate them again
+                address = top.cpu.reg_ram_addr.getIntValue()
+                for state in (reference, cpu):
+                    state.registers[address] ^= 0x5a
+                    if count == 0:
+                        state.write(state.pc, 0x08)
+                reference.setWord(emulator.P, reference.pc)
+                cpu.store(top.cpu, simulation)
+                self.assertEqual(top.cpu.reg_ram_data_out,
+                    top.cpu.reg_ram.memory[top.cpu.reg_ram_addr.getIntValue()])
+                self.assertEqual(top.dataInBus, top.memory.space.read(top.addressBus.getIntValue()))
+                cpu = Emulator(top.memory.space, top.cpu.reg_ram.memory)
+                cpu.load(top.cpu)
+                self.assertEqual((cpu.pc, cpu.flags, list(cpu.registers)),
+                    (reference.pc, reference.flags, list(reference.registers)), f'count {count}')
+                self.assertEqual(top.cpu.work_address, reference.pc)
+                trace = self.traceCPU6(simulation, top)
+                expected = reference.startTrace()
+                while len(expected) < len(trace):
+                    reference.step()
+                self.assertGreaterEqual(len(trace), 2)
+                self.assertEqual(trace, expected[0:len(trace)], f'count {count}')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+
+from hdlite import Simulation as sim
+from hdlite import Signal as sig
+
+from hdlite.Component import *
+from examples import ALUDriver
+
+class Adder(Component):
+    def __init__(self, a, b, y, size=4096, complete=True):
+        super().__init__()
+        self.a = a
+        self.b = b
+        self.y = y
+        self.calls = 0
+        self.memoize(size, complete=complete)
+
+    def run(self):
+        self.calls += 1
+        self.y <<= self.a + self.b
+
+# Reads b in a helper method
+class HelperAdder(Adder):
+    def run(self):
+        self.calls += 1
+        self.y <<= self.a + self.getB()
+
+    def getB(self):
+        return self.b.getIntValue()
+
+# Reads the output of another adder through it
+class ChildAdder(Component):
+    def __init__(self, adder, y):
+        super().__init__()
+        self.adder = adder
+        self.y = y
+        self.memoize()
+
+    def run(self):
+        self.y <<= self.adder.y + 1
+
+class TestMemo(unittest.TestCase):
+    def setUp(self):
+        sim.simulation = sim.Simulation()
+
+    def add(self, top, a, b):
+        top.a <<= a
+        top.b <<= b
+        sim.simulation.runUntilStable()
+        return top.y.getIntValue()
+
+    def testLookup(self):
+        top = Component()
+        top.a, top.b, top.y = sig.Vector(8), sig.Vector(8), sig.Vector(8)
+        top.adder = Adder(top.a, top.b, top.y, 2)
+        sim.simulation.setTopComponent(top)
+        memo = top.adder.memo
+        self.assertEqual(self.add(top, 1, 2), 3)
+        self.assertEqual(self.add(top, 3, 4), 7)
+        calls = top.adder.calls
+        self.assertEqual(self.add(top, 1, 2), 3)
+        self.assertEqual(self.add(top, 3, 4), 7)
+        self.assertEqual(top.adder.calls, calls)
+        self.assertGreater(memo.hits, 0)
+        # 1 + 2 is the least recently used of the two entries
+        self.assertEqual(self.add(top, 5, 6), 11)
+        self.assertEqual(len(memo.table), 2)
+        calls = top.adder.calls
+        self.assertEqual(self.add(top, 3, 4), 7)
+        self.assertEqual(top.adder.calls, calls)
+        self.assertEqual(self.add(top, 1, 2), 3)
+        self.assertGreater(top.adder.calls, calls)
+
+    def testIncomplete(self):
+        top = Component()
+        top.a, top.b, top.y = sig.Vector(8), sig.Vector(8), sig.Vector(8)
+        top.adder = Adder(top.a, top.b, top.y, complete=False)
+        sim.simulation.setTopComponent(top)
+        self.assertEqual(self.add(top, 1, 2), 3)
+        self.assertEqual(self.add(top, 3, 4), 7)
+        calls = top.adder.calls
+        # y is part of the key, it was 0 rather than 7 the first time
+        self.assertEqual(self.add(top, 1, 2), 3)
+        self.assertGreater(top.adder.calls, calls)
+
+    def testHelper(self):
+        top = Component()
+        top.a, top.b, top.y = sig.Vector(8), sig.Vector(8), sig.Vector(8)
+        top.adder = HelperAdder(top.a, top.b, top.y)
+        sim.simulation.setTopComponent(top)
+        self.assertEqual(self.add(top, 1, 2), 3)
+        self.assertEqual(self.add(top, 1, 5), 6)
+
+    def testChild(self):
+        a, b, y = sig.Vector(8), sig.Vector(8), sig.Vector(8)
+        with self.assertRaisesRegex(Exception, 'Cannot memoize ChildAdder'):
+            ChildAdder(Adder(a, b, y), sig.Vector(8))
+
+    def testProfiler(self):
+        top = Component()
+        top.a, top.b, top.y = sig.Vector(8), sig.Vector(8), sig.Vector(8)
+        top.adder = Adder(top.a, top.b, top.y)
+        sim.simulation.setTopComponent(top)
+        profiler = sim.simulation.startProfiler()
+        self.assertEqual(self.add(top, 1, 2), 3)
+        profiler.stop()
+        self.assertIs(top.adder.run, top.adder.memo)
+
+    def runALU(self, memoize):
+        sim.simulation = sim.Simulation()
+        top = ALUDriver()
+        if not memoize:
+            del top.alu.comb
+        sim.simulation.setTopComponent(top)
+        top.clock <<= 0
+        sim.simulation.runUntilStable()
+        snapshots = []
+        for i in range(300):
+            top.clock <<= 1
+            sim.simulation.runUntilStable()
+            top.clock <<= 0
+            sim.simulation.runUntilStable()
+            snapshots.append(top.snapshot())
+        return snapshots, top.alu.__dict__.get('memo')
+
+    def testAm2901(self):
+        expected, memo = self.runALU(False)
+        snapshots, memo = self.runALU(True)
+        self.assertEqual(snapshots, expected)
+        self.assertGreater(memo.misses, 0)
+
+if __name__ == '__main__':
+    unittest.main()
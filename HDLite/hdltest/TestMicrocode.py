@@ -0,0 +1,90 @@
+import contextlib
+import io
+import unittest
+
+from hdlite import Simulation as sim
+
+from bitslice import Storage as storage
+from bitslice.Memory import AddressSpace
+from Centurion.Microcode import Microcode
+
+import run_cpu6
+
+REGISTERS = ('work_address', 'memory_address', 'register_index', 'result_register',
+    'flags_register', 'condition_codes', 'uc_rom_address', 'FBus', 'DPBus', 'reg_ram_data_out')
+
+class TestMicrocode(unittest.TestCase):
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+        self.simulation = sim.Simulation()
+        sim.simulation = self.simulation
+        self.top = run_cpu6.CPU6TBPanel()
+        self.simulation.setTopComponent(self.top)
+        self.top.reset <<= 1
+        self.simulation.runUntilStable()
+        self.top.reset <<= 0
+        self.simulation.runUntilStable()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def newMicrocode(self):
+        space = AddressSpace(16)
+        space.load(storage.readHex('Centurion/programs/hellorld.txt'), run_cpu6.ORIGIN)
+        space.mapDevice(run_cpu6.UART, 1, write=run_cpu6.writeUART)
+        cpu = Microcode(run_cpu6.read_ucode(), run_cpu6.read_map_rom(), space, storage.words(256, 8, 0xf5))
+        cpu.reset()
+        return cpu
+
+    def snapshot(self, top):
+        cpu = top.cpu
+        return ((cpu.pipeline.getIntValue(), top.addressBus.getIntValue(), top.writeEnBus.getIntValue(),
+            top.dataInBus.getIntValue(), top.dataOutBus.getIntValue()) +
+            tuple(getattr(cpu, name).getIntValue() for name in REGISTERS) +
+            tuple(cpu.alu0.regs) + tuple(cpu.alu1.regs))
+
+    def fastSnapshot(self, cpu):
+        return ((cpu.pipeline[0], cpu.addressBus, cpu.writeEnBus, cpu.dataInBus, cpu.dataOutBus) +
+            tuple(getattr(cpu, name) for name in REGISTERS) + tuple(cpu.regs[0]) + tuple(cpu.regs[1]))
+
+    def testTrace(self):
+        cpu = self.newMicrocode()
+        self.assertEqual(self.fastSnapshot(cpu), self.snapshot(self.top))
+        for i in range(400):
+            run_cpu6.clockCPU6(self.simulation, self.top)
+            cpu.clock()
+            self.assertEqual(self.fastSnapshot(cpu), self.snapshot(self.top), f'clock {i}')
+        self.assertEqual(cpu.clocks, 400)
+
+    def testUntilAddress(self):
+        cpu = self.newMicrocode()
+        n = cpu.clock(1000, untilAddress=run_cpu6.ORIGIN)
+        self.assertEqual(cpu.addressBus, run_cpu6.ORIGIN)
+        run_cpu6.resetCPU6(self.simulation, self.top)
+        self.assertEqual(self.fastSnapshot(cpu), self.snapshot(self.top))
+        self.assertEqual(cpu.clock(0), 0)
+        self.assertEqual(cpu.clocks, n)
+
+    # Run ahead on ints, hand over to CPU6 and back again
+    def testHandoff(self):
+        reference = self.newMicrocode()
+        cpu = Microcode(run_cpu6.read_ucode(), run_cpu6.read_map_rom(), self.top.memory.space,
+            self.top.cpu.reg_ram.memory)
+        cpu.load(self.top.cpu)
+        self.assertEqual(self.fastSnapshot(cpu), self.snapshot(self.top))
+        cpu.clock(300)
+        reference.clock(300)
+        cpu.store(self.top.cpu, self.simulation)
+        self.assertEqual(self.snapshot(self.top), self.fastSnapshot(reference))
+        for i in range(50):
+            run_cpu6.clockCPU6(self.simulation, self.top)
+            reference.clock()
+            self.assertEqual(self.snapshot(self.top), self.fastSnapshot(reference), f'clock {i}')
+        cpu.load(self.top.cpu)
+        self.assertEqual(self.fastSnapshot(cpu), self.fastSnapshot(reference))
+        self.assertEqual((cpu.pc, cpu.ar, cpu.sp, cpu.stacks, cpu.q),
+            (reference.pc, reference.ar, reference.sp, reference.stacks, reference.q))
+
+if __name__ == '__main__':
+    unittest.main()
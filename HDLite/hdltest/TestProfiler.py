@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from hdlite import Simulation as sim
+from hdlite import Signal as sig
+
+from hdlite.Component import *
+from hdltest.TestSignals import SplitCounter
+from examples import CounterTB
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        sim.simulation = sim.Simulation()
+
+    def testEventDriven(self):
+        tb = CounterTB()
+        profiler = sim.simulation.startProfiler()
+        sim.simulation.run(tb)
+        profiler.stop()
+        self.assertNotIn('run', tb.c1.__dict__)
+        rows = {(name, method): calls for name, method, calls, seconds in profiler.getComponents()}
+        self.assertGreaterEqual(rows[('top.c1', 'run')], 20)
+        signals = dict(profiler.getSignals())
+        self.assertEqual(signals['top.out'], 10)
+        self.assertEqual(signals['top.clock.clock'], 40)
+        self.assertEqual(profiler.getSignals('name')[0][0], 'top.clock.clock')
+        self.assertIn('deltas per step', profiler.report('calls'))
+        with self.assertRaisesRegex(Exception, 'Cannot sort by size'):
+            profiler.report('size')
+        with tempfile.TemporaryDirectory() as dir:
+            fileName = os.path.join(dir, 'counter.folded')
+            profiler.writeFlameGraph(fileName)
+            with open(fileName) as f:
+                lines = f.read().split('\n')
+            self.assertIn('top;c1;run', [line.split(' ')[0] for line in lines])
+
+    def testCycles(self):
+        top = Component()
+        top.resetn, top.clock, top.out = sig.Signal(1), sig.Signal(), sig.Vector(4)
+        top.c1 = SplitCounter(top.resetn, top.clock, top.out)
+        sim.simulation.setTopComponent(top)
+        profiler = sim.simulation.startProfiler()
+        sim.simulation.runCycles(top.clock, 15)
+        rows = {(name, method): calls for name, method, calls, seconds in profiler.getComponents()}
+        self.assertEqual(rows[('top.c1', 'onRising')], 15)
+        self.assertEqual(dict(profiler.getSignals())['top.out'], 10)
+        profiler.reset()
+        self.assertEqual(profiler.getComponents(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import os
+import tempfile
+import unittest
+
+from hdlite import Regression as regression
+
+class TestRegression(unittest.TestCase):
+    def testShard(self):
+        history = {'a': 8.0, 'b': 5.0, 'c': 4.0, 'd': 3.0}
+        shards = regression.shard(['a', 'b', 'c', 'd', 'new'], history, 2)
+        # unknown tests are assumed to take twice the longest, 16 s
+        self.assertEqual(shards, [['new', 'd'], ['a', 'b', 'c']])
+        self.assertEqual(regression.runtimes(['a', 'new'], history), {'a': 8.0, 'new': 16.0})
+        self.assertEqual(regression.byRuntime(['d', 'a', 'new'], history), ['new', 'a', 'd'])
+
+    def testRun(self):
+        with tempfile.TemporaryDirectory() as dir:
+            historyFile = os.path.join(dir, 'times.json')
+            tests = ['TestSignals.TestSignals.testAnd', 'TestSignals.TestSignals.testMissing']
+            runs = regression.run(tests, 0, historyFile, None)
+            self.assertEqual([r.status for r in runs], ['pass', 'error'])
+            self.assertEqual(sorted(regression.loadHistory(historyFile)), tests)
+            self.assertIn('2 tests: 1 pass, 1 error', regression.summary(runs))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import threading
+import unittest
+
+from hdlite import Simulation as sim
+from hdlite import Signal as sig
+from hdlite import Runner as runner
+
+from hdlite.Component import *
+
+class FreeCounter(Component):
+    def __init__(self, clock, enable, out):
+        super().__init__()
+        self.enable = enable
+        self.out = out
+        self.clockedBy(clock)
+
+    def onRising(self):
+        if self.enable == 1:
+            self.out <<= self.out + 1
+
+class TestRunner(unittest.TestCase):
+    def setUp(self):
+        with sim.Simulation() as s:
+            self.simulation = s
+            self.clock, self.enable, self.out = sig.Signal(), sig.Signal(1), sig.Vector(16)
+            self.counter = FreeCounter(self.clock, self.enable, self.out)
+        s.setTopComponent(self.counter)
+        self.runner = runner.Runner(s, self.clock, [self.out])
+
+    def testRun(self):
+        self.assertEqual(self.runner.run(10), 10)
+        self.assertEqual(self.runner.reason, 'clocks')
+        self.assertEqual(self.runner.snapshot[id(self.out)], 10)
+        self.runner.run(until=lambda: self.out == 25)
+        self.assertEqual(self.runner.reason, 'until')
+        self.assertEqual(self.out, 25)
+        self.runner.run(budget=0.01)
+        self.assertEqual(self.runner.reason, 'budget')
+        self.assertEqual(self.runner.clocks, self.out.getIntValue())
+
+    def testThread(self):
+        self.runner.start()
+        self.assertTrue(self.runner.isRunning())
+        posted = threading.Event()
+        def disable():
+            self.enable <<= 0
+            posted.set()
+        self.runner.post(disable)
+        self.assertTrue(posted.wait(10))
+        self.runner.stop()
+        self.assertEqual(self.runner.reason, 'stop')
+        self.assertFalse(self.runner.isRunning())
+        out = self.out.getIntValue()
+        self.assertEqual(self.runner.snapshot[id(self.out)], out)
+        self.runner.start(5)
+        self.runner.join()
+        self.assertEqual(self.runner.reason, 'clocks')
+        self.assertEqual(self.out, out)
+        self.runner.post(lambda: self.enable.__ilshift__(1))
+        self.assertEqual(self.enable, 1)
+
+    # start() in another thread waits for a function posted while idle
+    def testPostIdle(self):
+        starter = threading.Thread(target=lambda: self.runner.start(3))
+        def assign():
+            starter.start()
+            starter.join(0.1)
+            self.assertFalse(self.runner.isRunning())
+            self.enable <<= 0
+        self.runner.post(assign)
+        starter.join()
+        self.runner.join()
+        self.assertEqual(self.runner.reason, 'clocks')
+        self.assertEqual(self.out, 0)
+
+    def testError(self):
+        self.runner.start(until=lambda: 1 / 0)
+        self.runner.join()
+        self.assertEqual(self.runner.reason, 'error')
+        self.assertIsInstance(self.runner.error, ZeroDivisionError)
+        self.assertFalse(self.runner.isRunning())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,15 @@
 
+import gzip
+import os
+import tempfile
+import threading
 import unittest
 
 from hdlite import Simulation as sim
 from hdlite import Signal as sig
 
 from hdlite.Component import *
+from examples import Counter, CounterTB
 
 class DFlipFlop(Component):
     def __init__(self, name, clock, resetn, d, q, qn):
@@ -28,27 +33,25 @@ class DFlipFlop(Component):
             if self.q.getIntValue() == 1:
                 self.flipped += 1
 
-class Counter(Component):
+class SplitCounter(Component):
     def __init__(self, resetn, clock, out):
         super().__init__()
-        self.clock = clock
         self.resetn = resetn
         self.out = out
+        self.count = 0
+        self.combRuns = 0
+        self.clockedBy(clock)
+        self.sensitive()
 
-    def run(self):
-        if self.resetn == 0:
-            self.out <<= 0
-        elif self.clock.isRisingEdge():
-            if self.out < 10:
-                self.out <<= self.out + 1
+    def comb(self):
+        self.combRuns += 1
+        self.out <<= self.count
 
-class CounterTB(Component):
-    def __init__(self):
-        super().__init__()
-        self.reset = Reset()
-        self.clock = Clock(20)
-        self.out = sig.Vector(4)
-        self.c1 = Counter(self.reset.resetn, self.clock.clock, self.out)
+    def onRising(self):
+        if self.resetn == 0:
+            self.count = 0
+        elif self.count < 10:
+            self.count += 1
 
 class Pipeline(Component):
     def __init__(self):
@@ -66,6 +69,59 @@ class Pipeline(Component):
         self.fe <<= self.pipeline[7]
         self.pup <<= self.pipeline[6]
 
+class Inverter(Component):
+    def __init__(self, a, y):
+        super().__init__()
+        self.a = a
+        self.y = y
+        self.runs = 0
+
+    def run(self):
+        self.runs += 1
+        self.y <<= ~self.a
+
+# Reads its input in a helper method
+class HelperInverter(Inverter):
+    def run(self):
+        self.runs += 1
+        self.y <<= self.inverted()
+
+    def inverted(self):
+        return ~self.a
+
+# Reads the output of a child component through it
+class ChildReader(Component):
+    def __init__(self, child, y):
+        super().__init__()
+        self.child = child
+        self.y = y
+
+    def run(self):
+        self.y <<= self.child.y
+
+# Reads its input through a function outside the class
+class EscapingInverter(Inverter):
+    def run(self):
+        self.runs += 1
+        self.y <<= invert(self)
+
+def invert(inverter):
+    return ~inverter.a
+
+class Ticker(Component):
+    def __init__(self, delays):
+        super().__init__()
+        self.delays = delays
+        self.times = []
+        self.tick = sig.Signal()
+        self.sensitive()
+
+    def run(self):
+        self.times.append(sim.simulation.time)
+        self.tick <<= ~self.tick
+        if len(self.delays) > 0:
+            self.wait(self.delays.pop(0))
+
 class TestSignals(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -107,6 +163,31 @@ class TestSignals(unittest.TestCase):
         self.assertEqual(x.value, 4)
         self.assertEqual(str(x), '0b100')
 
+    def test_slice_cached(self):
+        x = sig.Vector(8)
+        self.assertIs(x[2:6], x[2:6])
+        self.assertIs(x[3], x[3])
+        self.assertIsNot(x[3], x[3:4])
+        x[2:6] <<= 0xf
+        x.propagate()
+        self.assertEqual(x[2:6].value, 0xf)
+        self.assertEqual(x.value, 0x3c)
+        self.assertFalse(hasattr(x, '__dict__'))
+        allocations = sig.VectorSlice.allocations
+        for i in range(10):
+            x[2:6] <<= x[0:4]
+        self.assertEqual(sig.VectorSlice.allocations, allocations + 1)
+
+    def test_slice_masked(self):
+        x = sig.Vector(8)
+        y = sig.Vector(4)
+        # A value wider than its vector must not spill into neighbouring bits
+        y.value = 0x3f
+        x[2:6] <<= y
+        self.assertEqual(x.futureValue, 0x3c)
+        x[0:2] <<= y[0:2]
+        self.assertEqual(x.futureValue, 0x3f)
+
     def test_index_fast(self):
         x = sig.Vector(4)
         y = sig.Signal()
@@ -150,6 +231,180 @@ class TestSignals(unittest.TestCase):
         sim.simulation.run(tb)
         self.assertEqual(tb.out, 10)
 
+    def testCounterAllComponents(self):
+        sim.simulation = sim.Simulation(eventDriven=False)
+        tb = CounterTB()
+        sim.simulation.run(tb)
+        self.assertEqual(tb.out, 10)
+
+    def testCycles(self):
+        resetn, clock, out = sig.Signal(), sig.Signal(), sig.Vector(4)
+        c1 = Counter(resetn, clock, out)
+        sim.simulation.setTopComponent(c1)
+        sim.simulation.runCycles(clock, 3)
+        self.assertEqual(out, 0)
+        resetn <<= 1
+        sim.simulation.runCycles(clock, 4)
+        self.assertEqual(out, 4)
+        self.assertEqual(clock, 0)
+        sim.simulation.runCycles(clock, 20)
+        self.assertEqual(out, 10)
+
+    def testSplit(self):
+        resetn, clock, out = sig.Signal(), sig.Signal(), sig.Vector(4)
+        c1 = SplitCounter(resetn, clock, out)
+        sim.simulation.setTopComponent(c1)
+        sim.simulation.runUntilStable()
+        resetn <<= 1
+        sim.simulation.runUntilStable()
+        for i in range(4):
+            clock <<= 1
+            sim.simulation.runUntilStable()
+            clock <<= 0
+            sim.simulation.runUntilStable()
+        self.assertEqual(out, 4)
+        # Once at start, then once after each rising edge
+        self.assertEqual(c1.combRuns, 5)
+        sim.simulation.runCycles(clock, 3)
+        self.assertEqual(out, 7)
+        self.assertEqual(c1.combRuns, 8)
+
+    def testLevels(self):
+        a, b, c, y = sig.Signal(), sig.Signal(), sig.Signal(), sig.Signal()
+        # Created in reverse order, run in signal order
+        inv3 = Inverter(c, y)
+        inv2 = Inverter(b, c)
+        inv1 = Inverter(a, b)
+        top = Component()
+        top.inv1, top.inv2, top.inv3 = inv1, inv2, inv3
+        sim.simulation.setTopComponent(top)
+        self.assertEqual(sim.simulation.getLoops(), [])
+        self.assertLess(inv1.level, inv2.level)
+        self.assertLess(inv2.level, inv3.level)
+        sim.simulation.runCycles(sig.Signal(), 0)
+        runs = (inv1.runs, inv2.runs, inv3.runs)
+        a <<= 1
+        sim.simulation.runCycles(sig.Signal(), 0)
+        self.assertEqual(y, 0)
+        self.assertEqual((inv1.runs, inv2.runs, inv3.runs), tuple(r + 1 for r in runs))
+
+    def testLoop(self):
+        top = Component()
+        top.y = sig.Signal()
+        top.inv = Inverter(top.y, top.y)
+        sim.simulation.setTopComponent(top)
+        self.assertEqual(sim.simulation.getLoops(), [['top.y']])
+        with self.assertRaisesRegex(Exception, 'top.y'):
+            sim.simulation.runCycles(sig.Signal(), 1)
+
+    def testSensitivity(self):
+        a, y = sig.Signal(), sig.Signal()
+        inv = Inverter(a, y)
+        sim.simulation.setTopComponent(inv)
+        sim.simulation.runUntilStable()
+        self.assertEqual(y.value, 1)
+        runs = inv.runs
+        sim.simulation.runUntilStable()
+        self.assertEqual(inv.runs, runs)
+        a <<= 1
+        sim.simulation.runUntilStable()
+        self.assertEqual(y.value, 0)
+        self.assertGreater(inv.runs, runs)
+
+    def testHelperLevels(self):
+        a, b, c, y = sig.Signal(), sig.Signal(), sig.Signal(), sig.Signal()
+        inv3 = HelperInverter(c, y)
+        inv2 = HelperInverter(b, c)
+        inv1 = HelperInverter(a, b)
+        top = Component()
+        top.inv1, top.inv2, top.inv3 = inv1, inv2, inv3
+        sim.simulation.setTopComponent(top)
+        self.assertTrue(any(s is a for s in inv1.getInputs()))
+        self.assertLess(inv1.level, inv2.level)
+        self.assertLess(inv2.level, inv3.level)
+        a <<= 1
+        sim.simulation.runCycles(sig.Signal(), 0)
+        self.assertEqual(y, 0)
+
+    def testChildSensitivity(self):
+        a, b, y = sig.Signal(), sig.Signal(), sig.Signal()
+        reader = ChildReader(Inverter(a, b), y)
+        sim.simulation.setTopComponent(reader)
+        self.assertTrue(any(s is b for s in reader.getSensitivity()))
+        sim.simulation.runUntilStable()
+        self.assertEqual(y, 1)
+        a <<= 1
+        sim.simulation.runUntilStable()
+        self.assertEqual(y, 0)
+
+    def testUnreadSensitivity(self):
+        a, b, y = sig.Signal(), sig.Signal(), sig.Signal()
+        inv = Inverter(a, y)
+        inv.unused = b
+        escaping = EscapingInverter(a, y)
+        escaping.unused = b
+        self.assertFalse(any(s is b for s in inv.getSensitivity()))
+        self.assertIsNone(escaping.getAccesses())
+        self.assertTrue(any(s is b for s in escaping.getSensitivity()))
+
+    def testDeclaredSensitivity(self):
+        a, b, y = sig.Signal(), sig.Signal(), sig.Signal()
+        inv = Inverter(a, y)
+        inv.sensitive(b)
+        sim.simulation.setTopComponent(inv)
+        sim.simulation.runUntilStable()
+        a <<= 1
+        sim.simulation.runUntilStable()
+        self.assertEqual(y.value, 1)
+        b <<= 1
+        sim.simulation.runUntilStable()
+        self.assertEqual(y.value, 0)
+
+    def testPending(self):
+        x = sig.Vector(8)
+        y = sig.Signal()
+        sim.simulation.propagateSignals()
+        x <<= 0
+        y <<= 0
+        self.assertEqual(sim.simulation.pending, [])
+        x[4:8] <<= 3
+        x[4:8] <<= 5
+        self.assertEqual(len(sim.simulation.pending), 1)
+        self.assertTrue(sim.simulation.propagateSignals())
+        self.assertEqual(x.getIntValue(), 0x50)
+        self.assertTrue(x.isChanged())
+        self.assertFalse(sim.simulation.propagateSignals())
+        self.assertFalse(x.isChanged())
+
+    def testTimers(self):
+        t1 = Ticker([3, 4])
+        t2 = Ticker([5, 10])
+        sim.simulation.run(t1)
+        self.assertEqual(t1.times, [0, 3, 7])
+        self.assertEqual(t2.times, [0, 5, 15])
+        self.assertEqual(sim.simulation.time, 15)
+        self.assertEqual(sim.simulation.timers, [])
+
+    def testVCDChangesOnly(self):
+        for name in ['counter.vcd', 'counter.vcd.gz']:
+            with tempfile.TemporaryDirectory() as dir:
+                fileName = os.path.join(dir, name)
+                sim.simulation = sim.Simulation(fileName)
+                tb = CounterTB()
+                sim.simulation.run(tb)
+                with open(fileName, 'rb') as f:
+                    data = f.read()
+            if name.endswith('.gz'):
+                data = gzip.decompress(data)
+            lines = data.decode().split('\n')
+            times = [line for line in lines if line.startswith('#')]
+            self.assertEqual(len(times), len(set(times)))
+            # out counts 0..10, each value written once
+            outTag = [line.split()[3] for line in lines if line.endswith('top_out $end')][0]
+            outValues = [line for line in lines if line.endswith(' ' + outTag)]
+            self.assertEqual(len(outValues), 11)
+            self.assertEqual(outValues[-1], 'b1010 ' + outTag)
+
     def testAnd(self):
         x = sig.Vector(8)
         y = sig.Vector(8)
@@ -170,5 +425,59 @@ class TestSignals(unittest.TestCase):
         y.propagate()
         self.assertEqual(y.getIntValue(), 0x53)
 
+    def testSideBySide(self):
+        default = sim.simulation
+        with sim.Simulation() as s1:
+            tb1 = CounterTB()
+        with sim.Simulation() as s2:
+            tb2 = CounterTB()
+            tb2.clock.nCycles = 10
+        self.assertEqual(len(default.signals), 0)
+        self.assertTrue(all(s.simulation is s1 for s in s1.signals))
+        self.assertTrue(all(p.simulation is s2 for p in s2.components))
+        s1.setTopComponent(tb1)
+        s1.runUntil(100)
+        s2.run(tb2)
+        self.assertEqual(tb2.out, 4)
+        s1.runUntil()
+        self.assertEqual(tb1.out, 10)
+        x = sig.Signal(simulation=s2)
+        self.assertIs(x.simulation, s2)
+        self.assertEqual(default.signals, [])
+
+    # Designs built with simulation= rather than in with blocks
+    def testSideBySideExplicit(self):
+        default = sim.simulation
+        s1 = sim.Simulation()
+        s2 = sim.Simulation()
+        tb1 = CounterTB(simulation=s1)
+        tb2 = CounterTB(5, simulation=s2)
+        reset = Reset(simulation=s2)
+        self.assertEqual(sim.contextStack(), [])
+        self.assertEqual(default.signals, [])
+        self.assertEqual(default.components, [])
+        self.assertTrue(any(s is tb1.clock.clock for s in s1.signals))
+        self.assertTrue(all(s.simulation is s1 for s in s1.signals))
+        self.assertTrue(all(p.simulation is s2 for p in s2.components))
+        self.assertIs(reset.resetn.simulation, s2)
+        s1.run(tb1)
+        s2.run(tb2)
+        self.assertEqual((tb1.out.getIntValue(), tb2.out.getIntValue()), (10, 4))
+
+    def testThreads(self):
+        outs = {}
+        def counter(nCycles):
+            with sim.Simulation() as s:
+                tb = CounterTB()
+                tb.clock.nCycles = nCycles << 1
+                s.run(tb)
+            outs[nCycles] = tb.out.getIntValue()
+        threads = [threading.Thread(target=counter, args=(n,)) for n in range(2, 8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(outs, {n: n - 1 for n in range(2, 8)})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
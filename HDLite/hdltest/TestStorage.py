@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+
+from hdlite import Simulation as sim
+from hdlite import Signal as sig
+
+from hdlite.Component import *
+from bitslice import Storage as storage
+from bitslice.Memory import AddressSpace, Memory, PagedMemory
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def writeFile(self, name, data):
+        fileName = os.path.join(self.dir.name, name)
+        with open(fileName, 'wb') as f:
+            f.write(data)
+        return fileName
+
+    def testWords(self):
+        self.assertEqual(storage.words(4, 4, 0xf), bytearray([0xf] * 4))
+        self.assertEqual(storage.words(4, 24).itemsize, 4)
+        memory = storage.words(2048, 56)
+        self.assertEqual((len(memory), memory.itemsize), (2048, 8))
+        memory[1] = (1 << 56) - 1
+        self.assertEqual(memory[1], (1 << 56) - 1)
+        with self.assertRaisesRegex(Exception, 'No storage for 65 bit words'):
+            storage.words(1, 65)
+
+    def testInterleave(self):
+        images = [bytes((i * 7 + j) & 0xff for i in range(300)) for j in range(7)]
+        fileNames = [self.writeFile(f'L{j}.circ', image) for j, image in enumerate(images)]
+        expected = []
+        for i in range(300):
+            word = 0
+            for image in images:
+                word = (word << 8) | image[i]
+            expected.append(word)
+        self.assertEqual(list(storage.interleave(fileNames)), expected)
+        self.assertEqual(storage.readImage(fileNames[2]), images[2])
+
+    def testHex(self):
+        fileName = self.writeFile('program.txt', b'01 // NOP\n80 // LDAL\n48\n\na1\n')
+        self.assertEqual(storage.readHex(fileName), bytes([0x01, 0x80, 0x48, 0, 0xa1]))
+
+    def testMemoryRead(self):
+        sim.simulation = sim.Simulation()
+        memory = Memory(sig.Signal(), sig.Signal(), sig.Vector(8), sig.Signal(), sig.Vector(8), sig.Vector(8))
+        memory.read(self.writeFile('small.txt', b'12\n34\n'))
+        self.assertEqual(memory.memory[0:3], bytearray([0x12, 0x34, 0]))
+        with self.assertRaisesRegex(Exception, 'holds 257 words, memory holds 256'):
+            memory.read(self.writeFile('large.txt', b'00\n' * 257))
+        self.assertEqual(len(memory.memory), 256)
+
+class TestAddressSpace(unittest.TestCase):
+    def testSparse(self):
+        space = AddressSpace(18)
+        self.assertEqual(space.read(0x3ffff), 0)
+        self.assertEqual(len(space.pages), 0)
+        space.write(0x3ffff, 0x12)
+        space.write(0x10000, 0x34)
+        self.assertEqual((space.read(0x3ffff), space.read(0x10000), space.read(0)), (0x12, 0x34, 0))
+        self.assertEqual(sorted(space.pages), [0x100, 0x3ff])
+        # Addresses wrap at 18 bits
+        self.assertEqual(space.read(0x7ffff), 0x12)
+
+    def testDevices(self):
+        space = AddressSpace(16)
+        written = []
+        space.mapDevice(0x5a00, 1, write=lambda address, value: written.append((address, value)))
+        space.mapDevice(0x5aff, 2, read=lambda address: address & 0xff)
+        space.write(0x5a00, 0x48)
+        space.write(0x5a01, 0x65)
+        space.write(0x5aff, 0x6c)
+        self.assertEqual(written, [(0x5a00, 0x48)])
+        self.assertEqual([space.read(a) for a in (0x5a00, 0x5a01, 0x5aff, 0x5b00, 0x5b01)], [0, 0x65, 0xff, 0, 0])
+
+    def testLoad(self):
+        space = AddressSpace(16)
+        data = bytes(range(200))
+        space.load(data, 0xff80)
+        self.assertEqual([space.read(0xff80 + i) for i in range(200)], list(data))
+        self.assertEqual(sorted(space.pages), [0, 0xff])
+
+    def testCheckpoint(self):
+        sim.simulation = sim.Simulation()
+        top = Component()
+        top.reset, top.clock, top.write = sig.Signal(), sig.Signal(), sig.Signal()
+        top.address, top.din, top.out = sig.Vector(16), sig.Vector(8), sig.Vector(8)
+        top.memory = PagedMemory(top.reset, top.clock, top.din, top.write, top.address, top.out)
+        sim.simulation.setTopComponent(top)
+        top.memory.space.write(0xabcd, 0x42)
+        with tempfile.TemporaryDirectory() as dir:
+            fileName = os.path.join(dir, 'memory.ckpt')
+            sim.simulation.checkpoint(fileName)
+            top.memory.space.write(0xabcd, 0x43)
+            top.memory.space.write(0x1234, 0x44)
+            sim.simulation.restore(fileName)
+        self.assertEqual(top.memory.space.read(0xabcd), 0x42)
+        self.assertEqual(top.memory.space.read(0x1234), 0)
+
+if __name__ == '__main__':
+    unittest.main()
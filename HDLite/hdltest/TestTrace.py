@@ -0,0 +1,173 @@
+import os
+import tempfile
+import unittest
+
+from hdlite import Simulation as sim
+from hdlite import TraceFile as trace
+
+from hdlite.Component import *
+from examples import Counter, CounterTB
+
+# Counter split into comb() and onRising()
+class SplitCounter(Counter):
+    def __init__(self, resetn, clock, out, limit):
+        super().__init__(resetn, clock, out, limit)
+        self.clockedBy(clock)
+
+    def comb(self):
+        pass
+
+    def onRising(self):
+        if self.resetn == 0:
+            self.out <<= 0
+        elif self.limit == None or self.out < self.limit:
+            self.out <<= self.out + 1
+
+class SplitCounterTB(CounterTB):
+    def __init__(self, nCycles=20, width=4, limit=10):
+        super().__init__(nCycles, width, limit)
+        self.c1 = SplitCounter(self.reset.resetn, self.clock.clock, self.out, limit)
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    # Counts on every clock, 40 of them
+    def newCounterTB(self):
+        return CounterTB(40, 8, None)
+
+    def runCounter(self, fileName, chunkSize=None):
+        sim.simulation = sim.Simulation(os.path.join(self.dir.name, fileName))
+        if chunkSize != None:
+            sim.simulation.vcd.chunkSize = chunkSize
+        tb = self.newCounterTB()
+        sim.simulation.run(tb)
+        return tb
+
+    def testHistory(self):
+        self.runCounter('counter.hdt', chunkSize=8)
+        reader = trace.TraceReader(os.path.join(self.dir.name, 'counter.hdt'))
+        self.assertGreater(len(reader.chunks), 2)
+        self.assertIn('top.c1.out', reader.getNames())
+        self.assertEqual(reader.getWidth('top.out'), 8)
+        # out increments on every rising clock edge, every 10 ns from 15 ns
+        history = reader.getHistory('top.out', 100, 140)
+        self.assertEqual(history, [(95, 9), (105, 10), (115, 11), (125, 12), (135, 13)])
+        self.assertEqual(reader.getValue('top.c1.out', 400), 39)
+        self.assertEqual(reader.getValue('top.clock.clock', 0), 0)
+        reader.close()
+
+    def testToVCD(self):
+        self.runCounter('counter.vcd')
+        self.runCounter('counter.hdt', chunkSize=8)
+        vcdName = os.path.join(self.dir.name, 'converted.vcd')
+        trace.toVCD(os.path.join(self.dir.name, 'counter.hdt'), vcdName)
+        with open(os.path.join(self.dir.name, 'counter.vcd')) as f:
+            expected = f.read()
+        with open(vcdName) as f:
+            converted = f.read()
+        self.assertEqual(self.changes(converted), self.changes(expected))
+        self.assertEqual(self.dumpvars(converted), self.dumpvars(expected))
+        self.assertGreater(len(self.dumpvars(converted)), 0)
+
+    def tracedNames(self, fileName, **kwargs):
+        sim.simulation = sim.Simulation(os.path.join(self.dir.name, fileName))
+        tb = self.newCounterTB()
+        kwargs = {name: value(tb) if callable(value) else value for name, value in kwargs.items()}
+        sim.simulation.setTraceFilter(**kwargs)
+        sim.simulation.run(tb)
+        if fileName.endswith('.hdt'):
+            reader = trace.TraceReader(os.path.join(self.dir.name, fileName))
+            names = reader.getNames()
+            reader.close()
+            return names
+        with open(os.path.join(self.dir.name, fileName)) as f:
+            return [line.split()[4] for line in f if line.strip().startswith('$var')]
+
+    def testFilter(self):
+        names = self.tracedNames('counter.hdt', patterns=['top.c1.*'])
+        self.assertEqual(names, ['top.c1.clock', 'top.c1.resetn', 'top.c1.out'])
+        names = self.tracedNames('counter.hdt', depth=0)
+        self.assertEqual(names, ['top.out'])
+        names = self.tracedNames('counter.hdt', signals=lambda tb: {'Clock': tb.clock.clock})
+        self.assertEqual(names, ['top.clock.clock', 'top.c1.clock'])
+        names = self.tracedNames('counter.vcd', patterns=['*.reset*'], depth=1)
+        self.assertEqual(names, ['reset_reset', 'reset_resetn', 'c1_resetn'])
+        self.assertEqual(len(sim.simulation.vcd.signals), 2)
+
+    # clockedBy() does not add signals to the trace
+    def testSplitHeader(self):
+        texts = []
+        for design in (CounterTB, SplitCounterTB):
+            fileName = os.path.join(self.dir.name, 'counter.vcd')
+            sim.simulation = sim.Simulation(fileName)
+            sim.simulation.run(design(40, 8, None))
+            with open(fileName) as f:
+                texts.append(f.read())
+        header, splitHeader = [text[:text.index('$enddefinitions')] for text in texts]
+        self.assertEqual(splitHeader, header)
+        self.assertNotIn('risingClock', splitHeader)
+        self.assertEqual(self.changes(texts[1]), self.changes(texts[0]))
+
+    def testTrigger(self):
+        fileName = os.path.join(self.dir.name, 'trigger.vcd')
+        sim.simulation = sim.Simulation(fileName)
+        tb = self.newCounterTB()
+        sim.simulation.setTrigger(lambda: tb.out == 20, preTrigger=5, postTrigger=3)
+        sim.simulation.run(tb)
+        with open(fileName) as f:
+            changes = self.changes(f.read())
+        # out becomes 20 at 205 ns, time steps are 5 ns apart
+        self.assertEqual(sorted(changes), [180, 185, 190, 195, 200, 205, 210, 215, 220])
+        self.assertIn('b10001 t0', changes[180])
+        self.assertIn('b10100 t0', changes[205])
+        self.assertIn('b10101 t0', changes[215])
+
+    def testTraceFileTrigger(self):
+        for name in ('trigger.vcd', 'trigger.hdt'):
+            sim.simulation = sim.Simulation(os.path.join(self.dir.name, name))
+            tb = self.newCounterTB()
+            sim.simulation.setTrigger(lambda: tb.out == 20, preTrigger=5, postTrigger=3)
+            sim.simulation.run(tb)
+        vcdName = os.path.join(self.dir.name, 'converted.vcd')
+        trace.toVCD(os.path.join(self.dir.name, 'trigger.hdt'), vcdName)
+        with open(os.path.join(self.dir.name, 'trigger.vcd')) as f:
+            expected = self.changes(f.read())
+        with open(vcdName) as f:
+            self.assertEqual(self.changes(f.read()), expected)
+
+    def testNoTrigger(self):
+        fileName = os.path.join(self.dir.name, 'trigger.vcd')
+        sim.simulation = sim.Simulation(fileName)
+        tb = self.newCounterTB()
+        sim.simulation.setTrigger(lambda: tb.out == 100)
+        sim.simulation.run(tb)
+        with open(fileName) as f:
+            self.assertEqual(self.changes(f.read()), {})
+
+    # Sorted lines of the $dumpvars block
+    def dumpvars(self, text):
+        lines = text.split('\n')
+        start = lines.index('$dumpvars') + 1
+        return sorted(lines[start:lines.index('$end', start)])
+
+    # time -> sorted value change lines
+    def changes(self, text):
+        lines = text.split('\n')
+        changes = {}
+        time = None
+        for line in lines[lines.index('$enddefinitions $end')+1:]:
+            if line.startswith('#'):
+                time = int(line[1:])
+                changes.setdefault(time, [])
+            elif line != '' and not line.startswith('$'):
+                changes[time].append(line)
+        for time in changes:
+            changes[time].sort()
+        return changes
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,42 +6,43 @@ from hdlite.Component import *
 from hdlite.ControlPanel import *
 from Centurion.CPU6 import *
 from bitslice.Memory import *
+from bitslice import Storage as storage
+from Centurion.Emulator import Emulator
 
 def read_ucode():
     # Improved logical bit order
     romMap = [4, 1, 2, 5, 6, 3, 0]
     # Board order
     #romMap = [0, 1, 2, 3, 4, 5, 6]
-    uc_roms = []
-    for i in romMap:
-        with open(f'Centurion/roms/CPU-AM27S191-L{i+1}.circ', 'rb') as f:
-            uc_roms.append(f.read())
-    ucode = []
-    for i in range(2048):
-        word = 0
-        for rom in uc_roms:
-            word <<= 8
-            word |= rom[i]
-        ucode.append(word)
-    return ucode
+    return storage.interleave([f'Centurion/roms/CPU-AM27S191-L{i+1}.circ' for i in romMap])
 
 def read_map_rom():
-    data = None
-    with open(f'Centurion/roms/CPU-6309.circ', 'rb') as f:
-        data = f.read()
-    return data
+    return storage.readImage('Centurion/roms/CPU-6309.circ')
+
+# Reset starts the program here
+ORIGIN = 0xfd00
+# Pretend there's a UART here :-)
+UART = 0x5a00
+
+def writeUART(address, value):
+    print(chr(value), end='')
 
 class CPU6TB(Component):
-    def __init__(self):
+    def __init__(self, nCycles=250):
         super().__init__()
         self.reset = Reset()
-        self.clock = Clock(250)
-        self.dataBus = sig.Vector(8)
+        self.clock = Clock(nCycles)
+        self.zero = sig.Signal()
+        self.dataInBus = sig.Vector(8)
+        self.writeEnBus = sig.Signal()
         self.addressBus = sig.Vector(16)
+        self.dataOutBus = sig.Vector(8)
         self.state = 0
 
-        self.zero = sig.Signal()
-        self.cpu = CPU6(self.reset.reset, self.clock.clock, self.zero, self.dataBus, self.addressBus)
+        self.cpu = CPU6(self.reset.reset, self.clock.clock, self.zero, self.dataInBus, self.writeEnBus, self.addressBus, self.dataOutBus)
+        self.memory = PagedMemory(self.reset.reset, self.clock.clock, self.dataOutBus, self.writeEnBus, self.addressBus, self.dataInBus)
+        self.memory.read('Centurion/programs/hellorld.txt', ORIGIN)
+        self.memory.mapDevice(UART, 1, write=writeUART)
         self.cpu.uc_rom.memory = read_ucode()
         self.cpu.map_rom.memory = read_map_rom()
 
@@ -61,6 +62,13 @@ def simCPU6():
     sim.simulation = sim.Simulation('vcd/cpu6.vcd')
     sim.simulation.run(CPU6TB())
 
+# Only write the clocks around the first UART write
+def captureCPU6():
+    sim.simulation = sim.Simulation('vcd/cpu6_capture.vcd')
+    tb = CPU6TB(100000)
+    sim.simulation.setTrigger(lambda: tb.writeEnBus == 1 and tb.addressBus == UART, 200, 200)
+    sim.simulation.run(tb)
+
 class CPU6TBPanel(Component):
     def __init__(self):
         super().__init__()
@@ -73,19 +81,40 @@ class CPU6TBPanel(Component):
         self.dataOutBus = sig.Vector(8)
 
         self.cpu = CPU6(self.reset, self.clock, self.zero, self.dataInBus, self.writeEnBus, self.addressBus, self.dataOutBus)
-        self.memory = Memory(self.reset, self.clock, self.dataOutBus, self.writeEnBus, self.addressBus, self.dataInBus)
-        self.memory.read('Centurion/programs/hellorld.txt')
+        self.memory = PagedMemory(self.reset, self.clock, self.dataOutBus, self.writeEnBus, self.addressBus, self.dataInBus)
+        self.memory.read('Centurion/programs/hellorld.txt', ORIGIN)
+        self.memory.mapDevice(UART, 1, write=writeUART)
+        # A hack to stop simulation
+        #if (addressBus == 16'h5b00 && data_c2r == 8'h5a) begin
+        #    sim_end <= 1;
         self.cpu.uc_rom.memory = read_ucode()
         self.cpu.map_rom.memory = read_map_rom()
 
-    def run(self):
-        if self.writeEnBus == 1:
-            # Pretend there's a UART here :-)
-            if self.addressBus == 0x5a00:
-                print(chr(self.dataOutBus), end='')
-            # A hack to stop simulation
-            #if (addressBus == 16'h5b00 && data_c2r == 8'h5a) begin
-            #    sim_end <= 1;
+def clockCPU6(simulation, top):
+    top.clock <<= 1
+    simulation.runUntilStable()
+    top.clock <<= 0
+    simulation.runUntilStable()
+
+# Reset CPU6TBPanel and clock it until it fetches the first instruction
+def resetCPU6(simulation, top):
+    top.reset <<= 1
+    simulation.runUntilStable()
+    top.reset <<= 0
+    simulation.runUntilStable()
+    while top.addressBus.getIntValue() != ORIGIN:
+        clockCPU6(simulation, top)
+
+# Run the program with the instruction level CPU6 after reset, for count
+# instructions, until untilPC or an instruction it does not implement, then
+# hand over to the microcode level CPU6 to continue
+def fastForward(simulation, top, count=None, untilPC=None):
+    resetCPU6(simulation, top)
+    emulator = Emulator(top.memory.space, top.cpu.reg_ram.memory)
+    emulator.load(top.cpu)
+    emulator.run(count, untilPC)
+    emulator.store(top.cpu, simulation)
+    return emulator
 
 def runCPU6():
     sim.simulation = sim.Simulation()
@@ -1,10 +1,14 @@
 
+import argparse
+import sys
+import time
 import unittest
 
 from hdltest import TestSignals
 
 from hdlite import Signal as sig
 from hdlite import Simulation as sim
+from hdlite import Regression as regression
 
 class Test(object):
     def __init__(self, value):
@@ -53,7 +57,22 @@ def suite():
     return suite
 
 if __name__ == '__main__':
-    loader = unittest.TestLoader()
-    suite = loader.discover('hdltest')
-    runner = unittest.TextTestRunner()
-    runner.run(suite)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Run hdltest in a pool of worker processes')
+    parser.add_argument('names', nargs='*', help='run tests whose id contains one of these')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='worker processes, default one per core, 0 to run serially')
+    parser.add_argument('--shard', default=None, help='i/n, run the i-th of n shards of equal runtime')
+    parser.add_argument('--history', default='.cache/test_times.json', help='runtimes of previous runs, none to keep none')
+    args = parser.parse_args()
+    if args.history == 'none':
+        args.history = None
+    tests = regression.discover()
+    if args.names:
+        tests = [t for t in tests if any(name in t for name in args.names)]
+    if args.shard:
+        i, n = (int(x) for x in args.shard.split('/'))
+        shard = set(regression.shard(tests, regression.loadHistory(args.history), n)[i-1])
+        tests = [t for t in tests if t in shard]
+    startTime = time.time()
+    runs = regression.run(tests, args.processes, args.history)
+    print(regression.summary(runs, time.time() - startTime))
+    sys.exit(0 if all(r.status in ('pass', 'skip') for r in runs) else 1)
\ No newline at end of file